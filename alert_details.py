@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Detalle de las alertas: descarga concurrente de Cuerpo.asp con caché en disco
+
+Muchos avisos no dicen "Línea N" en el título y se tratan como alertas
+generales, así que llegan a todo el mundo. Con DETAILS_ENABLED=1 el monitor
+descarga en paralelo el cuerpo de las alertas nuevas sin línea y busca en
+él las líneas afectadas.
+
+El texto de cada cuerpo se guarda en DETAILS_CACHE_DIR, un archivo por
+código, así cada aviso se descarga una sola vez. La caché se poda por edad
+(DETAILS_CACHE_MAX_AGE_DAYS) y por tamaño (DETAILS_CACHE_MAX_MB), borrando
+primero los archivos usados hace más tiempo.
+"""
+
+import hashlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from bs4 import BeautifulSoup
+
+from http_client import get_http_client
+from metrics import METRICS, timed
+from storage import write_text_atomic
+
+# Configuración (se puede sobrescribir con variables de entorno)
+DETAILS_ENABLED = os.environ.get('DETAILS_ENABLED', '0') == '1'
+DETAILS_CACHE_DIR = os.environ.get('DETAILS_CACHE_DIR', '.details_cache')
+DETAILS_CACHE_MAX_MB = float(os.environ.get('DETAILS_CACHE_MAX_MB', '20'))
+DETAILS_CACHE_MAX_AGE_DAYS = float(os.environ.get('DETAILS_CACHE_MAX_AGE_DAYS', '90'))
+DETAILS_WORKERS = int(os.environ.get('DETAILS_WORKERS', '8'))
+
+
+def extract_body_text(html: str) -> str:
+    """Texto del aviso en una página Cuerpo.asp (el bloque .cuerpo o, si no está, todo el <body>)"""
+    soup = BeautifulSoup(html, 'html.parser')
+    node = soup.find(class_='cuerpo') or soup.body or soup
+    return node.get_text(' ', strip=True)
+
+
+class DetailCache:
+    """Textos de los avisos en disco, un archivo por código"""
+
+    def __init__(self, directory: str = DETAILS_CACHE_DIR, max_mb: float = DETAILS_CACHE_MAX_MB,
+                 max_age_days: float = DETAILS_CACHE_MAX_AGE_DAYS):
+        self.directory = directory
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.max_age = max_age_days * 86400
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, code: str) -> str:
+        # El código viene de la URL: se usa su hash como nombre de archivo
+        name = hashlib.sha1(str(code).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f"{name}.txt")
+
+    def get(self, code: str) -> Optional[str]:
+        path = self.path_for(code)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+        except FileNotFoundError:
+            return None
+        # La fecha de modificación hace de "último uso" para la poda
+        os.utime(path)
+        return text
+
+    def put(self, code: str, text: str):
+        write_text_atomic(self.path_for(code), text)
+
+    def evict(self) -> int:
+        """
+        Borra los archivos caducados y, si aún se pasa de tamaño, los usados hace más tiempo
+
+        Returns:
+            Número de archivos borrados
+        """
+        now = time.time()
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith('.txt'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+
+        removed = 0
+        total = sum(size for _, size, _ in entries)
+        for mtime, size, path in entries:
+            if now - mtime <= self.max_age and total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+            removed += 1
+        return removed
+
+
+def fetch_detail(code: str, url: str, session=None) -> Optional[str]:
+    """Descarga un Cuerpo.asp y devuelve su texto (None si falla)"""
+    http = session or get_http_client()
+    try:
+        response = http.get(url, verify=False)
+        response.raise_for_status()
+    except Exception as e:
+        METRICS.inc('details_errors')
+        print(f"   ⚠️ No se pudo descargar el detalle de {code}: {e}")
+        return None
+    response.encoding = 'latin-1'  # Igual que ultima.asp
+    return extract_body_text(response.text)
+
+
+@timed('details')
+def fetch_details(alerts: List[dict], cache: DetailCache = None, session=None,
+                  workers: int = DETAILS_WORKERS) -> Dict[str, str]:
+    """
+    Textos de las alertas indicadas: de la caché o descargados en paralelo
+
+    Returns:
+        Diccionario código -> texto (sin las que no se pudieron descargar)
+    """
+    cache = cache or DetailCache()
+    details = {}
+    missing = []
+    for alert in alerts:
+        text = cache.get(alert['code'])
+        if text is None:
+            missing.append(alert)
+        else:
+            details[alert['code']] = text
+
+    if missing:
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(missing)))) as executor:
+            texts = list(executor.map(
+                lambda alert: fetch_detail(alert['code'], alert['url'], session), missing))
+        for alert, text in zip(missing, texts):
+            if text is not None:
+                cache.put(alert['code'], text)
+                details[alert['code']] = text
+
+    METRICS.inc('details_cache_hits', len(alerts) - len(missing))
+    METRICS.inc('details_fetched', len(missing))
+    removed = cache.evict()
+    print(f"📄 Detalles: {len(alerts) - len(missing)} de la caché, {len(missing)} descargado(s)"
+          + (f", {removed} borrado(s) de la caché" if removed else ""))
+    return details
+
+
+def enrich_alerts(alerts: List[dict], extract_lines, cache: DetailCache = None, session=None) -> int:
+    """
+    Asigna líneas a las alertas sin línea en el título buscándolas en su cuerpo
+
+    Args:
+        extract_lines: Función que devuelve las líneas mencionadas en un texto
+
+    Returns:
+        Número de alertas a las que se les han asignado líneas
+    """
+    general = [alert for alert in alerts if not alert['lines']]
+    if not general:
+        return 0
+    details = fetch_details(general, cache, session)
+    assigned = 0
+    for alert in general:
+        text = details.get(alert['code'])
+        if text is None:
+            continue
+        lines = extract_lines(text)
+        if lines:
+            alert['lines'] = lines
+            assigned += 1
+    METRICS.inc('details_lines_assigned', assigned)
+    if assigned:
+        print(f"🎯 {assigned} alerta(s) general(es) asignada(s) a sus líneas por el detalle")
+    return assigned
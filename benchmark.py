@@ -0,0 +1,629 @@
+#!/usr/bin/env python3
+"""
+Benchmarks del monitor de TMP Murcia
+
+Uso:
+    python benchmark.py parsers     # Conformidad y rendimiento de los backends de parsers.py
+    python benchmark.py pipeline    # Tiempo de cada etapa del monitor con datos sintéticos
+    python benchmark.py index       # Memoria y consultas del índice de suscripciones (dict/compacto)
+    python benchmark.py e2e         # Bot + monitor completos contra servidores falsos (fakes.py)
+    python benchmark.py schedule    # Consultas y retraso de detección: intervalo fijo frente al adaptativo
+"""
+
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import scraper
+from fakes import FakeTelegramServer, FakeTmpServer
+from parsers import PARSERS
+from scheduler import PollScheduler, HOURS_PER_WEEK
+from state import AlertLedger
+from subscription_index import build_subscription_index, HAS_NUMPY
+from storage import JsonSubscriptionStore
+from subscriptions import SubscriptionManager
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(REPO_DIR, "fixtures")
+
+SAMPLE_TITLES = [
+    "Línea {line}. Corte al tráfico por obras en {place}",
+    "Línea {line}. Horarios para Julio y Agosto 2026",
+    "Línea {line}. Desvío de recorrido por {place}",
+    "Líneas {line} y {line2}. Horarios de verano (Agosto) 2026",
+    "Nuevo descuento Bonos {place} a partir de 1 julio 2026",
+    "Atención al Público {place}.",
+]
+SAMPLE_PLACES = ["Cruce del Puntal", "Alcantarilla", "Avda. Libertad", "Beniel - Santomera",
+                 "Gran Vía", "UCAM", "El Palmar", "Espinardo"]
+
+
+def load_fixture_pages() -> dict:
+    """Carga las copias guardadas de ultima.asp (codificadas en latin-1)"""
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, "ultima_*.html"))):
+        with open(path, 'r', encoding='latin-1') as f:
+            pages[os.path.basename(path)] = f.read()
+    return pages
+
+
+# Líneas de la red (1-99): unas pocas concentran la mayoría de usuarios y de avisos
+SYNTHETIC_LINES = [str(line) for line in range(1, 100)]
+SYNTHETIC_LINE_WEIGHTS = [1 / rank for rank in range(1, 100)]
+
+
+def pick_line(rng: random.Random) -> str:
+    """Elige una línea siguiendo una distribución de Zipf"""
+    return rng.choices(SYNTHETIC_LINES, weights=SYNTHETIC_LINE_WEIGHTS)[0]
+
+
+def make_synthetic_alerts(num_alerts: int, seed: int = 0) -> list:
+    """Genera alertas (código y título) con títulos parecidos a los reales"""
+    rng = random.Random(seed)
+    return [
+        {'code': str(10000 + i),
+         'title': rng.choice(SAMPLE_TITLES).format(
+             line=pick_line(rng), line2=pick_line(rng), place=rng.choice(SAMPLE_PLACES))}
+        for i in range(num_alerts)
+    ]
+
+
+def make_synthetic_page(num_alerts: int, seed: int = 0) -> str:
+    """Genera una página con el mismo formato que ultima.asp y num_alerts alertas"""
+    rows = []
+    for i, alert in enumerate(make_synthetic_alerts(num_alerts, seed)):
+        rows.append(f'<tr class="{"par" if i % 2 == 0 else "impar"}"><td class="fecha">01/01/2026</td>'
+                    f'<td class="titular"><img src="img/flecha.gif" alt="">&nbsp;'
+                    f'<a href="Cuerpo.asp?codigo={alert["code"]}" class="enlace">{alert["title"]}</a></td></tr>')
+    return ('<html><head><title>TMP Murcia - &Uacute;ltimas noticias</title></head><body>'
+            '<div id="menu"><a href="lineas.asp">L&iacute;neas</a> | <a href="tarifas.asp">Tarifas</a></div>'
+            '<table class="noticias">' + '\n'.join(rows) + '</table></body></html>')
+
+
+def make_synthetic_subscriptions(num_users: int, seed: int = 0) -> dict:
+    """
+    Genera un almacén de suscripciones con el formato de subscriptions.json
+
+    Cada usuario sigue de 1 a 3 líneas elegidas con la distribución de Zipf
+    y el 80% mantiene activadas las alertas generales.
+    """
+    rng = random.Random(seed)
+    line_counts = [1, 2, 3]
+    users = {}
+    for i in range(num_users):
+        lines = []
+        for _ in range(rng.choices(line_counts, weights=[6, 3, 1])[0]):
+            line = pick_line(rng)
+            if line not in lines:
+                lines.append(line)
+        users[str(100000000 + i)] = {"lines": lines, "receive_general": rng.random() < 0.8}
+    return {"users": users}
+
+
+class MemorySubscriptionStore:
+    """Store en memoria para los benchmarks: nunca escribe a disco"""
+
+    saves_snapshot = False
+
+    def __init__(self, data: dict):
+        self.data = data
+
+    def load(self) -> dict:
+        return self.data
+
+    def add_user(self, chat_id: str, receive_general: bool):
+        pass
+
+    def set_line(self, chat_id: str, line: str, subscribed: bool):
+        pass
+
+    def set_keyword(self, chat_id: str, keyword: str, subscribed: bool):
+        pass
+
+    def set_receive_general(self, chat_id: str, receive: bool):
+        pass
+
+    def save(self, data: dict):
+        pass
+
+
+def check_parser_conformance(pages: dict) -> bool:
+    """Comprueba que todos los backends devuelven lo mismo que el original (bs4)"""
+    ok = True
+    for name, html in pages.items():
+        expected = list(PARSERS['bs4'](html))
+        for backend, parse in PARSERS.items():
+            result = list(parse(html))
+            if result != expected:
+                ok = False
+                print(f"❌ {backend} no coincide con bs4 en {name}")
+                for got, want in zip(result, expected):
+                    if got != want:
+                        print(f"   esperado {want!r}, obtenido {got!r}")
+                        break
+                if len(result) != len(expected):
+                    print(f"   {len(expected)} enlaces esperados, {len(result)} obtenidos")
+    return ok
+
+
+def measure(func, repeat: int) -> dict:
+    """Mejor tiempo de repeat ejecuciones y pico de memoria de una de ellas"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'seconds': best, 'peak_bytes': peak}
+
+
+def run_parsers(args) -> int:
+    pages = load_fixture_pages()
+    print(f"🧪 Conformidad de parsers sobre {len(pages)} página(s) guardada(s)...")
+    if not check_parser_conformance(pages):
+        return 1
+    print("✅ Todos los backends coinciden")
+
+    for size in args.sizes:
+        pages[f"sintetica_{size}"] = make_synthetic_page(size)
+
+    results = []
+    print(f"\n{'página':<32} {'backend':<10} {'tiempo (ms)':>12} {'memoria (KiB)':>14}")
+    for name, html in pages.items():
+        for backend, parse in PARSERS.items():
+            stats = measure(lambda: list(parse(html)), args.repeat)
+            results.append({'page': name, 'bytes': len(html), 'backend': backend, **stats})
+            print(f"{name:<32} {backend:<10} {stats['seconds'] * 1000:>12.2f} {stats['peak_bytes'] / 1024:>14.1f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'benchmark': 'parsers', 'results': results}, f, indent=2)
+        print(f"\n💾 Resultados guardados en {args.output}")
+    return 0
+
+
+def timed(func, repeat: int = 1):
+    """Ejecuta func (sin su salida por pantalla) y devuelve (mejor tiempo, resultado)"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = func()
+            best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run_pipeline_case(num_users: int, num_alerts: int, repeat: int) -> dict:
+    """Mide cada etapa del monitor para un tamaño de usuarios y de alertas"""
+    data = make_synthetic_subscriptions(num_users)
+    html = make_synthetic_page(num_alerts)
+    # Carga = construir el gestor y sus índices a partir de los datos ya leídos
+    load_seconds, manager = timed(lambda: SubscriptionManager(store=MemorySubscriptionStore(data)))
+
+    stages = {'load_subscriptions': load_seconds}
+    stages['parse_alerts'], alerts = timed(lambda: scraper.parse_alerts(html), repeat)
+    stages['get_monitored_alerts'], monitored = timed(
+        lambda: scraper.get_monitored_alerts(alerts, manager), repeat)
+    # La mitad de las alertas ya estaban en el registro
+    ledger = AlertLedger(path=None)
+    ledger.observe(monitored[len(monitored) // 2:])
+    stages['find_new_alerts'], new_alerts = timed(
+        lambda: scraper.find_new_alerts(monitored, ledger), repeat)
+    stages['get_users_for_alert'], recipients = timed(
+        lambda: [manager.get_users_for_lines(alert['lines']) for alert in new_alerts], repeat)
+    stages['get_stats'], _ = timed(manager.get_stats, repeat)
+
+    return {
+        'users': num_users,
+        'alerts': num_alerts,
+        'monitored_alerts': len(monitored),
+        'new_alerts': len(new_alerts),
+        'recipients': sum(len(r) for r in recipients),
+        'stages': stages
+    }
+
+
+def compare_with_baseline(results: list, baseline_path: str, threshold: float) -> bool:
+    """Compara con un JSON anterior; devuelve False si alguna etapa es más lenta que el umbral"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {(r['users'], r['alerts']): r['stages'] for r in json.load(f)['results']}
+
+    ok = True
+    print(f"\n📈 Comparación con {baseline_path} (umbral x{threshold:.2f}):")
+    for result in results:
+        previous = baseline.get((result['users'], result['alerts']))
+        if not previous:
+            continue
+        for stage, seconds in result['stages'].items():
+            if stage not in previous or previous[stage] <= 0:
+                continue
+            ratio = seconds / previous[stage]
+            if ratio > threshold:
+                ok = False
+                print(f"   ❌ {result['users']} usuarios / {result['alerts']} alertas, {stage}: x{ratio:.2f}")
+    if ok:
+        print("   ✅ Sin regresiones")
+    return ok
+
+
+def run_pipeline(args) -> int:
+    results = []
+    print(f"{'usuarios':>9} {'alertas':>8} " + ' '.join(f"{stage:>21}" for stage in PIPELINE_STAGES))
+    for num_users in args.users:
+        for num_alerts in args.alerts:
+            result = run_pipeline_case(num_users, num_alerts, args.repeat)
+            results.append(result)
+            print(f"{num_users:>9} {num_alerts:>8} " +
+                  ' '.join(f"{result['stages'][stage] * 1000:>18.2f} ms" for stage in PIPELINE_STAGES))
+
+    report = {
+        'benchmark': 'pipeline',
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'results': results
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Resultados guardados en {args.output}")
+
+    if args.baseline and not compare_with_baseline(results, args.baseline, args.threshold):
+        return 1
+    return 0
+
+
+INDEX_OPERATIONS = ['build', 'get_users_for_alert', 'get_subscribed_lines', 'get_all_monitored_lines', 'get_stats']
+# Usuarios (los primeros) cuyas líneas se consultan en get_subscribed_lines
+INDEX_SAMPLE_USERS = 100
+
+
+def manager_memory(data: dict, compact: bool):
+    """
+    Memoria de todo el gestor cargado desde subscriptions.json
+
+    Devuelve los bytes que quedan ocupados tras cargarlo (datos de los
+    usuarios, índices y palabras clave) y el pico durante la carga, que
+    incluye el JSON decodificado.
+    """
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, 'subscriptions.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        tracemalloc.start()
+        manager = SubscriptionManager(store=JsonSubscriptionStore(path), compact_index=compact)
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    del manager
+    return retained, peak
+
+
+def index_results(manager: SubscriptionManager, chat_ids: list) -> dict:
+    """Respuestas del gestor para todas las líneas y algunos usuarios, sin depender del orden"""
+    lines = sorted(manager.get_all_monitored_lines())
+    return {
+        'recipients': {line: sorted(manager.get_users_for_alert(line)) for line in lines + [None]},
+        'lines': {chat_id: sorted(manager.get_subscribed_lines(chat_id)) for chat_id in chat_ids},
+        'stats': manager.get_stats()
+    }
+
+
+def run_index_case(num_users: int, compact: bool, repeat: int) -> dict:
+    """Mide memoria y consultas de un tipo de índice para num_users usuarios"""
+    data = make_synthetic_subscriptions(num_users)
+    memory, peak = manager_memory(data, compact)
+    manager = SubscriptionManager(store=MemorySubscriptionStore(data), compact_index=compact)
+    lines = sorted(manager.get_all_monitored_lines())
+    chat_ids = list(data["users"])[:INDEX_SAMPLE_USERS]
+
+    operations = {}
+    operations['build'], _ = timed(lambda: build_subscription_index(data["users"], compact), repeat)
+    # Una consulta por línea monitorizada más la de alertas generales
+    operations['get_users_for_alert'], _ = timed(
+        lambda: [manager.get_users_for_alert(line) for line in lines + [None]], repeat)
+    operations['get_subscribed_lines'], _ = timed(
+        lambda: [manager.get_subscribed_lines(chat_id) for chat_id in chat_ids], repeat)
+    operations['get_all_monitored_lines'], _ = timed(manager.get_all_monitored_lines, repeat)
+    operations['get_stats'], _ = timed(manager.get_stats, repeat)
+    return {
+        'users': num_users,
+        'index': 'compact' if compact else 'dict',
+        'memory_bytes': memory,
+        'peak_memory_bytes': peak,
+        'operations': operations
+    }, manager, chat_ids
+
+
+def run_index(args) -> int:
+    results = []
+    ok = True
+    print(f"{'usuarios':>9} {'índice':>8} {'memoria':>10} {'pico':>10} " + ' '.join(f"{op:>24}" for op in INDEX_OPERATIONS))
+    for num_users in args.users:
+        answers = []
+        for compact in (False, True):
+            result, manager, chat_ids = run_index_case(num_users, compact, args.repeat)
+            results.append(result)
+            answers.append(index_results(manager, chat_ids))
+            print(f"{num_users:>9} {result['index']:>8} {result['memory_bytes'] / 2**20:>7.1f} MB "
+                  f"{result['peak_memory_bytes'] / 2**20:>7.1f} MB " +
+                  ' '.join(f"{result['operations'][op] * 1000:>21.2f} ms" for op in INDEX_OPERATIONS))
+        if answers[0] != answers[1]:
+            print(f"❌ Los índices no devuelven lo mismo con {num_users} usuarios")
+            ok = False
+
+    report = {
+        'benchmark': 'index',
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'numpy': HAS_NUMPY,
+        'results': results
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Resultados guardados en {args.output}")
+    return 0 if ok else 1
+
+
+E2E_COMMANDS = ['/start', '/suscribir {line}', '/desuscribir {line}', '/mis_lineas',
+                '/alertas_generales on', '/alertas_generales off', '/ayuda']
+
+
+def run_script(script: str, workdir: str, env: dict) -> dict:
+    """Ejecuta bot.py o scraper.py como en el workflow y mide cuánto tarda"""
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, os.path.join(REPO_DIR, script)], cwd=workdir, env=env,
+                             capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if process.returncode != 0:
+        print(process.stdout[-2000:])
+        print(process.stderr[-2000:])
+        raise RuntimeError(f"{script} terminó con código {process.returncode}")
+    return {'seconds': elapsed}
+
+
+def run_e2e(args) -> int:
+    rng = random.Random(args.seed)
+    telegram = FakeTelegramServer(latency=args.latency, throttle_rate=args.throttle,
+                                  retry_after=args.retry_after, error_rate=args.errors, seed=args.seed)
+    tmp = FakeTmpServer(make_synthetic_alerts(args.alerts, args.seed))
+
+    with telegram, tmp, tempfile.TemporaryDirectory() as workdir:
+        data = make_synthetic_subscriptions(args.users, args.seed)
+        with open(os.path.join(workdir, 'subscriptions.json'), 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        chat_ids = list(data['users'])
+        for _ in range(args.commands):
+            command = rng.choice(E2E_COMMANDS).format(line=pick_line(rng))
+            telegram.push_message(rng.choice(chat_ids), command)
+
+        env = dict(os.environ,
+                   TELEGRAM_BOT_TOKEN='0:fake-token',
+                   TELEGRAM_API_URL=telegram.url,
+                   TMP_URL=tmp.ultima_url,
+                   STORAGE_BACKEND='json',
+                   TELEGRAM_GLOBAL_RATE=str(args.global_rate),
+                   TELEGRAM_PER_CHAT_INTERVAL=str(args.per_chat_interval),
+                   DELIVERY_WORKERS=str(args.workers),
+                   RETRY_DELAY_SECONDS='0.1',
+                   DIGEST_MODE='1' if args.digest else '0')
+
+        print(f"🤖 Bot: {args.commands} comando(s) pendientes para {args.users} usuarios...")
+        bot_runs = []
+        while telegram.stats()['pending_updates'] and len(bot_runs) < args.commands // 100 + 2:
+            bot_runs.append(run_script('bot.py', workdir, env))
+        bot_seconds = sum(run['seconds'] for run in bot_runs)
+        bot_replies = telegram.stats()['messages']
+        print(f"   {len(bot_runs)} ejecución(es), {bot_seconds:.2f}s, {bot_replies} respuesta(s)")
+
+        print(f"🔍 Monitor: {args.alerts} alerta(s) en la página falsa...")
+        monitor = run_script('scraper.py', workdir, env)
+        stats = telegram.stats()
+        notifications = stats['messages'] - bot_replies
+        print(f"   {monitor['seconds']:.2f}s, {notifications} notificación(es) "
+              f"({notifications / monitor['seconds']:.1f} msg/s), "
+              f"{stats['throttled']} respuesta(s) 429, {stats['errors']} error(es) 500")
+
+    report = {
+        'benchmark': 'e2e',
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'parameters': {k: v for k, v in vars(args).items() if k != 'func'},
+        'bot': {'runs': len(bot_runs), 'seconds': bot_seconds, 'replies': bot_replies,
+                'updates_per_second': args.commands / bot_seconds if bot_seconds else 0.0},
+        'monitor': {'seconds': monitor['seconds'], 'notifications': notifications,
+                    'messages_per_second': notifications / monitor['seconds'],
+                    'throttled': stats['throttled'], 'errors': stats['errors']},
+        'tmp_requests': tmp.requests
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Resultados guardados en {args.output}")
+    return 0
+
+
+def publication_rate(hour: int) -> float:
+    """Avisos por hora que publica la TMP sintética en cada hora de la semana (0 = lunes 0:00)"""
+    day, hour = divmod(hour, 24)
+    if day >= 5:
+        return 0.1 if 9 <= hour < 21 else 0.02
+    if 7 <= hour < 10:
+        return 1.0
+    if 10 <= hour < 15:
+        return 0.5
+    if 15 <= hour < 21:
+        return 0.2
+    return 0.02
+
+
+def make_publications(start: float, weeks: int, rng: random.Random) -> list:
+    """Momentos de publicación (proceso de Poisson con el ritmo de publication_rate)"""
+    times = []
+    for hour in range(weeks * HOURS_PER_WEEK):
+        rate = publication_rate(hour % HOURS_PER_WEEK)
+        offset = rng.expovariate(rate)
+        while offset < 1:
+            times.append(start + (hour + offset) * 3600)
+            offset += rng.expovariate(rate)
+    return times
+
+
+def simulate_polling(publications: list, start: float, end: float, next_interval) -> dict:
+    """
+    Consulta la página simulada desde start hasta end
+
+    Args:
+        next_interval: Función (ahora, alertas nuevas) -> segundos hasta la siguiente consulta
+    """
+    polls = 0
+    delays = []
+    pending = 0
+    now = start
+    while now < end:
+        polls += 1
+        new_alerts = 0
+        while pending < len(publications) and publications[pending] <= now:
+            delays.append(now - publications[pending])
+            pending += 1
+            new_alerts += 1
+        now += next_interval(now, new_alerts)
+    delays.sort()
+    return {
+        'requests': polls,
+        'detected': len(delays),
+        'mean_delay': sum(delays) / len(delays) if delays else 0.0,
+        'p95_delay': delays[int(len(delays) * 0.95)] if delays else 0.0,
+        'max_delay': delays[-1] if delays else 0.0
+    }
+
+
+def run_schedule(args) -> int:
+    rng = random.Random(args.seed)
+    # Lunes a las 0:00 en hora local, como las horas de publication_rate
+    start = datetime(2026, 1, 5).timestamp()
+    history = make_publications(start - args.history_weeks * HOURS_PER_WEEK * 3600, args.history_weeks, rng)
+    end = start + args.weeks * HOURS_PER_WEEK * 3600
+    publications = make_publications(start, args.weeks, rng)
+
+    scheduler = PollScheduler(args.min_interval, args.max_interval, args.backoff)
+    scheduler.learn(history)
+
+    def adaptive(now, new_alerts):
+        scheduler.record(new_alerts, now)
+        return scheduler.next_interval(now)
+
+    policies = [(f'fijo {interval}s', lambda now, new_alerts, interval=interval: interval)
+                for interval in args.fixed]
+    policies.append((f'adaptativo {args.min_interval}-{args.max_interval}s', adaptive))
+
+    print(f"📅 {len(history)} avisos de historial ({args.history_weeks} semanas), "
+          f"{len(publications)} a detectar en {args.weeks} semanas, "
+          f"objetivo por hora entre {min(scheduler.hourly_targets()):.0f}s y {max(scheduler.hourly_targets()):.0f}s")
+    print(f"{'política':>22} {'consultas':>10} {'retraso medio':>14} {'p95':>10} {'máximo':>10}")
+    results = []
+    for name, policy in policies:
+        result = simulate_polling(publications, start, end, policy)
+        result['policy'] = name
+        results.append(result)
+        print(f"{name:>22} {result['requests']:>10} {result['mean_delay'] / 60:>10.1f} min "
+              f"{result['p95_delay'] / 60:>6.1f} min {result['max_delay'] / 60:>6.1f} min")
+
+    report = {
+        'benchmark': 'schedule',
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'weeks': args.weeks,
+        'history_weeks': args.history_weeks,
+        'publications': len(publications),
+        'results': results
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Resultados guardados en {args.output}")
+    return 0
+
+
+PIPELINE_STAGES = ['load_subscriptions', 'parse_alerts', 'get_monitored_alerts',
+                   'find_new_alerts', 'get_users_for_alert', 'get_stats']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks del monitor de TMP Murcia")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    parsers_cmd = subparsers.add_parser('parsers', help="Conformidad y rendimiento de los backends de análisis HTML")
+    parsers_cmd.add_argument('--sizes', type=int, nargs='*', default=[100, 1000, 5000],
+                             help="Número de alertas de las páginas sintéticas")
+    parsers_cmd.add_argument('--repeat', type=int, default=5)
+    parsers_cmd.add_argument('--output', help="Archivo JSON donde guardar los resultados")
+    parsers_cmd.set_defaults(func=run_parsers)
+
+    pipeline_cmd = subparsers.add_parser('pipeline', help="Tiempo de cada etapa del monitor con datos sintéticos")
+    pipeline_cmd.add_argument('--users', type=int, nargs='*', default=[1000, 10000, 100000],
+                              help="Tamaños del almacén de suscripciones (p.ej. 1000 1000000)")
+    pipeline_cmd.add_argument('--alerts', type=int, nargs='*', default=[10, 100, 1000],
+                              help="Número de alertas de las páginas sintéticas")
+    pipeline_cmd.add_argument('--repeat', type=int, default=3)
+    pipeline_cmd.add_argument('--output', default='bench_pipeline.json',
+                              help="Archivo JSON donde guardar los resultados")
+    pipeline_cmd.add_argument('--baseline', help="JSON de una ejecución anterior con el que comparar")
+    pipeline_cmd.add_argument('--threshold', type=float, default=1.25,
+                              help="Factor de ralentización que se considera regresión")
+    pipeline_cmd.set_defaults(func=run_pipeline)
+
+    index_cmd = subparsers.add_parser('index', help="Índice de suscripciones con conjuntos frente al compacto")
+    index_cmd.add_argument('--users', type=int, nargs='*', default=[10000, 100000, 1000000])
+    index_cmd.add_argument('--repeat', type=int, default=3)
+    index_cmd.add_argument('--output', default='bench_index.json',
+                           help="Archivo JSON donde guardar los resultados")
+    index_cmd.set_defaults(func=run_index)
+
+    e2e_cmd = subparsers.add_parser('e2e', help="Bot y monitor completos contra servidores falsos, sin red")
+    e2e_cmd.add_argument('--users', type=int, default=2000)
+    e2e_cmd.add_argument('--alerts', type=int, default=10, help="Alertas en la página falsa (todas nuevas)")
+    e2e_cmd.add_argument('--commands', type=int, default=200, help="Comandos pendientes para el bot")
+    e2e_cmd.add_argument('--latency', type=float, default=0.02, help="Latencia de sendMessage (s)")
+    e2e_cmd.add_argument('--throttle', type=float, default=0.0, help="Probabilidad de 429")
+    e2e_cmd.add_argument('--retry-after', type=int, default=1)
+    e2e_cmd.add_argument('--errors', type=float, default=0.0, help="Probabilidad de 500")
+    e2e_cmd.add_argument('--global-rate', type=float, default=1000, help="TELEGRAM_GLOBAL_RATE del monitor")
+    e2e_cmd.add_argument('--per-chat-interval', type=float, default=0.0,
+                         help="TELEGRAM_PER_CHAT_INTERVAL del monitor")
+    e2e_cmd.add_argument('--workers', type=int, default=32, help="DELIVERY_WORKERS del monitor")
+    e2e_cmd.add_argument('--digest', action='store_true',
+                         help="Un resumen por usuario en lugar de un mensaje por alerta (DIGEST_MODE=1)")
+    e2e_cmd.add_argument('--seed', type=int, default=0)
+    e2e_cmd.add_argument('--output', default='bench_e2e.json')
+    e2e_cmd.set_defaults(func=run_e2e)
+
+    schedule_cmd = subparsers.add_parser('schedule', help="Intervalo de consulta fijo frente al adaptativo, simulado")
+    schedule_cmd.add_argument('--weeks', type=int, default=4, help="Semanas simuladas")
+    schedule_cmd.add_argument('--history-weeks', type=int, default=8, help="Semanas de historial para aprender")
+    schedule_cmd.add_argument('--fixed', type=int, nargs='*', default=[1800, 300],
+                              help="Intervalos fijos con los que comparar (1800 = cron del workflow)")
+    schedule_cmd.add_argument('--min-interval', type=int, default=120)
+    schedule_cmd.add_argument('--max-interval', type=int, default=1800)
+    schedule_cmd.add_argument('--backoff', type=float, default=2.0)
+    schedule_cmd.add_argument('--seed', type=int, default=0)
+    schedule_cmd.add_argument('--output', default='bench_schedule.json')
+    schedule_cmd.set_defaults(func=run_schedule)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,28 +4,127 @@ Bot de Telegram para gestionar suscripciones a alertas de TMP Murcia
 Versión mejorada con mejor logging y manejo de errores
 """
 
-import requests
+import argparse
+import hmac
+import ipaddress
+import json
 import os
+import signal
 import sys
+import threading
+import time
 from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from subscriptions import SubscriptionManager
+from channels import get_channel_map, invite_link
+from keywords import KEYWORD_MIN_LENGTH, KEYWORD_MAX_LENGTH, KEYWORDS_MAX_PER_USER
+from dispatcher import ChatDispatcher, BOT_WORKERS
+from storage import write_text_atomic
+from http_client import get_http_client, TELEGRAM_API_URL
+from metrics import METRICS
+from profiling import PROFILER, profiled, add_profile_argument
+
+OFFSET_FILE = '.telegram_offset'
+# Segundos que Telegram mantiene abierta cada petición getUpdates en modo daemon
+BOT_POLL_TIMEOUT = int(os.environ.get('BOT_POLL_TIMEOUT', '50'))
+# Espera tras un error de red antes de volver a consultar (se duplica en cada fallo)
+BOT_ERROR_BACKOFF = 1
+BOT_MAX_ERROR_BACKOFF = 60
+# Cada cuántos segundos se guarda el progreso mientras se procesa una cola larga
+BOT_CHECKPOINT_INTERVAL = float(os.environ.get('BOT_CHECKPOINT_INTERVAL', '5'))
+# Comandos que se distinguen en las métricas (el resto se cuenta como 'otro')
+KNOWN_COMMANDS = {'/start', '/suscribir', '/desuscribir', '/mis_lineas', '/mislineas',
+                  '/alertas_generales', '/alertasgenerales', '/palabra', '/quitar_palabra',
+                  '/ayuda', '/help', '/stats'}
+MARKDOWN_CHARS = str.maketrans('', '', '*_`[]')
+
+# Modo webhook (python bot.py --webhook): Telegram envía cada update por POST.
+# Por defecto solo escucha en local (detrás de un proxy con HTTPS); para escuchar
+# en otra interfaz hace falta WEBHOOK_SECRET
+WEBHOOK_HOST = os.environ.get('WEBHOOK_HOST', '127.0.0.1')
+WEBHOOK_PORT = int(os.environ.get('WEBHOOK_PORT', '8443'))
+WEBHOOK_PATH = os.environ.get('WEBHOOK_PATH', '/webhook')
+# Se comprueba contra la cabecera X-Telegram-Bot-Api-Secret-Token si está definido
+WEBHOOK_SECRET = os.environ.get('WEBHOOK_SECRET', '')
+# URL pública que se registra con setWebhook al arrancar (vacía = no se registra)
+WEBHOOK_URL = os.environ.get('WEBHOOK_URL', '')
+
+
+def is_loopback(host: str) -> bool:
+    """True si la dirección solo es accesible desde la propia máquina"""
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class PollInterrupted(Exception):
+    """Se lanza desde el manejador de señales para cortar una consulta en curso"""
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    """Recibe los updates de Telegram y los encola en el dispatcher sin esperar a procesarlos"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status: int, body: bytes = b''):
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length)
+        if self.path.split('?', 1)[0] != self.server.webhook_path:
+            self.reply(404)
+            return
+        secret = self.server.webhook_secret
+        if secret and not hmac.compare_digest(self.headers.get('X-Telegram-Bot-Api-Secret-Token', ''), secret):
+            self.reply(403)
+            return
+        try:
+            update = json.loads(raw)
+            int(update['update_id'])
+        except (ValueError, KeyError, TypeError):
+            self.reply(400)
+            return
+        # Un update repetido también se confirma, para que Telegram no lo reenvíe
+        self.server.dispatcher.submit(update)
+        self.reply(200, b'{"ok":true}')
+
 
 class TelegramBot:
-    def __init__(self):
+    def __init__(self, subscription_manager: SubscriptionManager = None, session=None):
+        """
+        Args:
+            subscription_manager: Gestor compartido (por defecto se carga de disco)
+            session: Cliente HTTP (por defecto el cliente compartido de http_client)
+        """
         self.token = os.environ.get('TELEGRAM_BOT_TOKEN')
         if not self.token:
             print("❌ Error: TELEGRAM_BOT_TOKEN no configurado")
             sys.exit(1)
         
-        self.base_url = f"https://api.telegram.org/bot{self.token}"
-        self.subscription_manager = SubscriptionManager()
+        self.base_url = f"{TELEGRAM_API_URL}/bot{self.token}"
+        self.subscription_manager = subscription_manager or SubscriptionManager()
+        self.http = session or get_http_client()
         self.offset = self.load_offset()
+        self.saved_offset = self.offset
+        self.poll_failed = False
+        self.running = False
+        self.idle = False
+        self.dispatcher = None
         print(f"📝 Offset inicial: {self.offset}")
     
     def load_offset(self) -> int:
         """Carga el último offset procesado"""
         try:
-            with open('.telegram_offset', 'r') as f:
+            with open(OFFSET_FILE, 'r') as f:
                 offset = int(f.read().strip())
                 print(f"📂 Offset cargado desde archivo: {offset}")
                 return offset
@@ -39,23 +138,30 @@ class TelegramBot:
     def save_offset(self, offset: int):
         """Guarda el offset para la próxima ejecución"""
         try:
-            with open('.telegram_offset', 'w') as f:
-                f.write(str(offset))
+            write_text_atomic(OFFSET_FILE, str(offset))
+            self.saved_offset = offset
             print(f"💾 Offset guardado: {offset}")
         except Exception as e:
             print(f"⚠️ Error al guardar offset: {e}")
     
-    def get_updates(self) -> list:
-        """Obtiene actualizaciones pendientes de Telegram"""
+    def get_updates(self, timeout: int = 0) -> list:
+        """
+        Obtiene actualizaciones pendientes de Telegram
+        
+        Args:
+            timeout: Segundos de long polling (0 para GitHub Actions, que solo
+                     quiere lo que ya está en cola)
+        """
+        self.poll_failed = False
         try:
             url = f"{self.base_url}/getUpdates"
             params = {
                 'offset': self.offset,
-                'timeout': 0  # Sin timeout para GitHub Actions
+                'timeout': timeout
             }
             print(f"🔍 Consultando actualizaciones desde offset {self.offset}...")
             
-            response = requests.get(url, params=params, timeout=15)
+            response = self.http.get(url, params=params, timeout=timeout + 15)
             
             print(f"📡 Respuesta de Telegram: Status {response.status_code}")
             
@@ -67,13 +173,18 @@ class TelegramBot:
                     return updates
                 else:
                     print(f"❌ Error en respuesta: {data}")
+                    self.poll_failed = True
                     return []
             else:
                 print(f"❌ Error HTTP: {response.status_code}")
                 print(f"Respuesta: {response.text[:200]}")
+                self.poll_failed = True
                 return []
-                
+        
+        except PollInterrupted:
+            raise
         except Exception as e:
+            self.poll_failed = True
             print(f"❌ Excepción al obtener actualizaciones: {e}")
             import traceback
             traceback.print_exc()
@@ -90,7 +201,7 @@ class TelegramBot:
             }
             
             print(f"📤 Enviando mensaje a {chat_id}...")
-            response = requests.post(url, data=data, timeout=10)
+            response = self.http.post(url, data=data)
             
             if response.status_code == 200:
                 print(f"✅ Mensaje enviado exitosamente a {chat_id}")
@@ -122,6 +233,9 @@ Este bot te enviará notificaciones automáticas cuando haya alertas de las lín
 
 /mis_lineas - Ver tus suscripciones actuales
 
+/palabra [texto] - Recibir las alertas que mencionen una palabra o una parada
+   Ejemplo: `/palabra obras`
+
 /alertas_generales [on/off] - Activar/desactivar alertas sin línea específica
    Ejemplo: `/alertas_generales off`
 
@@ -138,31 +252,94 @@ Este bot te enviará notificaciones automáticas cuando haya alertas de las lín
         if not line:
             self.send_message(chat_id, "❌ Uso: /suscribir [número de línea]\nEjemplo: `/suscribir 11`")
             return
+        # Igual que las extrae line_extractor: "26b" -> "26B"
+        line = line.strip().upper()
+        channels, channel = self.line_channel(line)
+        if channel is not None and channels.mode == 'only':
+            # Los avisos de esta línea solo se publican en su canal
+            self.send_message(chat_id, f"📡 Los avisos de la línea {line} se publican en su canal de Telegram."
+                                       f"{self.channel_invitation(channel)}")
+            return
         
         success = self.subscription_manager.subscribe_line(chat_id, line)
         if success:
-            self.send_message(chat_id, f"✅ ¡Suscrito a la línea {line}!\n\nAhora recibirás alertas cuando haya novedades en esta línea.")
+            message = f"✅ ¡Suscrito a la línea {line}!\n\nAhora recibirás alertas cuando haya novedades en esta línea."
         else:
-            self.send_message(chat_id, f"ℹ️ Ya estabas suscrito a la línea {line}")
+            message = f"ℹ️ Ya estabas suscrito a la línea {line}"
+        if channel is not None:
+            message += f"\n\n📡 También se publican en el canal de la línea.{self.channel_invitation(channel)}"
+        self.send_message(chat_id, message)
     
     def handle_unsubscribe(self, chat_id: str, line: str):
         """Maneja el comando /desuscribir"""
         if not line:
             self.send_message(chat_id, "❌ Uso: /desuscribir [número de línea]\nEjemplo: `/desuscribir 11`")
             return
+        line = line.strip().upper()
+        channels, channel = self.line_channel(line)
         
         success = self.subscription_manager.unsubscribe_line(chat_id, line)
         if success:
-            self.send_message(chat_id, f"✅ Desuscrito de la línea {line}\n\nYa no recibirás alertas de esta línea.")
+            message = f"✅ Desuscrito de la línea {line}\n\nYa no recibirás alertas de esta línea."
+        elif channel is None or channels.mode != 'only':
+            message = f"ℹ️ No estabas suscrito a la línea {line}"
+        else:
+            message = f"ℹ️ No recibes avisos privados de la línea {line}"
+        if channel is not None:
+            # El bot no puede sacar a nadie del canal: se sale desde Telegram
+            message += f"\n\n📡 Si te uniste al canal de la línea {line}, sal de él desde Telegram para dejar de ver sus avisos."
+        self.send_message(chat_id, message)
+    
+    def line_channel(self, line: str):
+        """(ChannelMap, canal de la línea) en modo canales, o (None, None)"""
+        channels = get_channel_map()
+        if channels is None:
+            return None, None
+        return channels, channels.channel_for_line(line)
+    
+    @staticmethod
+    def channel_invitation(channel: dict) -> str:
+        link = invite_link(channel)
+        return f"\n\n👉 [Unirse al canal]({link})" if link else ""
+    
+    def handle_keyword(self, chat_id: str, keyword: str):
+        """Maneja el comando /palabra"""
+        # Sin los caracteres especiales del Markdown de Telegram, que romperían las respuestas
+        keyword = ' '.join(keyword.translate(MARKDOWN_CHARS).split())
+        if not keyword:
+            self.send_message(chat_id, "❌ Uso: /palabra [texto]\nEjemplo: `/palabra obras`")
+            return
+        if not KEYWORD_MIN_LENGTH <= len(keyword) <= KEYWORD_MAX_LENGTH:
+            self.send_message(chat_id, f"❌ La palabra debe tener entre {KEYWORD_MIN_LENGTH} y {KEYWORD_MAX_LENGTH} caracteres")
+            return
+        if len(self.subscription_manager.get_keywords(chat_id)) >= KEYWORDS_MAX_PER_USER:
+            self.send_message(chat_id, f"❌ Puedes seguir como mucho {KEYWORDS_MAX_PER_USER} palabras. Quita alguna con `/quitar_palabra [texto]`")
+            return
+        
+        if self.subscription_manager.subscribe_keyword(chat_id, keyword):
+            self.send_message(chat_id, f"✅ Recibirás las alertas que mencionen «{keyword}», sea de la línea que sea.")
         else:
-            self.send_message(chat_id, f"ℹ️ No estabas suscrito a la línea {line}")
+            self.send_message(chat_id, f"ℹ️ Ya seguías «{keyword}»")
+    
+    def handle_remove_keyword(self, chat_id: str, keyword: str):
+        """Maneja el comando /quitar_palabra"""
+        keyword = ' '.join(keyword.translate(MARKDOWN_CHARS).split())
+        if not keyword:
+            self.send_message(chat_id, "❌ Uso: /quitar_palabra [texto]\nEjemplo: `/quitar_palabra obras`")
+            return
+        
+        if self.subscription_manager.unsubscribe_keyword(chat_id, keyword):
+            self.send_message(chat_id, f"✅ Ya no recibirás las alertas por «{keyword}»")
+        else:
+            self.send_message(chat_id, f"ℹ️ No seguías «{keyword}»")
     
     def handle_my_lines(self, chat_id: str):
         """Maneja el comando /mis_lineas"""
         lines = self.subscription_manager.get_subscribed_lines(chat_id)
         receive_general = self.subscription_manager.get_receive_general(chat_id)
+        keywords = self.subscription_manager.get_keywords(chat_id)
         
-        if not lines and not receive_general:
+        if not lines and not receive_general and not keywords:
             message = "ℹ️ No estás suscrito a ninguna línea y no recibes alertas generales.\n\n"
             message += "Usa `/suscribir [línea]` para empezar a recibir alertas."
         else:
@@ -175,6 +352,9 @@ Este bot te enviará notificaciones automáticas cuando haya alertas de las lín
             else:
                 message += "🚌 *Líneas:* Ninguna\n"
             
+            if keywords:
+                message += f"\n🔎 *Palabras clave:* {', '.join(keywords)}\n"
+            
             message += f"\n📢 *Alertas generales:* {'✅ Activadas' if receive_general else '❌ Desactivadas'}\n"
             message += "\n💡 Usa `/suscribir [línea]` para añadir más líneas"
             if receive_general:
@@ -205,6 +385,8 @@ Este bot te enviará notificaciones automáticas cuando haya alertas de las lín
 • `/suscribir [línea]` - Suscribirte a una línea
 • `/desuscribir [línea]` - Desuscribirte de una línea
 • `/mis_lineas` - Ver tus suscripciones
+• `/palabra [texto]` - Alertas que mencionen una palabra o parada
+• `/quitar_palabra [texto]` - Dejar de seguir una palabra
 • `/alertas_generales [on/off]` - Alertas sin línea específica
 • `/ayuda` - Ver esta ayuda
 
@@ -213,6 +395,7 @@ Este bot te enviará notificaciones automáticas cuando haya alertas de las lín
 `/suscribir 11` - Recibir alertas de la línea 11
 `/suscribir 44` - Recibir alertas de la línea 44
 `/desuscribir 36` - Dejar de recibir alertas de la 36
+`/palabra desvío` - Alertas de cualquier línea que hablen de desvíos
 `/alertas_generales off` - No recibir alertas generales
 
 ℹ️ *Sobre alertas generales:*
@@ -232,7 +415,8 @@ El bot revisa la página de TMP cada 15 minutos y te avisa automáticamente de n
         message = "📊 *Estadísticas del Sistema*\n\n"
         message += f"👥 Total de usuarios: {stats['total_users']}\n"
         message += f"🚌 Líneas monitoreadas: {len(stats['monitored_lines'])}\n"
-        message += f"📢 Usuarios con alertas generales: {stats['general_alerts_users']}\n\n"
+        message += f"📢 Usuarios con alertas generales: {stats['general_alerts_users']}\n"
+        message += f"🔎 Palabras clave distintas: {stats['keywords']}\n\n"
         
         if stats['line_counts']:
             message += "*Suscripciones por línea:*\n"
@@ -261,65 +445,235 @@ El bot revisa la página de TMP cada 15 minutos y te avisa automáticamente de n
             
             print(f"📨 Procesando mensaje de {username} ({chat_id}): {text}")
             
-            # Procesar comandos
-            if command == '/start':
-                self.handle_start(chat_id, username)
-            elif command == '/suscribir':
-                self.handle_subscribe(chat_id, args)
-            elif command == '/desuscribir':
-                self.handle_unsubscribe(chat_id, args)
-            elif command == '/mis_lineas' or command == '/mislineas':
-                self.handle_my_lines(chat_id)
-            elif command == '/alertas_generales' or command == '/alertasgenerales':
-                self.handle_general_alerts(chat_id, args)
-            elif command == '/ayuda' or command == '/help':
-                self.handle_help(chat_id)
-            elif command == '/stats':
-                self.handle_stats(chat_id)
-            else:
-                print(f"⚠️ Comando no reconocido: {command}")
-                self.send_message(chat_id, f"❓ Comando no reconocido: {command}\n\nUsa /ayuda para ver los comandos disponibles.")
+            # Procesar comandos (las métricas agrupan los no reconocidos)
+            label = command if command in KNOWN_COMMANDS else 'otro'
+            METRICS.inc('commands', command=label)
+            with METRICS.stage('command', command=label):
+                if command == '/start':
+                    self.handle_start(chat_id, username)
+                elif command == '/suscribir':
+                    self.handle_subscribe(chat_id, args)
+                elif command == '/desuscribir':
+                    self.handle_unsubscribe(chat_id, args)
+                elif command == '/mis_lineas' or command == '/mislineas':
+                    self.handle_my_lines(chat_id)
+                elif command == '/palabra':
+                    self.handle_keyword(chat_id, args)
+                elif command == '/quitar_palabra':
+                    self.handle_remove_keyword(chat_id, args)
+                elif command == '/alertas_generales' or command == '/alertasgenerales':
+                    self.handle_general_alerts(chat_id, args)
+                elif command == '/ayuda' or command == '/help':
+                    self.handle_help(chat_id)
+                elif command == '/stats':
+                    self.handle_stats(chat_id)
+                else:
+                    print(f"⚠️ Comando no reconocido: {command}")
+                    self.send_message(chat_id, f"❓ Comando no reconocido: {command}\n\nUsa /ayuda para ver los comandos disponibles.")
         
         except Exception as e:
             print(f"❌ Error procesando mensaje: {e}")
             import traceback
             traceback.print_exc()
     
-    def process_updates(self):
-        """Procesa todas las actualizaciones pendientes"""
-        updates = self.get_updates()
+    def process_update(self, update: dict):
+        """Procesa un único update (lo usan el dispatcher del webhook y process_updates)"""
+        if 'message' in update:
+            self.process_message(update['message'])
+        else:
+            print(f"⚠️ Update {update.get('update_id')} no contiene mensaje")
+    
+    def process_updates(self, timeout: int = 0) -> int:
+        """
+        Procesa todas las actualizaciones pendientes
         
+        Returns:
+            Número de actualizaciones procesadas
+        """
+        self.idle = True
+        try:
+            updates = self.get_updates(timeout)
+        finally:
+            self.idle = False
+        return self.handle_updates(updates)
+    
+    # El perfil cubre el procesamiento, no la espera del long polling
+    @profiled('process_updates')
+    def handle_updates(self, updates: list) -> int:
+        """
+        Procesa los updates de una consulta a getUpdates y guarda el offset
+        
+        Returns:
+            Número de actualizaciones procesadas
+        """
         if not updates:
             print("✨ No hay mensajes nuevos en cola")
-            return
+            return 0
         
         print(f"📬 Hay {len(updates)} mensaje(s) en cola para procesar")
+        METRICS.inc('updates', len(updates))
         
-        for i, update in enumerate(updates):
-            try:
-                update_id = update.get('update_id', 'unknown')
-                print(f"\n--- Procesando update {i+1}/{len(updates)} (ID: {update_id}) ---")
-                
-                # Actualizar offset
-                self.offset = int(update_id) + 1
-                
-                # Procesar mensaje
-                if 'message' in update:
-                    self.process_message(update['message'])
-                else:
-                    print(f"⚠️ Update {update_id} no contiene mensaje")
-            
-            except Exception as e:
-                print(f"❌ Error procesando update {update.get('update_id')}: {e}")
-                import traceback
-                traceback.print_exc()
+        # Los chats se procesan en paralelo y los mensajes de cada chat en orden;
+        # los cambios de suscripciones del lote se guardan de una vez
+        dispatcher = self.get_dispatcher()
+        with self.subscription_manager.batch():
+            for update in updates:
+                dispatcher.submit(update)
+            # Con una cola larga se guarda el progreso cada cierto tiempo: el offset
+            # solo avanza hasta el último update_id con todos los anteriores terminados
+            while not dispatcher.join(timeout=BOT_CHECKPOINT_INTERVAL):
+                self.checkpoint(dispatcher)
         
         # Guardar offset
+        self.offset = dispatcher.committed_offset()
         self.save_offset(self.offset)
         print(f"\n✅ Todos los mensajes procesados correctamente")
+        return len(updates)
+    
+    def get_dispatcher(self) -> ChatDispatcher:
+        """Dispatcher de updates por chat (se crea la primera vez)"""
+        if self.dispatcher is None:
+            self.dispatcher = ChatDispatcher(self.process_update, BOT_WORKERS, offset=self.offset)
+        return self.dispatcher
+    
+    def checkpoint(self, dispatcher: ChatDispatcher):
+        """Guarda las suscripciones y el offset de lo ya terminado"""
+        offset = dispatcher.committed_offset()
+        if offset != self.saved_offset:
+            self.subscription_manager.flush()
+            self.offset = offset
+            self.save_offset(offset)
+    
+    def close(self):
+        """Detiene los hilos del dispatcher"""
+        if self.dispatcher is not None:
+            self.dispatcher.close()
+            self.dispatcher = None
+    
+    def handle_shutdown_signal(self, signum, frame):
+        """Detiene el daemon tras terminar el lote en curso"""
+        print(f"\n🛑 Señal {signal.Signals(signum).name} recibida, deteniendo el bot...")
+        self.running = False
+        # Si está esperando (getUpdates o reintento) no hay nada a medias: se corta ya
+        if self.idle:
+            raise PollInterrupted()
+    
+    def run_daemon(self, poll_timeout: int = BOT_POLL_TIMEOUT):
+        """
+        Mantiene el bot en marcha con long polling
+        
+        El offset se conserva en memoria y se guarda en .telegram_offset tras
+        cada lote, así un reinicio continúa donde se quedó.
+        """
+        self.running = True
+        signal.signal(signal.SIGTERM, self.handle_shutdown_signal)
+        signal.signal(signal.SIGINT, self.handle_shutdown_signal)
+        print(f"🔁 Modo daemon: long polling con timeout de {poll_timeout}s")
+        
+        backoff = BOT_ERROR_BACKOFF
+        try:
+            while self.running:
+                try:
+                    self.process_updates(timeout=poll_timeout)
+                except PollInterrupted:
+                    break
+                
+                if self.poll_failed and self.running:
+                    print(f"⏳ Reintentando en {backoff}s...")
+                    self.idle = True
+                    try:
+                        time.sleep(backoff)
+                    except PollInterrupted:
+                        break
+                    finally:
+                        self.idle = False
+                    backoff = min(backoff * 2, BOT_MAX_ERROR_BACKOFF)
+                else:
+                    backoff = BOT_ERROR_BACKOFF
+        finally:
+            self.close()
+            self.subscription_manager.flush()
+            if self.offset != self.saved_offset:
+                self.save_offset(self.offset)
+        print("👋 Bot detenido")
+    
+    def set_webhook(self, url: str, secret: str = WEBHOOK_SECRET) -> bool:
+        """Registra la URL pública del webhook en Telegram"""
+        data = {'url': url, 'allowed_updates': json.dumps(['message'])}
+        if secret:
+            data['secret_token'] = secret
+        try:
+            response = self.http.post(f"{self.base_url}/setWebhook", data=data)
+            ok = response.status_code == 200 and response.json().get('ok')
+        except Exception as e:
+            print(f"❌ Excepción al registrar el webhook: {e}")
+            return False
+        print(f"{'✅' if ok else '❌'} Webhook {'registrado' if ok else 'no registrado'}: {url}")
+        return bool(ok)
+    
+    def run_webhook(self, host: str = WEBHOOK_HOST, port: int = WEBHOOK_PORT, path: str = WEBHOOK_PATH,
+                    workers: int = BOT_WORKERS):
+        """
+        Atiende los updates que Telegram envía por POST (sin long polling)
+        
+        Los updates se encolan al recibirlos y un pool de hilos los procesa:
+        en orden dentro de cada chat y en paralelo entre chats. Mientras haya
+        un webhook registrado, Telegram no permite usar getUpdates.
+        
+        Sin WEBHOOK_SECRET solo se acepta escuchar en local: cualquiera que
+        llegue al puerto podría enviar updates en nombre de cualquier chat.
+        """
+        if not WEBHOOK_SECRET and not is_loopback(host):
+            print(f"❌ Error: el webhook escucharía en {host} sin WEBHOOK_SECRET")
+            print("💡 Define WEBHOOK_SECRET o usa WEBHOOK_HOST=127.0.0.1 detrás de un proxy")
+            sys.exit(1)
+        dispatcher = ChatDispatcher(self.process_update, workers, offset=self.offset)
+        httpd = ThreadingHTTPServer((host, port), WebhookHandler)
+        httpd.daemon_threads = True
+        httpd.dispatcher = dispatcher
+        httpd.webhook_path = path
+        httpd.webhook_secret = WEBHOOK_SECRET
+        
+        stop = threading.Event()
+        def request_stop(signum, frame):
+            print(f"\n🛑 Señal {signal.Signals(signum).name} recibida, deteniendo el webhook...")
+            stop.set()
+        signal.signal(signal.SIGTERM, request_stop)
+        signal.signal(signal.SIGINT, request_stop)
+        
+        if WEBHOOK_URL:
+            self.set_webhook(WEBHOOK_URL)
+        server_thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+        server_thread.start()
+        print(f"🌐 Webhook escuchando en http://{host}:{httpd.server_address[1]}{path} con {workers} hilo(s)")
+        try:
+            stop.wait()
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+            # Se terminan los updates ya recibidos antes de guardar
+            dispatcher.close()
+            self.subscription_manager.flush()
+            self.offset = dispatcher.committed_offset()
+            if self.offset != self.saved_offset:
+                self.save_offset(self.offset)
+        print("👋 Bot detenido")
 
 def main():
     """Función principal"""
+    parser = argparse.ArgumentParser(description="Bot de Telegram - TMP Murcia")
+    parser.add_argument('--daemon', action='store_true',
+                        help="Mantener el bot en marcha con long polling en lugar de procesar la cola y salir")
+    parser.add_argument('--poll-timeout', type=int, default=BOT_POLL_TIMEOUT,
+                        help="Segundos de long polling por petición en modo daemon")
+    parser.add_argument('--webhook', action='store_true',
+                        help="Recibir los updates por webhook con un servidor HTTP local")
+    parser.add_argument('--port', type=int, default=WEBHOOK_PORT, help="Puerto del servidor del webhook")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    if args.profile:
+        PROFILER.enable(args.profile)
+    
     print("=" * 60)
     print("🤖 Bot de Telegram - TMP Murcia (versión mejorada)")
     print(f"📅 {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}")
@@ -327,13 +681,21 @@ def main():
     
     try:
         bot = TelegramBot()
-        bot.process_updates()
+        if args.webhook:
+            bot.run_webhook(port=args.port)
+        elif args.daemon:
+            bot.run_daemon(args.poll_timeout)
+        else:
+            bot.process_updates()
+            bot.close()
     except Exception as e:
         print(f"\n❌ Error crítico: {e}")
         import traceback
         traceback.print_exc()
         sys.exit(1)
     
+    get_http_client().print_stats()
+    METRICS.write('bot')
     print("=" * 60)
     print("✅ Procesamiento completado exitosamente")
     print("=" * 60)
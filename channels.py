@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Canales de difusión por línea
+
+Con miles de suscriptores, una alerta de una línea muy seguida son miles de
+sendMessage. En modo canales (CHANNELS_MODE) cada línea, y las alertas
+generales, pueden tener un canal de Telegram donde el bot es administrador:
+el monitor publica cada alerta una vez en el canal de cada línea afectada y
+/suscribir responde con el enlace de invitación del canal.
+
+- CHANNELS_MODE=only: las líneas con canal ya no se envían a nadie en
+  privado; las que no tienen canal siguen como siempre.
+- CHANNELS_MODE=both: se publica en el canal y además se envía en privado a
+  los suscritos (útil mientras los usuarios se pasan a los canales).
+
+Formato de CHANNELS_FILE (channels.json):
+
+    {
+      "lines": {
+        "11": {"chat_id": "@tmp_linea_11", "invite_link": "https://t.me/tmp_linea_11"}
+      },
+      "general": {"chat_id": "-1001234567890", "invite_link": "https://t.me/+AbCdEf"}
+    }
+"""
+
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+# "off" (por defecto), "only" o "both"
+CHANNELS_MODE = os.environ.get('CHANNELS_MODE', 'off')
+CHANNELS_FILE = os.environ.get('CHANNELS_FILE', 'channels.json')
+
+
+class ChannelMap:
+    """Canal (chat_id e invitación) de cada línea y de las alertas generales"""
+
+    def __init__(self, lines: Dict[str, dict], general: Optional[dict] = None, mode: str = 'only'):
+        self.lines = {str(line).upper(): channel for line, channel in lines.items()}
+        self.general = general
+        self.mode = mode
+
+    @classmethod
+    def load(cls, path: str = CHANNELS_FILE, mode: str = CHANNELS_MODE):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        channels = list(data.get('lines', {}).values()) + ([data['general']] if data.get('general') else [])
+        if any('chat_id' not in channel for channel in channels):
+            raise ValueError("todos los canales necesitan chat_id")
+        return cls(data.get('lines', {}), data.get('general'), mode)
+
+    def channel_for_line(self, line: str) -> Optional[dict]:
+        return self.lines.get(line)
+
+    def channel_lines(self) -> set:
+        """Líneas que tienen canal (se vigilan aunque nadie se haya suscrito en privado)"""
+        return set(self.lines)
+
+    def route(self, alert: dict) -> Tuple[List[str], List[str], bool]:
+        """
+        Reparte una alerta entre canales y envíos privados
+
+        Returns:
+            (chat_ids de los canales, líneas que se envían en privado,
+            si se envía en privado a los usuarios con alertas generales)
+        """
+        lines = alert['lines']
+        if not lines:
+            channel_ids = [self.general['chat_id']] if self.general else []
+            return channel_ids, [], not (self.general and self.mode == 'only')
+
+        channel_ids = []
+        private_lines = []
+        for line in lines:
+            channel = self.lines.get(line)
+            if channel is not None and channel['chat_id'] not in channel_ids:
+                channel_ids.append(channel['chat_id'])
+            if channel is None or self.mode == 'both':
+                private_lines.append(line)
+        return channel_ids, private_lines, False
+
+
+def invite_link(channel: dict) -> str:
+    """Enlace para unirse al canal (los públicos, @nombre, no necesitan invite_link)"""
+    if channel.get('invite_link'):
+        return channel['invite_link']
+    chat_id = str(channel['chat_id'])
+    return f"https://t.me/{chat_id[1:]}" if chat_id.startswith('@') else ''
+
+
+_channel_map = None
+_channel_map_loaded = False
+
+
+def get_channel_map() -> Optional[ChannelMap]:
+    """Canales configurados, o None si el modo canales está desactivado"""
+    global _channel_map, _channel_map_loaded
+    if not _channel_map_loaded:
+        _channel_map_loaded = True
+        if CHANNELS_MODE not in ('only', 'both'):
+            return None
+        try:
+            _channel_map = ChannelMap.load()
+            print(f"📡 Modo canales ({CHANNELS_MODE}): {len(_channel_map.lines)} línea(s) con canal"
+                  + (" y canal de alertas generales" if _channel_map.general else ""))
+        except FileNotFoundError:
+            print(f"⚠️ CHANNELS_MODE={CHANNELS_MODE} pero no existe {CHANNELS_FILE}, se envía en privado")
+        except (ValueError, AttributeError) as e:
+            print(f"❌ Error al leer {CHANNELS_FILE}: {e}; se envía en privado")
+    return _channel_map
@@ -2,9 +2,14 @@
 # Este archivo muestra las opciones de configuración disponibles
 # Para usarlo, edita los valores en scraper.py directamente
 
-# URL de la página de TMP Murcia
+# URL de la página de TMP Murcia (variable de entorno TMP_URL)
+# Los enlaces de las alertas se resuelven respecto a esta URL
 TMP_URL = "https://tmpmurcia.es/ultima.asp"
 
+# URL base de la API de bots de Telegram (variable de entorno TELEGRAM_API_URL)
+# Útil para apuntar a un servidor falso en pruebas de carga (ver fakes.py)
+TELEGRAM_API_URL = "https://api.telegram.org"
+
 # Líneas de autobús a monitorear
 # Puedes añadir o quitar números según tus necesidades
 LINES_TO_MONITOR = [
@@ -29,15 +34,183 @@ MESSAGE_TEMPLATE = """🚌 *Nueva Alerta TMP Murcia*
 ⏰ {date}
 """
 
-# Palabras clave para filtrar alertas (opcional)
+# Palabras clave para filtrar alertas (opcional, keywords.py)
 # Si está vacío, se envían todas las alertas de las líneas monitoreadas
 # Si tiene valores, solo se envían alertas que contengan estas palabras
+# Se lee de la variable de entorno KEYWORDS_FILTER, separadas por comas: "obras,corte,desvío"
+# (las palabras que sigue cada usuario con /palabra se guardan con sus suscripciones)
 KEYWORDS_FILTER = [
     # "obras",
     # "corte",
     # "desvío",
 ]
 
-# Configuración de reintentos en caso de error
+# Configuración de reintentos en caso de error (http_client.py)
+# Se leen de las variables de entorno MAX_RETRIES y RETRY_DELAY_SECONDS.
+# RETRY_DELAY_SECONDS es la base de la espera exponencial entre reintentos.
+# Solo se reintentan peticiones GET ante errores de conexión o respuestas 5xx.
 MAX_RETRIES = 3
 RETRY_DELAY_SECONDS = 5
+
+# ---------------------------------------------------------------
+# Opciones avanzadas (se leen de variables de entorno)
+# ---------------------------------------------------------------
+
+# Envío de notificaciones (delivery.py)
+# DELIVERY_WORKERS: hilos que envían mensajes en paralelo
+# TELEGRAM_GLOBAL_RATE: mensajes por segundo como máximo en total
+# TELEGRAM_PER_CHAT_INTERVAL: segundos mínimos entre mensajes a un mismo chat
+# DELIVERY_MAX_RETRIES: reintentos por mensaje (errores de red o 429)
+# DELIVERY_RETRY_BACKOFF / DELIVERY_MAX_RETRY_BACKOFF: espera (s) tras un error de red,
+#   que se duplica en cada reintento (con parte al azar), y su máximo
+DELIVERY_WORKERS = 8
+TELEGRAM_GLOBAL_RATE = 30
+TELEGRAM_PER_CHAT_INTERVAL = 1.0
+DELIVERY_MAX_RETRIES = 3
+DELIVERY_RETRY_BACKOFF = 1
+DELIVERY_MAX_RETRY_BACKOFF = 30
+
+# Suscripciones (subscriptions.py)
+# SUBSCRIPTIONS_WRITE_BEHIND: "1" para guardar solo al final de cada lote o al salir
+# SUBSCRIPTIONS_COMPACT_JSON: "1" para guardar subscriptions.json sin indentar
+# SUBSCRIPTIONS_COMPACT_INDEX: "1" para guardar las suscripciones en memoria solo en arrays
+#   de enteros (unas 20 veces menos memoria con muchos usuarios; ver subscription_index.py)
+SUBSCRIPTIONS_WRITE_BEHIND = "0"
+SUBSCRIPTIONS_COMPACT_JSON = "0"
+SUBSCRIPTIONS_COMPACT_INDEX = "0"
+
+# Análisis de la página (parsers.py)
+# TMP_PARSER: "stream" (por defecto), "strainer" o "bs4"
+TMP_PARSER = "stream"
+
+# Bot en modo daemon (python bot.py --daemon)
+# BOT_POLL_TIMEOUT: segundos de long polling por cada petición getUpdates
+# BOT_CHECKPOINT_INTERVAL: con colas largas, cada cuántos segundos se guardan las
+#   suscripciones y el offset de lo ya terminado
+BOT_POLL_TIMEOUT = 50
+BOT_CHECKPOINT_INTERVAL = 5
+
+# Bot en modo webhook (python bot.py --webhook) y procesamiento de updates
+# BOT_WORKERS: hilos que procesan updates (en orden por chat, en paralelo entre chats),
+#   también en python bot.py y en modo daemon
+# WEBHOOK_HOST / WEBHOOK_PORT / WEBHOOK_PATH: dirección del servidor HTTP local
+# WEBHOOK_SECRET: se exige en la cabecera X-Telegram-Bot-Api-Secret-Token
+#   (obligatorio si WEBHOOK_HOST no es una dirección local)
+# WEBHOOK_URL: URL pública que se registra con setWebhook al arrancar
+BOT_WORKERS = 8
+WEBHOOK_HOST = "127.0.0.1"
+WEBHOOK_PORT = 8443
+WEBHOOK_PATH = "/webhook"
+WEBHOOK_SECRET = ""
+WEBHOOK_URL = ""
+
+# Servicio único (python service.py)
+# SCRAPE_INTERVAL: segundos entre consultas a la página de TMP
+SCRAPE_INTERVAL = 300
+
+# Cliente HTTP compartido (http_client.py)
+# HTTP_POOL_SIZE: conexiones keep-alive como máximo por host
+# HTTP_DEFAULT_TIMEOUT: timeout (segundos) para hosts sin política propia
+# Los timeouts por host están en http_client.HOST_POLICIES
+# (tmpmurcia.es: 30 s, api.telegram.org: 10 s)
+HTTP_POOL_SIZE = 16
+HTTP_DEFAULT_TIMEOUT = 15
+
+# Almacenamiento (storage.py)
+# STORAGE_BACKEND: "json" (subscriptions.json y alerts_history.json) o "sqlite"
+# SQLITE_PATH: ruta de la base de datos cuando STORAGE_BACKEND="sqlite"
+# Para pasar de JSON a SQLite: python migrate_to_sqlite.py
+STORAGE_BACKEND = "json"
+SQLITE_PATH = "tmp_alerts.db"
+
+# Métricas (metrics.py)
+# METRICS_ENABLED: "1" para medir cada etapa (descarga, análisis, filtrado,
+#   comparación, envío, guardado y cada comando del bot)
+# METRICS_DIR: carpeta donde se escribe <ejecución>.prom (formato de Prometheus)
+# METRICS_JSONL: archivo al que se añade una línea JSON por ejecución
+METRICS_ENABLED = "0"
+METRICS_DIR = "metrics"
+METRICS_JSONL = "metrics/runs.jsonl"
+
+# Perfilado (profiling.py, o python scraper.py/bot.py --profile [CARPETA])
+# PROFILE_DIR: si se define, perfila scrape_tmp_alerts, send_telegram_notifications
+#   y process_updates con cProfile y tracemalloc y guarda los informes en esa carpeta
+# PROFILE_TOP: funciones y líneas de memoria que se muestran en cada informe
+PROFILE_DIR = ""
+PROFILE_TOP = 30
+
+# Cola persistente de notificaciones (outbox.py)
+# OUTBOX_ENABLED: "1" (por defecto) encola los envíos en SQLite antes de guardar
+#   el historial; "0" envía directamente como antes
+# OUTBOX_PATH: base de datos de la cola (el workflow la guarda en el repositorio)
+# OUTBOX_BATCH_SIZE: trabajos que se reclaman por transacción (cada resultado se
+#   confirma en cuanto vuelve su envío)
+# OUTBOX_MAX_ATTEMPTS: intentos antes de dar un envío por fallido
+# OUTBOX_BACKOFF / OUTBOX_MAX_BACKOFF: espera (s) antes del primer reintento, que
+#   se duplica en cada fallo, y su máximo
+# OUTBOX_RETENTION_DAYS: días que se conservan los envíos terminados
+OUTBOX_ENABLED = "1"
+OUTBOX_PATH = "outbox.db"
+OUTBOX_BATCH_SIZE = 500
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_BACKOFF = 30
+OUTBOX_MAX_BACKOFF = 21600
+OUTBOX_RETENTION_DAYS = 30
+
+# Formato de las notificaciones (messages.py)
+# DIGEST_MODE: "1" para enviar a cada usuario un único resumen con todas sus
+#   alertas nuevas (se parte solo si supera los 4096 caracteres de Telegram)
+DIGEST_MODE = "0"
+
+# Detalle de las alertas (alert_details.py)
+# DETAILS_ENABLED: "1" para descargar el Cuerpo.asp de las alertas nuevas sin línea
+#   en el título y buscar en él la línea afectada
+# DETAILS_WORKERS: descargas simultáneas
+# DETAILS_CACHE_DIR: carpeta con el texto de cada aviso (uno por código)
+# DETAILS_CACHE_MAX_MB / DETAILS_CACHE_MAX_AGE_DAYS: tamaño máximo de la caché y
+#   días sin usarse tras los que se borra un aviso
+DETAILS_ENABLED = "0"
+DETAILS_WORKERS = 8
+DETAILS_CACHE_DIR = ".details_cache"
+DETAILS_CACHE_MAX_MB = 20
+DETAILS_CACHE_MAX_AGE_DAYS = 90
+
+# Canales de difusión por línea (channels.py)
+# CHANNELS_MODE: "off" (por defecto), "only" (las líneas con canal solo se publican
+#   en su canal) o "both" (canal y además mensajes privados)
+# CHANNELS_FILE: JSON con el canal de cada línea y el de las alertas generales:
+#   {"lines": {"11": {"chat_id": "@tmp_linea_11", "invite_link": "https://t.me/tmp_linea_11"}},
+#    "general": {"chat_id": "-1001234567890", "invite_link": "https://t.me/+AbCdEf"}}
+#   El bot tiene que ser administrador de cada canal para poder publicar
+CHANNELS_MODE = "off"
+CHANNELS_FILE = "channels.json"
+
+# Palabras clave de los usuarios (keywords.py, comando /palabra)
+# KEYWORDS_MATCH_BODY: "1" para buscar también en el texto de Cuerpo.asp de las
+#   alertas nuevas (se descarga una vez y se guarda en DETAILS_CACHE_DIR)
+# KEYWORDS_MAX_PER_USER: palabras que puede seguir cada usuario
+KEYWORDS_MATCH_BODY = "0"
+KEYWORDS_MAX_PER_USER = 10
+
+# Estado del monitor entre ejecuciones (state.py)
+# El historial de alertas solo se reescribe cuando cambia el conjunto de códigos
+# RUN_STATE_FILE: datos volátiles de la última ejecución (hora de consulta y de
+#   último cambio); no se sube al repositorio
+RUN_STATE_FILE = ".monitor_run.json"
+# LEDGER_FILE: todos los códigos de alerta vistos alguna vez, con la primera y la
+#   última vez; decide qué alerta es nueva (se sube al repositorio)
+# LEDGER_MAX_AGE_DAYS: los códigos que ya no están en la página se olvidan tras
+#   estos días sin verse
+LEDGER_FILE = "alerts_ledger.json"
+LEDGER_MAX_AGE_DAYS = 365
+
+# Intervalo de consulta adaptativo del servicio (scheduler.py, service.py --adaptive)
+# POLL_ADAPTIVE: "1" para aprender de alerts_ledger.json cuándo suele publicar TMP
+# POLL_MIN_INTERVAL / POLL_MAX_INTERVAL: límites de la espera entre consultas (segundos)
+# POLL_BACKOFF_FACTOR: cuánto se multiplica la espera tras cada consulta sin novedades
+# POLL_MIN_SAMPLES: alertas necesarias antes de fiarse del perfil semanal
+POLL_ADAPTIVE = "0"
+POLL_MIN_INTERVAL = 120
+POLL_MAX_INTERVAL = 1800
+POLL_BACKOFF_FACTOR = 2
+POLL_MIN_SAMPLES = 20
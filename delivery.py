@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Motor de envío concurrente de notificaciones de Telegram
+Reparte los mensajes entre varios hilos respetando los límites de la API
+"""
+
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from http_client import get_http_client, TELEGRAM_API_URL
+from metrics import METRICS
+
+# Configuración (se puede sobrescribir con variables de entorno)
+DELIVERY_WORKERS = int(os.environ.get('DELIVERY_WORKERS', '8'))
+# Telegram permite ~30 mensajes/segundo en total y ~1 mensaje/segundo por chat
+TELEGRAM_GLOBAL_RATE = float(os.environ.get('TELEGRAM_GLOBAL_RATE', '30'))
+TELEGRAM_PER_CHAT_INTERVAL = float(os.environ.get('TELEGRAM_PER_CHAT_INTERVAL', '1.0'))
+DELIVERY_MAX_RETRIES = int(os.environ.get('DELIVERY_MAX_RETRIES', '3'))
+# Espera tras un error de red antes del primer reintento; se duplica en cada intento hasta el máximo
+DELIVERY_RETRY_BACKOFF = float(os.environ.get('DELIVERY_RETRY_BACKOFF', '1'))
+DELIVERY_MAX_RETRY_BACKOFF = float(os.environ.get('DELIVERY_MAX_RETRY_BACKOFF', '30'))
+
+
+class RateLimiter:
+    """Limitador token bucket compartido por todos los hilos de envío"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def block_for(self, seconds: float):
+        """Pausa todos los envíos (p.ej. tras un 429 de Telegram)"""
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def acquire(self):
+        """Espera hasta que haya un token disponible"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class TelegramDelivery:
+    """
+    Envía mensajes a muchos chats a la vez
+
+    Respeta el límite global de la API, el intervalo mínimo entre mensajes
+    a un mismo chat y el parámetro retry_after de las respuestas 429.
+    Una misma instancia puede reutilizarse para varias alertas, de modo que
+    los límites por chat se mantienen entre ellas.
+    """
+
+    def __init__(self, token: str, max_workers: int = DELIVERY_WORKERS,
+                 global_rate: float = TELEGRAM_GLOBAL_RATE,
+                 per_chat_interval: float = TELEGRAM_PER_CHAT_INTERVAL,
+                 max_retries: int = DELIVERY_MAX_RETRIES,
+                 session=None, retry_backoff: float = DELIVERY_RETRY_BACKOFF,
+                 max_retry_backoff: float = DELIVERY_MAX_RETRY_BACKOFF):
+        self.url = f"{TELEGRAM_API_URL}/bot{token}/sendMessage"
+        self.max_workers = max(1, max_workers)
+        self.per_chat_interval = per_chat_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_retry_backoff = max_retry_backoff
+        self.session = session or get_http_client()
+        self.limiter = RateLimiter(global_rate)
+        self.chat_next_send: Dict[str, float] = {}
+        self.chat_lock = threading.Lock()
+
+    def _wait_for_chat(self, chat_id: str):
+        """Reserva el siguiente hueco libre para un chat y espera hasta él"""
+        with self.chat_lock:
+            now = time.monotonic()
+            slot = max(now, self.chat_next_send.get(chat_id, 0.0))
+            self.chat_next_send[chat_id] = slot + self.per_chat_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def _retry_delay(self, attempt: int) -> float:
+        """Espera exponencial tras el intento attempt (desde 0), con la mitad al azar para no reintentar todos a la vez"""
+        delay = min(self.retry_backoff * 2 ** attempt, self.max_retry_backoff)
+        return delay * random.uniform(0.5, 1.0)
+
+    def send_one(self, chat_id: str, text: str, parse_mode: str = 'Markdown') -> dict:
+        """
+        Envía un mensaje a un chat, reintentando si Telegram pide esperar
+
+        Si falla, 'retryable' indica si merece la pena volver a intentarlo más
+        tarde (red, 429, 5xx) o si el error es definitivo (chat bloqueado...)
+        """
+        data = {
+            'chat_id': chat_id,
+            'text': text,
+            'parse_mode': parse_mode,
+            'disable_web_page_preview': True
+        }
+        start = time.monotonic()
+        error = None
+        retryable = True
+        for attempt in range(self.max_retries + 1):
+            self._wait_for_chat(chat_id)
+            self.limiter.acquire()
+            try:
+                response = self.session.post(self.url, data=data)
+            except Exception as e:
+                # Red caída o inestable: se espera antes de gastar el siguiente intento
+                error = str(e)
+                if attempt < self.max_retries:
+                    time.sleep(self._retry_delay(attempt))
+                continue
+
+            if response.status_code == 200:
+                latency = time.monotonic() - start
+                METRICS.observe('telegram_send_seconds', latency)
+                return {'chat_id': chat_id, 'ok': True, 'latency': latency}
+
+            if response.status_code == 429:
+                METRICS.inc('telegram_throttled')
+                retry_after = _retry_after(response)
+                self.limiter.block_for(retry_after)
+                error = f"429 (retry_after={retry_after}s)"
+                continue
+
+            # Otros errores (chat bloqueado, id inválido...) no se reintentan ahora
+            error = str(response.status_code)
+            retryable = response.status_code >= 500
+            break
+
+        latency = time.monotonic() - start
+        METRICS.observe('telegram_send_seconds', latency)
+        return {'chat_id': chat_id, 'ok': False, 'error': error, 'retryable': retryable, 'latency': latency}
+
+    def send_many(self, chat_ids: List[str], text: str, parse_mode: str = 'Markdown') -> dict:
+        """
+        Envía el mismo mensaje a una lista de chats de forma concurrente
+
+        Returns:
+            Informe con enviados, fallidos, duración, mensajes/segundo y latencias
+        """
+        start = time.monotonic()
+        if not chat_ids:
+            return _build_report([], 0.0)
+
+        workers = min(self.max_workers, len(chat_ids))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(lambda chat_id: self.send_one(chat_id, text, parse_mode), chat_ids))
+
+        return _build_report(results, time.monotonic() - start)
+
+
+def _retry_after(response) -> float:
+    """Lee el tiempo de espera que pide Telegram en una respuesta 429"""
+    try:
+        return float(response.json().get('parameters', {}).get('retry_after', 1))
+    except Exception:
+        return float(response.headers.get('Retry-After', 1))
+
+
+def _build_report(results: List[dict], elapsed: float) -> dict:
+    """Resume los resultados de un envío masivo"""
+    latencies = sorted(r['latency'] for r in results)
+    sent = sum(1 for r in results if r['ok'])
+
+    def percentile(p):
+        if not latencies:
+            return 0.0
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+    return {
+        'total': len(results),
+        'sent': sent,
+        'failed': [r for r in results if not r['ok']],
+        'elapsed': elapsed,
+        'throughput': sent / elapsed if elapsed > 0 else 0.0,
+        'latency_avg': sum(latencies) / len(latencies) if latencies else 0.0,
+        'latency_p50': percentile(0.50),
+        'latency_p95': percentile(0.95),
+        'latency_max': latencies[-1] if latencies else 0.0
+    }
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Reparto de updates de Telegram entre varios hilos
+
+Los updates de un mismo chat se procesan en orden, uno detrás de otro, y
+los de chats distintos en paralelo. Cada update_id se procesa una sola vez
+(Telegram repite los webhooks que no se confirman a tiempo) y el
+dispatcher sabe hasta qué update_id está todo terminado, que es el offset
+que se puede confirmar sin perder nada si el proceso muere.
+"""
+
+import os
+import threading
+from collections import deque
+from typing import Callable, Deque, Dict, Set
+
+from metrics import METRICS
+
+BOT_WORKERS = int(os.environ.get('BOT_WORKERS', '8'))
+
+
+def update_chat_key(update: dict):
+    """Chat al que pertenece un update (los que no son mensajes van cada uno por su lado)"""
+    for field in ('message', 'edited_message', 'channel_post', 'callback_query'):
+        payload = update.get(field)
+        if payload:
+            chat = payload.get('chat') or payload.get('message', {}).get('chat') or payload.get('from') or {}
+            if 'id' in chat:
+                return str(chat['id'])
+    return f"update:{update.get('update_id')}"
+
+
+class ChatDispatcher:
+    """
+    Pool de hilos con una cola FIFO por chat
+
+    Args:
+        handler: Función que procesa un update (sus excepciones se registran y
+                 el update se da por terminado)
+        workers: Número de hilos
+        offset: Primer update_id pendiente; los anteriores se ignoran
+    """
+
+    def __init__(self, handler: Callable[[dict], None], workers: int = BOT_WORKERS, offset: int = 0):
+        self.handler = handler
+        self.condition = threading.Condition()
+        self.chat_queues: Dict[str, Deque[dict]] = {}
+        self.ready: Deque[str] = deque()
+        self.active_chats: Set[str] = set()
+        # update_ids recibidos y aún sin terminar, y los terminados por encima del offset
+        self.pending: Set[int] = set()
+        self.done: Set[int] = set()
+        self.offset = offset
+        self.max_seen = offset - 1
+        self.running = True
+        self.threads = [threading.Thread(target=self.worker, name=f"dispatcher-{i}", daemon=True)
+                        for i in range(max(1, workers))]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, update: dict) -> bool:
+        """
+        Encola un update
+
+        Returns:
+            False si el update ya se había recibido antes (se ignora)
+        """
+        update_id = int(update['update_id'])
+        chat = update_chat_key(update)
+        with self.condition:
+            if update_id < self.offset or update_id in self.pending or update_id in self.done:
+                METRICS.inc('updates_duplicated')
+                return False
+            self.pending.add(update_id)
+            self.max_seen = max(self.max_seen, update_id)
+            queue = self.chat_queues.setdefault(chat, deque())
+            queue.append(update)
+            if chat not in self.active_chats and len(queue) == 1:
+                self.ready.append(chat)
+                # notify_all: en la misma condición puede haber alguien esperando en join()
+                self.condition.notify_all()
+        return True
+
+    def worker(self):
+        while True:
+            with self.condition:
+                while self.running and not self.ready:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                chat = self.ready.popleft()
+                self.active_chats.add(chat)
+                update = self.chat_queues[chat].popleft()
+
+            try:
+                self.handler(update)
+            except Exception as e:
+                print(f"❌ Error procesando update {update.get('update_id')}: {e}")
+
+            with self.condition:
+                self.finish(int(update['update_id']))
+                self.active_chats.discard(chat)
+                if self.chat_queues[chat]:
+                    self.ready.append(chat)
+                else:
+                    del self.chat_queues[chat]
+                self.condition.notify_all()
+
+    def finish(self, update_id: int):
+        """Marca un update como terminado y avanza el offset por los terminados consecutivos"""
+        self.pending.discard(update_id)
+        self.done.add(update_id)
+        limit = min(self.pending) if self.pending else self.max_seen + 1
+        if limit > self.offset:
+            self.done = {done_id for done_id in self.done if done_id >= limit}
+            self.offset = limit
+
+    def committed_offset(self) -> int:
+        """Offset que se puede confirmar: todos los update_id anteriores están terminados"""
+        with self.condition:
+            return self.offset
+
+    def join(self, timeout: float = None) -> bool:
+        """
+        Espera a que se terminen todos los updates encolados
+
+        Returns:
+            False si pasó el timeout y aún quedan updates pendientes
+        """
+        with self.condition:
+            return self.condition.wait_for(lambda: not self.pending, timeout)
+
+    def close(self):
+        """Termina lo encolado y detiene los hilos"""
+        self.join()
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        for thread in self.threads:
+            thread.join()
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Servidores locales que imitan la API de bots de Telegram y la web de TMP
+
+Permiten ejecutar el bot y el monitor completos sin acceder a la red:
+
+    TELEGRAM_API_URL=http://127.0.0.1:8081 TMP_URL=http://127.0.0.1:8080/ultima.asp python scraper.py
+
+Uso:
+    python fakes.py telegram --port 8081 --latency 0.05 --throttle 0.01
+    python fakes.py tmp --port 8080 --alerts 20
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+from urllib.parse import parse_qs, urlparse
+
+ULTIMA_TEMPLATE = """<!DOCTYPE HTML PUBLIC "-//W3C//DTD HTML 4.01 Transitional//EN">
+<html>
+<head>
+<meta http-equiv="Content-Type" content="text/html; charset=iso-8859-1">
+<title>TMP Murcia - &Uacute;ltimas noticias</title>
+</head>
+<body>
+<div id="menu"><a href="lineas.asp">L&iacute;neas</a> | <a href="tarifas.asp">Tarifas</a></div>
+<table class="noticias" width="100%">
+{rows}
+</table>
+</body>
+</html>
+"""
+
+ULTIMA_ROW_TEMPLATE = ('<tr><td class="fecha">{date}</td><td class="titular">'
+                       '<a href="Cuerpo.asp?codigo={code}" class="enlace">{title}</a></td></tr>')
+
+CUERPO_TEMPLATE = """<!DOCTYPE HTML PUBLIC "-//W3C//DTD HTML 4.01 Transitional//EN">
+<html>
+<head>
+<meta http-equiv="Content-Type" content="text/html; charset=iso-8859-1">
+<title>TMP Murcia - {title}</title>
+</head>
+<body>
+<h1 class="titular">{title}</h1>
+<div class="cuerpo">{body}</div>
+</body>
+</html>
+"""
+
+
+class FakeServer:
+    """Servidor HTTP en un hilo propio (puerto 0 = uno libre cualquiera)"""
+
+    handler_class = BaseHTTPRequestHandler
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        handler = type(self.handler_class.__name__, (self.handler_class,), {'fake': self})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class QuietHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status: int, data: dict):
+        self.send_body(status, json.dumps(data).encode('utf-8'), 'application/json')
+
+    def read_params(self) -> dict:
+        """Parámetros de la query string y del cuerpo (formulario o JSON)"""
+        params = {k: v[-1] for k, v in parse_qs(urlparse(self.path).query).items()}
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            raw = self.rfile.read(length).decode('utf-8')
+            if 'json' in (self.headers.get('Content-Type') or ''):
+                params.update(json.loads(raw))
+            else:
+                params.update({k: v[-1] for k, v in parse_qs(raw).items()})
+        return params
+
+
+class FakeTelegramHandler(QuietHandler):
+    def do_GET(self):
+        self.dispatch()
+
+    def do_POST(self):
+        self.dispatch()
+
+    def dispatch(self):
+        path = urlparse(self.path).path
+        method = path.rsplit('/', 1)[-1]
+        params = self.read_params()
+        if method == 'getUpdates':
+            self.send_json(200, self.fake.get_updates(params))
+        elif method == 'sendMessage':
+            status, data = self.fake.send_message(params)
+            self.send_json(status, data)
+        else:
+            self.send_json(404, {'ok': False, 'error_code': 404, 'description': 'Not Found'})
+
+
+class FakeTelegramServer(FakeServer):
+    """
+    Imitación de la API de bots: getUpdates (con long polling) y sendMessage
+
+    Args:
+        latency: Segundos que tarda cada sendMessage
+        throttle_rate: Probabilidad de responder 429 con retry_after
+        retry_after: Segundos de espera que se piden en los 429
+        error_rate: Probabilidad de responder 500
+    """
+
+    handler_class = FakeTelegramHandler
+
+    def __init__(self, latency: float = 0.0, throttle_rate: float = 0.0, retry_after: int = 1,
+                 error_rate: float = 0.0, seed: int = 0, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.condition = threading.Condition()
+        self.updates: List[dict] = []
+        self.next_update_id = 1
+        self.messages: List[dict] = []
+        self.throttled = 0
+        self.errors = 0
+
+    def push_message(self, chat_id, text: str, first_name: str = 'Usuario') -> int:
+        """Encola un mensaje de usuario como si lo hubiera escrito en Telegram"""
+        with self.condition:
+            update_id = self.next_update_id
+            self.next_update_id += 1
+            self.updates.append({
+                'update_id': update_id,
+                'message': {
+                    'message_id': update_id,
+                    'date': int(time.time()),
+                    'chat': {'id': int(chat_id), 'first_name': first_name, 'type': 'private'},
+                    'text': text
+                }
+            })
+            self.condition.notify_all()
+        return update_id
+
+    def get_updates(self, params: dict) -> dict:
+        offset = int(params.get('offset') or 0)
+        timeout = float(params.get('timeout') or 0)
+        limit = int(params.get('limit') or 100)
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            # Igual que Telegram: pedir un offset confirma los updates anteriores
+            self.updates = [u for u in self.updates if u['update_id'] >= offset]
+            while not self.updates and time.monotonic() < deadline:
+                self.condition.wait(deadline - time.monotonic())
+            return {'ok': True, 'result': self.updates[:limit]}
+
+    def send_message(self, params: dict):
+        if self.latency:
+            time.sleep(self.latency)
+        with self.condition:
+            roll = self.rng.random()
+            if roll < self.throttle_rate:
+                self.throttled += 1
+                return 429, {'ok': False, 'error_code': 429,
+                             'description': f'Too Many Requests: retry after {self.retry_after}',
+                             'parameters': {'retry_after': self.retry_after}}
+            if roll < self.throttle_rate + self.error_rate:
+                self.errors += 1
+                return 500, {'ok': False, 'error_code': 500, 'description': 'Internal Server Error'}
+            self.messages.append({'chat_id': str(params.get('chat_id')), 'text': params.get('text', ''),
+                                  'time': time.monotonic()})
+            return 200, {'ok': True, 'result': {'message_id': len(self.messages)}}
+
+    def stats(self) -> dict:
+        with self.condition:
+            return {
+                'messages': len(self.messages),
+                'chats': len({m['chat_id'] for m in self.messages}),
+                'throttled': self.throttled,
+                'errors': self.errors,
+                'pending_updates': len(self.updates)
+            }
+
+
+class FakeTmpHandler(QuietHandler):
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        page = parsed.path.rsplit('/', 1)[-1].lower()
+        if page == 'ultima.asp':
+            body = self.fake.render_ultima()
+        elif page == 'cuerpo.asp':
+            code = parse_qs(parsed.query).get('codigo', [''])[0]
+            body = self.fake.render_cuerpo(code)
+            if body is None:
+                self.send_body(404, b'Not Found', 'text/plain')
+                return
+        else:
+            self.send_body(404, b'Not Found', 'text/plain')
+            return
+        self.fake.requests += 1
+        self.send_body(200, body, 'text/html; charset=iso-8859-1')
+
+
+class FakeTmpServer(FakeServer):
+    """
+    Imitación de tmpmurcia.es: ultima.asp y Cuerpo.asp servidos en latin-1
+
+    Args:
+        alerts: Lista de dicts con code, title y opcionalmente body y date
+    """
+
+    handler_class = FakeTmpHandler
+
+    def __init__(self, alerts: Optional[List[dict]] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.alerts = alerts or []
+        self.requests = 0
+
+    @property
+    def ultima_url(self) -> str:
+        return f"{self.url}/ultima.asp"
+
+    def render_ultima(self) -> bytes:
+        rows = '\n'.join(ULTIMA_ROW_TEMPLATE.format(
+            date=escape(alert.get('date', '01/01/2026')), code=escape(str(alert['code'])),
+            title=escape(alert['title'])) for alert in self.alerts)
+        return ULTIMA_TEMPLATE.format(rows=rows).encode('latin-1', errors='xmlcharrefreplace')
+
+    def render_cuerpo(self, code: str) -> Optional[bytes]:
+        for alert in self.alerts:
+            if str(alert['code']) == code:
+                body = alert.get('body', alert['title'])
+                return CUERPO_TEMPLATE.format(title=escape(alert['title']), body=escape(body)).encode(
+                    'latin-1', errors='xmlcharrefreplace')
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidores falsos de Telegram y TMP para pruebas locales")
+    subparsers = parser.add_subparsers(dest='server', required=True)
+
+    telegram = subparsers.add_parser('telegram', help="API de bots de Telegram")
+    telegram.add_argument('--port', type=int, default=8081)
+    telegram.add_argument('--latency', type=float, default=0.0)
+    telegram.add_argument('--throttle', type=float, default=0.0, help="Probabilidad de 429")
+    telegram.add_argument('--retry-after', type=int, default=1)
+    telegram.add_argument('--errors', type=float, default=0.0, help="Probabilidad de 500")
+
+    tmp = subparsers.add_parser('tmp', help="Web de TMP Murcia")
+    tmp.add_argument('--port', type=int, default=8080)
+    tmp.add_argument('--alerts', type=int, default=20, help="Número de alertas sintéticas")
+
+    args = parser.parse_args()
+    if args.server == 'telegram':
+        server = FakeTelegramServer(latency=args.latency, throttle_rate=args.throttle,
+                                    retry_after=args.retry_after, error_rate=args.errors, port=args.port)
+        print(f"🤖 Telegram falso en {server.url} (TELEGRAM_API_URL={server.url})")
+    else:
+        from benchmark import make_synthetic_alerts
+        server = FakeTmpServer(make_synthetic_alerts(args.alerts), port=args.port)
+        print(f"🚍 TMP falso en {server.ultima_url} (TMP_URL={server.ultima_url})")
+
+    server.start()
+    try:
+        while True:
+            time.sleep(60)
+            if isinstance(server, FakeTelegramServer):
+                print(f"📊 {server.stats()}")
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
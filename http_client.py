@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Cliente HTTP compartido por el monitor y el bot
+
+Mantiene conexiones keep-alive reutilizables (una sola conexión TLS con
+api.telegram.org para todos los mensajes), aplica timeouts y políticas de
+reintento por host y cuenta cuántas conexiones se abren y se reutilizan.
+"""
+
+import os
+import threading
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+# Configuración (se puede sobrescribir con variables de entorno)
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', '16'))
+MAX_RETRIES = int(os.environ.get('MAX_RETRIES', '3'))
+RETRY_DELAY_SECONDS = float(os.environ.get('RETRY_DELAY_SECONDS', '5'))
+HTTP_DEFAULT_TIMEOUT = float(os.environ.get('HTTP_DEFAULT_TIMEOUT', '15'))
+# URL base de la API de bots (se puede apuntar a un servidor falso para pruebas)
+TELEGRAM_API_URL = os.environ.get('TELEGRAM_API_URL', 'https://api.telegram.org').rstrip('/')
+
+# Política por host: timeout en segundos y número de reintentos
+HOST_POLICIES = {
+    'tmpmurcia.es': {'timeout': 30, 'retries': MAX_RETRIES},
+    'api.telegram.org': {'timeout': 10, 'retries': MAX_RETRIES},
+}
+
+
+class ConnectionStats:
+    """Contadores de peticiones y conexiones abiertas, seguros entre hilos"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+
+    def count_request(self):
+        with self.lock:
+            self.requests += 1
+
+    def count_connection(self):
+        with self.lock:
+            self.new_connections += 1
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                'requests': self.requests,
+                'new_connections': self.new_connections,
+                'reused_connections': max(0, self.requests - self.new_connections)
+            }
+
+
+def _counting_pool_class(base, stats: ConnectionStats):
+    """Crea una subclase del pool de urllib3 que cuenta las conexiones nuevas"""
+    def _new_conn(self):
+        stats.count_connection()
+        return base._new_conn(self)
+    return type(f"Counting{base.__name__}", (base,), {'_new_conn': _new_conn})
+
+
+class CountingAdapter(HTTPAdapter):
+    """HTTPAdapter que anota cada petición y cada conexión abierta"""
+
+    def __init__(self, stats: ConnectionStats, **kwargs):
+        self.stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _counting_pool_class(HTTPConnectionPool, self.stats),
+            'https': _counting_pool_class(HTTPSConnectionPool, self.stats),
+        }
+
+    def send(self, request, **kwargs):
+        self.stats.count_request()
+        return super().send(request, **kwargs)
+
+
+def build_retry(retries: int, retry_delay: float) -> Retry:
+    """
+    Reintentos con espera exponencial ante errores de conexión y 5xx
+
+    Solo se reintentan peticiones GET: un POST a sendMessage repetido podría
+    duplicar mensajes, así que sus reintentos los decide delivery.py.
+    """
+    return Retry(
+        total=retries,
+        backoff_factor=retry_delay,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset({'GET'}),
+        raise_on_status=False,
+    )
+
+
+class HttpClient:
+    """Sesión HTTP con pool de conexiones y políticas por host (interfaz get/post de requests)"""
+
+    def __init__(self, pool_size: int = HTTP_POOL_SIZE, retries: int = MAX_RETRIES,
+                 retry_delay: float = RETRY_DELAY_SECONDS,
+                 host_policies: Optional[Dict[str, dict]] = None,
+                 default_timeout: float = HTTP_DEFAULT_TIMEOUT):
+        self.host_policies = host_policies if host_policies is not None else HOST_POLICIES
+        self.default_timeout = default_timeout
+        self.stats = ConnectionStats()
+        self.session = requests.Session()
+
+        default_adapter = CountingAdapter(self.stats, pool_connections=4, pool_maxsize=pool_size,
+                                          max_retries=build_retry(retries, retry_delay))
+        self.session.mount('https://', default_adapter)
+        self.session.mount('http://', default_adapter)
+        for host, policy in self.host_policies.items():
+            adapter = CountingAdapter(self.stats, pool_connections=1, pool_maxsize=pool_size,
+                                      max_retries=build_retry(policy.get('retries', retries), retry_delay))
+            self.session.mount(f'https://{host}/', adapter)
+            self.session.mount(f'http://{host}/', adapter)
+
+    def timeout_for(self, url: str) -> float:
+        """Timeout configurado para el host de la URL"""
+        host = urlparse(url).hostname or ''
+        for policy_host, policy in self.host_policies.items():
+            if host == policy_host or host.endswith(f'.{policy_host}'):
+                return policy.get('timeout', self.default_timeout)
+        return self.default_timeout
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault('timeout', self.timeout_for(url))
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def print_stats(self):
+        """Muestra cuántas conexiones se han reutilizado"""
+        stats = self.stats.snapshot()
+        print(f"🔌 HTTP: {stats['requests']} petición(es), {stats['new_connections']} conexión(es) nueva(s), "
+              f"{stats['reused_connections']} reutilizada(s)")
+
+    def close(self):
+        self.session.close()
+
+
+_shared_client = None
+_shared_client_lock = threading.Lock()
+
+
+def get_http_client() -> HttpClient:
+    """Devuelve el cliente HTTP compartido del proceso (se crea la primera vez)"""
+    global _shared_client
+    with _shared_client_lock:
+        if _shared_client is None:
+            _shared_client = HttpClient()
+        return _shared_client
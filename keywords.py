@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Suscripciones por palabra clave ("obras", "desvío", el nombre de una parada)
+
+Todas las palabras de todos los usuarios se compilan en un único autómata
+de Aho-Corasick, así que cada alerta se recorre una sola vez sea cual sea
+el número de suscripciones: el coste depende de la longitud del texto y no
+de usuarios × palabras.
+
+Los textos se comparan sin mayúsculas ni tildes ("desvio" encuentra
+"Desvío") y solo se aceptan palabras completas ("obras" no encuentra
+"sobras").
+"""
+
+import os
+import unicodedata
+from collections import deque
+from typing import Dict, Iterable, List, Set
+
+# Busca también en el texto de Cuerpo.asp (usa la caché de alert_details.py)
+KEYWORDS_MATCH_BODY = os.environ.get('KEYWORDS_MATCH_BODY', '0') == '1'
+# Filtro global: si tiene valores (separados por comas), solo se envían las alertas que los contienen
+KEYWORDS_FILTER = [term.strip() for term in os.environ.get('KEYWORDS_FILTER', '').split(',') if term.strip()]
+KEYWORD_MIN_LENGTH = 3
+KEYWORD_MAX_LENGTH = 50
+KEYWORDS_MAX_PER_USER = int(os.environ.get('KEYWORDS_MAX_PER_USER', '10'))
+
+
+def normalize(text: str) -> str:
+    """Minúsculas, sin tildes y con los espacios colapsados"""
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(stripped.split())
+
+
+class KeywordMatcher:
+    """Autómata de Aho-Corasick sobre un conjunto de palabras normalizadas"""
+
+    def __init__(self, terms: Iterable[str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[List[str]] = [[]]
+        self.terms = set()
+        for term in terms:
+            self._insert(normalize(term))
+        self._build_failure_links()
+
+    def _insert(self, term: str):
+        if not term or term in self.terms:
+            return
+        self.terms.add(term)
+        state = 0
+        for char in term:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][char] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            state = next_state
+        self.output[state].append(term)
+
+    def _build_failure_links(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                # Lo que termina en el estado de fallo también termina aquí
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+
+    def find(self, text: str) -> Set[str]:
+        """Palabras (normalizadas) que aparecen completas en el texto"""
+        text = normalize(text)
+        found = set()
+        state = 0
+        goto, fail, output = self.goto, self.fail, self.output
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for term in output[state]:
+                start = position - len(term) + 1
+                if (start == 0 or not text[start - 1].isalnum()) and \
+                        (position + 1 == len(text) or not text[position + 1].isalnum()):
+                    found.add(term)
+        return found
+
+    def __bool__(self):
+        return bool(self.terms)
+
+
+FILTER_MATCHER = KeywordMatcher(KEYWORDS_FILTER)
+
+
+def alert_text(alert: dict, match_body: bool = None) -> str:
+    """Texto en el que se buscan las palabras: el título y, con KEYWORDS_MATCH_BODY, el cuerpo ya descargado"""
+    if match_body is None:
+        match_body = KEYWORDS_MATCH_BODY
+    if not match_body:
+        return alert['title']
+    from alert_details import DetailCache
+    body = DetailCache().get(alert['code'])
+    return f"{alert['title']}\n{body}" if body else alert['title']
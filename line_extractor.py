@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Extracción de las líneas de autobús que menciona un aviso
+
+Reconoce, con expresiones regulares compiladas una sola vez:
+
+- Una línea: "Línea 44", "LÍNEA 26B", "Línea 26 A", "Línea nº 1"
+- Listas: "Líneas 11, 39 y 44", "Líneas 21/22", "Líneas 1 o 91"
+- Rangos: "Líneas 1 a 5", "Líneas del 30 al 33", "Líneas 50-52"
+
+Un último número seguido de "de" y un mes ("Líneas 1, 2 de mayo") se toma
+como una fecha y no como una línea; "Líneas 39 y 44 de la UCAM" son dos líneas.
+"""
+
+import re
+from typing import List
+
+# Un rango más largo que esto casi seguro no es un rango de líneas
+MAX_LINE_RANGE = 20
+
+# Número con una letra opcional delante o detrás, que no puede ir seguida de otra letra ("22horarios").
+# La letra puede ir separada por un espacio ("26 A") si es mayúscula y detrás no viene otra palabra
+# que "y/e/o" y otra línea (así "26 a 30" sigue siendo un rango y "26 A PARTIR DEL" no es la línea 26A)
+_TOKEN = r'[A-Z]?\d{1,3}(?:[A-Z](?![^\W\d_])|\s(?-i:[A-Z])(?=\s*(?:[^\w\s]|$|[yeo]\s+[A-Z]?\d)))?(?!\d)'
+_SEPARATOR = r'\s*(?:,|/|-|\b(?:y|e|o|a|al)\b)\s*'
+
+LINES_RE = re.compile(
+    rf'l[íi]neas?\s*(?:n[º°o]\.?\s*)?:?\s*(?:del?\s+)?(?P<lines>{_TOKEN}(?:{_SEPARATOR}{_TOKEN})*)',
+    re.IGNORECASE)
+TOKEN_RE = re.compile(_TOKEN, re.IGNORECASE)
+MONTHS = 'enero|febrero|marzo|abril|mayo|junio|julio|agosto|septiembre|setiembre|octubre|noviembre|diciembre'
+DATE_AFTER_RE = re.compile(rf'\s+de\s+(?:{MONTHS})\b', re.IGNORECASE)
+RANGE_SEPARATORS = {'-', 'a', 'al'}
+
+
+def _split(group: str) -> List[str]:
+    """Separa "11, 39 y 44" en [token, separador, token, ...]"""
+    parts = []
+    end = 0
+    for match in TOKEN_RE.finditer(group):
+        if parts:
+            parts.append(group[end:match.start()])
+        # "26 A" -> "26A"
+        parts.append(''.join(match.group().split()).upper())
+        end = match.end()
+    return parts
+
+
+def _expand(parts: List[str]) -> List[str]:
+    """Convierte [token, separador, token, ...] en la lista de líneas, desplegando los rangos"""
+    lines = [parts[0]]
+    for index in range(1, len(parts) - 1, 2):
+        separator = parts[index].strip().lower()
+        line = parts[index + 1]
+        previous = lines[-1]
+        if separator in RANGE_SEPARATORS and previous.isdigit() and line.isdigit():
+            start, end = int(previous), int(line)
+            if 0 < end - start <= MAX_LINE_RANGE:
+                lines.extend(str(number) for number in range(start + 1, end + 1))
+                continue
+        lines.append(line)
+    return lines
+
+
+def extract_lines(text: str) -> List[str]:
+    """
+    Líneas distintas que se mencionan en un texto, en orden de aparición
+
+    Returns:
+        Lista de líneas (vacía si el texto no menciona ninguna)
+    """
+    found = []
+    for match in LINES_RE.finditer(text):
+        parts = _split(match.group('lines'))
+        if len(parts) > 1 and DATE_AFTER_RE.match(text, match.end()):
+            # "Líneas 1, 2 de mayo": el último número es un día
+            parts = parts[:-2]
+        for line in _expand(parts):
+            if line not in found:
+                found.append(line)
+    return found
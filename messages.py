@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Texto de las notificaciones: un mensaje por alerta o un resumen por usuario
+
+En modo resumen (DIGEST_MODE=1) todas las alertas nuevas de una ejecución
+que le interesan a un usuario se juntan en un único mensaje, que solo se
+parte si supera el límite de 4096 caracteres de Telegram. Así se envían
+del orden de un mensaje por usuario en lugar de uno por alerta y usuario.
+"""
+
+import hashlib
+import os
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from keywords import alert_text
+
+DIGEST_MODE = os.environ.get('DIGEST_MODE', '0') == '1'
+# Longitud máxima de un mensaje de Telegram
+TELEGRAM_MAX_MESSAGE_LENGTH = 4096
+
+
+def line_label(alert: dict) -> str:
+    lines = alert['lines']
+    if not lines:
+        return "⚠️ Alerta General"
+    if len(lines) == 1:
+        return f"Línea {lines[0]}"
+    return f"Líneas {', '.join(lines[:-1])} y {lines[-1]}"
+
+
+def format_alert_message(alert: dict) -> str:
+    """Texto de la notificación de una alerta (Markdown de Telegram)"""
+    return f"""🚌 *Nueva Alerta TMP Murcia*
+
+📍 *{line_label(alert)}*
+📝 {alert['title']}
+
+🔗 [Ver detalles]({alert['url']})
+
+⏰ {datetime.now().strftime('%d/%m/%Y %H:%M')}
+"""
+
+
+def format_digest(alerts: List[dict], max_length: int = TELEGRAM_MAX_MESSAGE_LENGTH) -> List[str]:
+    """
+    Resumen de varias alertas en uno o más mensajes de como mucho max_length caracteres
+
+    Los mensajes solo se parten entre alertas, nunca a mitad de una. Si una
+    alerta no cabe sola en un mensaje se quitan sus líneas que no caben
+    (normalmente el título), nunca se corta una línea: un trozo de Markdown
+    sin cerrar haría que Telegram rechazase el mensaje entero.
+    """
+    footer = f"⏰ {datetime.now().strftime('%d/%m/%Y %H:%M')}\n"
+    # Cabecera con margen para el indicador "(2/3)"
+    header_room = len(f"🚌 *{len(alerts)} nuevas alertas TMP Murcia* (99/99)\n\n")
+    room = max_length - header_room - len(footer)
+    blocks = [_fit_lines([f"📍 *{line_label(alert)}*\n", f"📝 {alert['title']}\n",
+                          f"🔗 [Ver detalles]({alert['url']})\n", "\n"], room)
+              for alert in alerts]
+
+    parts: List[List[str]] = [[]]
+    size = 0
+    for block in blocks:
+        if parts[-1] and size + len(block) > room:
+            parts.append([])
+            size = 0
+        parts[-1].append(block)
+        size += len(block)
+
+    messages = []
+    for number, part in enumerate(parts, 1):
+        counter = f" ({number}/{len(parts)})" if len(parts) > 1 else ""
+        header = f"🚌 *{len(alerts)} nuevas alertas TMP Murcia*{counter}\n\n"
+        messages.append(header + ''.join(part) + footer)
+    return messages
+
+
+def _fit_lines(lines: List[str], room: int) -> str:
+    """Une las líneas que caben en room caracteres, saltándose enteras las que no"""
+    kept = []
+    size = 0
+    for line in lines:
+        if size + len(line) <= room:
+            kept.append(line)
+            size += len(line)
+    return ''.join(kept)
+
+
+def route_alert(alert: dict, subscription_manager, channels=None) -> Tuple[List[str], List[str]]:
+    """
+    Destinatarios de una alerta
+
+    Returns:
+        (canales donde se publica, usuarios que la reciben en privado, sin
+        repetir a quien la recibe por su línea y por una palabra clave)
+    """
+    if channels is None:
+        channel_ids = []
+        users = subscription_manager.get_users_for_lines(alert['lines'])
+    else:
+        channel_ids, private_lines, private_general = channels.route(alert)
+        if private_lines:
+            users = subscription_manager.get_users_for_lines(private_lines)
+        elif private_general:
+            users = subscription_manager.get_users_for_lines([])
+        else:
+            users = []
+    if subscription_manager.get_keyword_matcher():
+        keyword_users = subscription_manager.get_users_for_text(alert_text(alert))
+        keyword_users.difference_update(users)
+        users = list(users) + list(keyword_users)
+    return channel_ids, users
+
+
+def alert_recipients(alert: dict, subscription_manager, channels=None) -> List[str]:
+    """Canales y usuarios que reciben el mensaje de una alerta"""
+    channel_ids, users = route_alert(alert, subscription_manager, channels)
+    return channel_ids + users
+
+
+def build_notifications(new_alerts: List[dict], subscription_manager, digest: bool = DIGEST_MODE,
+                        channels=None) -> List[Tuple[str, str, List[str]]]:
+    """
+    Mensajes que hay que enviar por las alertas nuevas, de la más antigua a la más reciente
+
+    Args:
+        channels: ChannelMap del modo canales (None = todo en privado)
+
+    Returns:
+        Lista de (clave, texto, destinatarios). La clave identifica el mensaje
+        en el outbox: el código de la alerta o, para los resúmenes, un hash de
+        los códigos que incluye y el número de parte.
+    """
+    alerts = list(reversed(new_alerts))
+    if not digest:
+        notifications = []
+        for alert in alerts:
+            recipients = alert_recipients(alert, subscription_manager, channels)
+            if recipients:
+                notifications.append((alert['code'], format_alert_message(alert), recipients))
+        return notifications
+
+    # Los canales reciben cada alerta por separado; los usuarios, un resumen.
+    # Se agrupan las alertas de cada usuario y, después, los usuarios que reciben exactamente las mismas
+    notifications = []
+    per_chat: Dict[str, List[int]] = {}
+    for position, alert in enumerate(alerts):
+        channel_ids, users = route_alert(alert, subscription_manager, channels)
+        if channel_ids:
+            notifications.append((alert['code'], format_alert_message(alert), channel_ids))
+        for chat_id in users:
+            per_chat.setdefault(chat_id, []).append(position)
+    groups: Dict[Tuple[int, ...], List[str]] = {}
+    for chat_id, positions in per_chat.items():
+        groups.setdefault(tuple(positions), []).append(chat_id)
+
+    for positions, chat_ids in groups.items():
+        group_alerts = [alerts[position] for position in positions]
+        if len(group_alerts) == 1:
+            alert = group_alerts[0]
+            notifications.append((alert['code'], format_alert_message(alert), chat_ids))
+            continue
+        codes = ','.join(alert['code'] for alert in group_alerts)
+        digest_id = hashlib.sha1(codes.encode('utf-8')).hexdigest()[:16]
+        for number, text in enumerate(format_digest(group_alerts), 1):
+            notifications.append((f"digest:{digest_id}:{number}", text, chat_ids))
+    return notifications
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Métricas de ejecución: temporizadores por etapa, contadores e histogramas
+
+Se activan con METRICS_ENABLED=1. Al final de cada ejecución se escribe un
+archivo en formato de texto de Prometheus (METRICS_DIR/<run>.prom) y se añade
+una línea JSON con el resumen a METRICS_JSONL. El servicio escribe tras cada
+ciclo y empieza de cero, así que cada registro cubre un ciclo, igual que
+cada ejecución del monitor. Desactivadas, cada llamada se reduce a
+comprobar un booleano.
+
+Uso:
+    from metrics import METRICS, timed
+
+    @timed('parse')
+    def parse_alerts(html): ...
+
+    with METRICS.stage('fetch'):
+        ...
+    METRICS.inc('notifications_sent', 10)
+    METRICS.write('monitor')
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from typing import Dict, Tuple
+
+from storage import write_text_atomic
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '0') == '1'
+METRICS_DIR = os.environ.get('METRICS_DIR', 'metrics')
+METRICS_JSONL = os.environ.get('METRICS_JSONL', os.path.join(METRICS_DIR, 'runs.jsonl'))
+METRICS_PREFIX = 'tmp_'
+
+# Límites de los buckets de los histogramas (segundos)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_NULL_CONTEXT = nullcontext()
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+def _labels_key(labels: dict) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key, extra: dict = None) -> str:
+    items = list(key) + list((extra or {}).items())
+    if not items:
+        return ''
+    pairs = (f'{k}="{_escape_label(v)}"' for k, v in items)
+    return '{' + ','.join(pairs) + '}'
+
+
+def _record_key(key) -> str:
+    return ','.join(f'{k}={v}' for k, v in key)
+
+
+def _escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metrics:
+    """Registro de métricas del proceso (seguro entre hilos)"""
+
+    def __init__(self, enabled: bool = METRICS_ENABLED):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Vacía las métricas"""
+        with self.lock:
+            self.counters: Dict[str, Dict[tuple, float]] = {}
+            self.histograms: Dict[str, Dict[tuple, Histogram]] = {}
+            self.started = time.time()
+
+    def take(self) -> 'Metrics':
+        """Devuelve lo acumulado hasta ahora y empieza de cero sin perder lo que llegue entre medias"""
+        taken = Metrics(self.enabled)
+        with self.lock:
+            taken.counters, self.counters = self.counters, {}
+            taken.histograms, self.histograms = self.histograms, {}
+            taken.started, self.started = self.started, time.time()
+        return taken
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """Suma value al contador name"""
+        if not self.enabled:
+            return
+        key = _labels_key(labels)
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        """Añade una observación al histograma name"""
+        if not self.enabled:
+            return
+        key = _labels_key(labels)
+        with self.lock:
+            series = self.histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = Histogram()
+            series[key].observe(value)
+
+    def stage(self, name: str, **labels):
+        """Context manager que mide la duración de una etapa"""
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return self._timed_stage(name, labels)
+
+    @contextmanager
+    def _timed_stage(self, name: str, labels: dict):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('stage_duration_seconds', time.perf_counter() - start, stage=name, **labels)
+
+    def render_prometheus(self) -> str:
+        """Métricas en formato de texto de Prometheus"""
+        lines = []
+        with self.lock:
+            for name, series in sorted(self.counters.items()):
+                metric = f"{METRICS_PREFIX}{name}_total"
+                lines.append(f"# TYPE {metric} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{metric}{_format_labels(key)} {value:g}")
+            for name, series in sorted(self.histograms.items()):
+                metric = f"{METRICS_PREFIX}{name}"
+                lines.append(f"# TYPE {metric} histogram")
+                for key, histogram in sorted(series.items()):
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f"{metric}_bucket{_format_labels(key, {'le': f'{bound:g}'})} {count}")
+                    lines.append(f"{metric}_bucket{_format_labels(key, {'le': '+Inf'})} {histogram.count}")
+                    lines.append(f"{metric}_sum{_format_labels(key)} {histogram.sum:.6f}")
+                    lines.append(f"{metric}_count{_format_labels(key)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+    def to_record(self, run: str) -> dict:
+        """Resumen de la ejecución para el archivo JSON lines"""
+        with self.lock:
+            return {
+                'run': run,
+                'timestamp': datetime.now().isoformat(),
+                'duration': time.time() - self.started,
+                'counters': {
+                    name: {_record_key(key): value for key, value in series.items()}
+                    for name, series in self.counters.items()
+                },
+                'histograms': {
+                    name: {_record_key(key): {'count': h.count, 'sum': h.sum}
+                           for key, h in series.items()}
+                    for name, series in self.histograms.items()
+                }
+            }
+
+    def write(self, run: str, reset: bool = False):
+        """
+        Escribe METRICS_DIR/<run>.prom y añade un registro a METRICS_JSONL
+
+        Con reset, lo escrito se descuenta: la siguiente escritura solo
+        incluye lo ocurrido después (los ciclos del servicio).
+        """
+        if not self.enabled:
+            return
+        metrics = self.take() if reset else self
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        prom_path = os.path.join(METRICS_DIR, f"{run}.prom")
+        write_text_atomic(prom_path, metrics.render_prometheus())
+        jsonl_dir = os.path.dirname(METRICS_JSONL)
+        if jsonl_dir:
+            os.makedirs(jsonl_dir, exist_ok=True)
+        with open(METRICS_JSONL, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(metrics.to_record(run), ensure_ascii=False) + '\n')
+        print(f"📊 Métricas guardadas en {prom_path} y {METRICS_JSONL}")
+
+
+METRICS = Metrics()
+
+
+def timed(stage: str):
+    """Decorador que mide cada llamada a la función como una etapa"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not METRICS.enabled:
+                return func(*args, **kwargs)
+            with METRICS.stage(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Migración de los archivos JSON a la base de datos SQLite
+
+Importa subscriptions.json y alerts_history.json en la base de datos
+indicada por SQLITE_PATH (tmp_alerts.db por defecto). Se puede ejecutar
+varias veces: cada ejecución reemplaza el contenido de la base de datos.
+
+Después de migrar, usa STORAGE_BACKEND=sqlite para que el bot y el
+monitor lean y escriban en SQLite.
+"""
+
+import argparse
+
+from scraper import ALERTS_FILE
+from storage import (JsonAlertStore, JsonSubscriptionStore, SqliteAlertStore,
+                     SqliteDatabase, SqliteSubscriptionStore, SQLITE_PATH)
+from subscriptions import SUBSCRIPTIONS_FILE
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importa los archivos JSON a SQLite")
+    parser.add_argument('--db', default=SQLITE_PATH, help="Ruta de la base de datos SQLite")
+    parser.add_argument('--subscriptions', default=SUBSCRIPTIONS_FILE)
+    parser.add_argument('--alerts', default=ALERTS_FILE)
+    args = parser.parse_args()
+
+    print(f"🗄️ Migrando a {args.db}...")
+    db = SqliteDatabase(args.db)
+
+    subscriptions = JsonSubscriptionStore(args.subscriptions).load()
+    SqliteSubscriptionStore(db).import_data(subscriptions)
+    total_lines = sum(len(user.get("lines", [])) for user in subscriptions["users"].values())
+    print(f"👥 {len(subscriptions['users'])} usuario(s) y {total_lines} suscripción(es) a líneas importadas")
+
+    alerts_data = JsonAlertStore(args.alerts).load()
+    SqliteAlertStore(db).save(alerts_data)
+    print(f"📂 {len(alerts_data.get('alerts', []))} alerta(s) del historial importadas")
+
+    db.close()
+    print("✅ Migración completada. Usa STORAGE_BACKEND=sqlite para trabajar con la base de datos")
+
+
+if __name__ == "__main__":
+    main()
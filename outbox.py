@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Cola persistente de notificaciones (outbox) en SQLite
+
+Cada alerta nueva se convierte en un trabajo por destinatario (alerta,
+chat_id) que se guarda antes de marcar la alerta como vista en el
+historial. Después un trabajador vacía la cola enviando por lotes y
+guarda el resultado de cada envío en cuanto vuelve. Si el proceso muere a
+mitad de un envío masivo, la siguiente ejecución continúa con los trabajos
+pendientes en lugar de volver a avisar a todos.
+
+- (alerta, chat_id) es la clave primaria: volver a encolar una alerta no
+  duplica trabajos ni reenvía los que ya se enviaron.
+- Los fallos temporales (red, 429, 5xx) se reintentan con espera
+  exponencial; los definitivos (chat bloqueado, id inválido) y los que
+  agotan OUTBOX_MAX_ATTEMPTS quedan como 'failed'.
+- Solo los mensajes que estaban en vuelo al morir el proceso pueden llegar
+  dos veces: como mucho uno por hilo de envío (DELIVERY_WORKERS). Los
+  trabajos reservados que aún no habían empezado vuelven a la cola sin
+  haberse enviado.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List
+
+from delivery import TelegramDelivery, _build_report
+from metrics import METRICS, timed
+from profiling import profiled
+
+# Configuración (se puede sobrescribir con variables de entorno)
+OUTBOX_ENABLED = os.environ.get('OUTBOX_ENABLED', '1') == '1'
+OUTBOX_PATH = os.environ.get('OUTBOX_PATH', 'outbox.db')
+OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', '500'))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', '8'))
+# Espera antes del primer reintento; se duplica en cada intento fallido
+OUTBOX_BACKOFF = float(os.environ.get('OUTBOX_BACKOFF', '30'))
+OUTBOX_MAX_BACKOFF = float(os.environ.get('OUTBOX_MAX_BACKOFF', '21600'))
+# Los trabajos terminados se borran pasado este tiempo
+OUTBOX_RETENTION_DAYS = float(os.environ.get('OUTBOX_RETENTION_DAYS', '30'))
+
+OUTBOX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    alert_code TEXT PRIMARY KEY,
+    text TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    alert_code TEXT NOT NULL REFERENCES messages (alert_code),
+    chat_id TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    updated REAL NOT NULL,
+    UNIQUE (alert_code, chat_id)
+);
+CREATE INDEX IF NOT EXISTS jobs_due ON jobs (state, next_attempt);
+"""
+
+
+class Outbox:
+    """Cola de trabajos de envío (estados: pending, sending, sent, failed)"""
+
+    def __init__(self, path: str = OUTBOX_PATH):
+        self.path = path
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(OUTBOX_SCHEMA)
+        self.recover()
+
+    def recover(self):
+        """Devuelve a la cola los trabajos que quedaron en vuelo si el proceso murió"""
+        with self.lock:
+            cursor = self.conn.execute(
+                "UPDATE jobs SET state = 'pending', updated = ? WHERE state = 'sending'", (time.time(),))
+            self.conn.commit()
+        if cursor.rowcount:
+            print(f"♻️ Outbox: {cursor.rowcount} envío(s) interrumpido(s) vuelven a la cola")
+
+    @timed('enqueue')
+    def enqueue(self, alert_code: str, text: str, chat_ids: List[str]) -> int:
+        """
+        Encola el mensaje de una alerta para sus destinatarios
+
+        Returns:
+            Número de trabajos nuevos (los que ya existían se ignoran)
+        """
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO messages (alert_code, text, created) VALUES (?, ?, ?)",
+                (alert_code, text, now))
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO jobs (alert_code, chat_id, updated) VALUES (?, ?, ?)",
+                [(alert_code, str(chat_id), now) for chat_id in chat_ids])
+            added = self.conn.total_changes - before
+            self.conn.commit()
+        METRICS.inc('outbox_enqueued', added)
+        return added
+
+    def claim(self, limit: int = OUTBOX_BATCH_SIZE) -> List[dict]:
+        """Marca como 'sending' y devuelve los trabajos pendientes que ya toca enviar"""
+        now = time.time()
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT jobs.id, jobs.alert_code, jobs.chat_id, jobs.attempts, messages.text "
+                "FROM jobs JOIN messages USING (alert_code) "
+                "WHERE jobs.state = 'pending' AND jobs.next_attempt <= ? ORDER BY jobs.id LIMIT ?",
+                (now, limit)).fetchall()
+            self.conn.executemany(
+                "UPDATE jobs SET state = 'sending', updated = ? WHERE id = ?", [(now, row[0]) for row in rows])
+            self.conn.commit()
+        return [{'id': job_id, 'alert_code': code, 'chat_id': chat_id, 'attempts': attempts, 'text': text}
+                for job_id, code, chat_id, attempts, text in rows]
+
+    def complete(self, jobs: List[dict], results: List[dict]):
+        """Guarda el resultado de uno o varios envíos en una sola transacción"""
+        now = time.time()
+        sent, retry, failed = [], [], []
+        for job, result in zip(jobs, results):
+            attempts = job['attempts'] + 1
+            if result['ok']:
+                sent.append((attempts, now, job['id']))
+            elif result.get('retryable', True) and attempts < OUTBOX_MAX_ATTEMPTS:
+                delay = min(OUTBOX_BACKOFF * 2 ** (attempts - 1), OUTBOX_MAX_BACKOFF)
+                retry.append((attempts, now + delay, result.get('error'), now, job['id']))
+            else:
+                failed.append((attempts, result.get('error'), now, job['id']))
+        with self.lock:
+            self.conn.executemany(
+                "UPDATE jobs SET state = 'sent', attempts = ?, last_error = NULL, updated = ? WHERE id = ?", sent)
+            self.conn.executemany(
+                "UPDATE jobs SET state = 'pending', attempts = ?, next_attempt = ?, last_error = ?, updated = ? "
+                "WHERE id = ?", retry)
+            self.conn.executemany(
+                "UPDATE jobs SET state = 'failed', attempts = ?, last_error = ?, updated = ? WHERE id = ?", failed)
+            self.conn.commit()
+        METRICS.inc('outbox_sent', len(sent))
+        METRICS.inc('outbox_retried', len(retry))
+        METRICS.inc('outbox_failed', len(failed))
+
+    def prune(self, retention_days: float = OUTBOX_RETENTION_DAYS) -> int:
+        """Borra los trabajos terminados (enviados o fallidos) más antiguos que retention_days"""
+        cutoff = time.time() - retention_days * 86400
+        with self.lock:
+            cursor = self.conn.execute(
+                "DELETE FROM jobs WHERE state IN ('sent', 'failed') AND updated < ?", (cutoff,))
+            self.conn.execute(
+                "DELETE FROM messages WHERE alert_code NOT IN (SELECT alert_code FROM jobs)")
+            self.conn.commit()
+        return cursor.rowcount
+
+    def counts(self) -> dict:
+        """Número de trabajos por estado"""
+        with self.lock:
+            return dict(self.conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
+
+
+@profiled('drain_outbox')
+@timed('fanout')
+def drain_outbox(outbox: Outbox, delivery: TelegramDelivery) -> dict:
+    """
+    Envía todos los trabajos pendientes que ya toca enviar, lote a lote
+
+    Returns:
+        Informe de envío (ver delivery._build_report) de todos los lotes
+    """
+    start = time.monotonic()
+    results = []
+    while True:
+        jobs = outbox.claim()
+        if not jobs:
+            break
+        workers = min(delivery.max_workers, len(jobs))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(delivery.send_one, job['chat_id'], job['text']): job for job in jobs}
+            # Cada resultado se guarda al volver: si el proceso muere, solo se repiten los envíos en vuelo
+            for future in as_completed(futures):
+                result = future.result()
+                outbox.complete([futures[future]], [result])
+                results.append(result)
+    report = _build_report(results, time.monotonic() - start)
+    METRICS.inc('notifications_sent', report['sent'])
+    METRICS.inc('notifications_failed', len(report['failed']))
+    return report
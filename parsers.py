@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Backends para extraer los enlaces de alertas de la página de TMP
+
+Todos los backends devuelven la misma secuencia de tuplas (href, título),
+en el orden en que aparecen en la página:
+
+- bs4: árbol completo de BeautifulSoup con html.parser (comportamiento original)
+- strainer: BeautifulSoup construyendo solo las etiquetas <a> (usa lxml si está instalado)
+- stream: html.parser en streaming, sin construir ningún árbol
+
+Con HTML mal formado hay una diferencia intencionada: si un enlace sin
+</a> queda cerrado implícitamente porque se cierra una etiqueta que lo
+contiene (<td><a ...>a</td><td>b</a>), bs4 y stream lo cierran ahí, igual
+que un navegador ('a'), pero strainer solo construye los enlaces, no ve
+ese </td> y sigue hasta el </a> ('ab'). Por eso el backend por defecto es
+stream.
+"""
+
+import os
+from collections import Counter
+from html.parser import HTMLParser
+from typing import Iterator, List, Optional, Tuple
+
+from bs4 import BeautifulSoup, SoupStrainer
+from bs4.builder import HTMLTreeBuilder
+
+try:
+    import lxml  # noqa: F401
+    STRAINER_FEATURES = 'lxml'
+except ImportError:
+    STRAINER_FEATURES = 'html.parser'
+
+ALERT_LINK_MARKER = 'Cuerpo.asp?codigo='
+# Backend por defecto (se puede cambiar con la variable de entorno TMP_PARSER)
+DEFAULT_PARSER = os.environ.get('TMP_PARSER', 'stream')
+
+
+def _is_alert_href(href) -> bool:
+    return bool(href) and ALERT_LINK_MARKER in href
+
+
+def parse_links_bs4(html: str) -> Iterator[Tuple[str, str]]:
+    """Construye el árbol completo y recorre todos los enlaces"""
+    soup = BeautifulSoup(html, 'html.parser')
+    for link in soup.find_all('a', href=True):
+        href = link.get('href', '')
+        if ALERT_LINK_MARKER in href:
+            yield href, link.get_text(strip=True)
+
+
+def parse_links_strainer(html: str) -> Iterator[Tuple[str, str]]:
+    """Construye solo los enlaces de alertas gracias a SoupStrainer"""
+    only_alert_links = SoupStrainer('a', href=_is_alert_href)
+    soup = BeautifulSoup(html, STRAINER_FEATURES, parse_only=only_alert_links)
+    for link in soup.find_all('a', href=True):
+        yield link.get('href', ''), link.get_text(strip=True)
+
+
+class AlertLinkParser(HTMLParser):
+    """
+    Recorre el HTML en streaming y guarda solo los enlaces de alertas
+
+    Replica el comportamiento de BeautifulSoup con html.parser: el texto de
+    un enlace incluye el de los enlaces anidados, cada fragmento de texto
+    se recorta por separado y los enlaces se devuelven en orden de apertura.
+    Como BeautifulSoup, lleva la pila de etiquetas abiertas: una etiqueta de
+    cierre cierra también las abiertas después de ella (un </td> cierra el
+    enlace sin </a> de su celda) y se ignora si no hay ninguna abierta.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        # Etiquetas abiertas y, para los enlaces, sus datos
+        self.open_tags: List[Tuple[str, Optional[dict]]] = []
+        # Cuántas hay abiertas de cada nombre (las páginas dejan muchas <td> sin cerrar)
+        self.open_counts: Counter = Counter()
+        # Etiquetas vacías ya cerradas al abrirlas: su </br> se ignora sin cortar el texto
+        self.closed_empty_tags: Counter = Counter()
+        self.open_links: List[dict] = []
+        self.pending: List[dict] = []
+        self.links: List[Tuple[str, str]] = []
+        self.text_buffer: List[str] = []
+
+    def _flush_text(self):
+        """Asigna el nodo de texto acumulado a los enlaces abiertos"""
+        # El texto puede llegar partido entre varias llamadas a feed(), así que
+        # se recorta una vez completo, igual que hace BeautifulSoup
+        text = ''.join(self.text_buffer).strip()
+        self.text_buffer = []
+        if text:
+            for link in self.open_links:
+                link['text'].append(text)
+
+    def handle_starttag(self, tag, attrs, handle_empty_element=True):
+        self._flush_text()
+        link = None
+        if tag == 'a':
+            href = dict(attrs).get('href')
+            link = {'href': href, 'text': [], 'closed': False}
+            self.open_links.append(link)
+            if _is_alert_href(href):
+                self.pending.append(link)
+        self.open_tags.append((tag, link))
+        self.open_counts[tag] += 1
+        if handle_empty_element and tag in HTMLTreeBuilder.empty_element_tags:
+            # <br> se cierra al abrirlo y un </br> posterior se ignora
+            self._close_tag(tag)
+            self.closed_empty_tags[tag] += 1
+
+    def handle_startendtag(self, tag, attrs):
+        # <a href="..."/> no tiene texto: se abre y se cierra a la vez. Como en
+        # BeautifulSoup, el cierre cuenta como el </br> pendiente de un <br> anterior
+        self.handle_starttag(tag, attrs, handle_empty_element=False)
+        self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if self.closed_empty_tags[tag]:
+            self.closed_empty_tags[tag] -= 1
+            return
+        self._close_tag(tag)
+
+    def _close_tag(self, tag):
+        self._flush_text()
+        if not self.open_counts[tag]:
+            return
+        while True:
+            name, link = self.open_tags.pop()
+            self.open_counts[name] -= 1
+            if link is not None:
+                self.open_links.pop()['closed'] = True
+            if name == tag:
+                break
+        self._emit_closed()
+
+    def handle_data(self, data):
+        self.text_buffer.append(data)
+
+    def handle_comment(self, data):
+        self._flush_text()
+
+    def _emit_closed(self):
+        while self.pending and self.pending[0]['closed']:
+            link = self.pending.pop(0)
+            self.links.append((link['href'], ''.join(link['text'])))
+
+    def close(self):
+        super().close()
+        self._flush_text()
+        # BeautifulSoup cierra al final del documento los enlaces sin </a>
+        for link in self.open_links:
+            link['closed'] = True
+        self.open_tags = []
+        self.open_counts.clear()
+        self.open_links = []
+        self._emit_closed()
+
+
+def parse_links_stream(html: str, chunk_size: int = 64 * 1024) -> Iterator[Tuple[str, str]]:
+    """Procesa el HTML por trozos y va devolviendo los enlaces según se cierran"""
+    parser = AlertLinkParser()
+    for start in range(0, len(html), chunk_size):
+        parser.feed(html[start:start + chunk_size])
+        yield from parser.links
+        parser.links = []
+    parser.close()
+    yield from parser.links
+
+
+PARSERS = {
+    'bs4': parse_links_bs4,
+    'strainer': parse_links_strainer,
+    'stream': parse_links_stream,
+}
+
+
+def get_parser(name: str = None):
+    """Devuelve la función de análisis del backend indicado"""
+    name = name or DEFAULT_PARSER
+    if name not in PARSERS:
+        raise ValueError(f"Parser desconocido: {name} (disponibles: {', '.join(PARSERS)})")
+    return PARSERS[name]
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Modo de perfilado para diagnosticar ejecuciones lentas sin tocar el código
+
+Se activa con la opción --profile de scraper.py y bot.py o con la variable
+de entorno PROFILE_DIR. Cada etapa marcada con @profiled se ejecuta bajo
+cProfile y tracemalloc, y al terminar el proceso se escriben en la carpeta:
+
+    <etapa>.prof   estadísticas de cProfile (para pstats, snakeviz...)
+    <etapa>.txt    funciones más costosas y líneas que más memoria reservan
+
+cProfile solo ve el hilo que llama a la etapa: el tiempo de los hilos de
+envío de delivery.py aparece como espera dentro de send_many.
+"""
+
+import atexit
+import cProfile
+import functools
+import io
+import os
+import pstats
+import threading
+import tracemalloc
+from typing import Dict
+
+PROFILE_DIR = os.environ.get('PROFILE_DIR', '')
+DEFAULT_PROFILE_DIR = 'profiles'
+# Número de funciones y de líneas de reserva de memoria en cada informe
+PROFILE_TOP = int(os.environ.get('PROFILE_TOP', '30'))
+# Profundidad de las trazas que guarda tracemalloc
+PROFILE_TRACEBACK_DEPTH = 1
+
+
+class StageProfile:
+    """Perfil acumulado de todas las llamadas a una etapa"""
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+        self.lock = threading.Lock()
+        self.calls = 0
+        # (archivo, línea) -> [bytes reservados, bloques reservados]
+        self.allocations: Dict[tuple, list] = {}
+
+    def add_allocations(self, before: tracemalloc.Snapshot, after: tracemalloc.Snapshot):
+        for stat in after.compare_to(before, 'lineno'):
+            if stat.size_diff <= 0:
+                continue
+            frame = stat.traceback[0]
+            totals = self.allocations.setdefault((frame.filename, frame.lineno), [0, 0])
+            totals[0] += stat.size_diff
+            totals[1] += stat.count_diff
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self.directory = None
+        self.stages: Dict[str, StageProfile] = {}
+        self.stages_lock = threading.Lock()
+        self.local = threading.local()
+
+    def enable(self, directory: str = None):
+        """Activa el perfilado; los informes se escriben al salir del proceso"""
+        if self.enabled:
+            return
+        self.directory = directory or PROFILE_DIR or DEFAULT_PROFILE_DIR
+        self.enabled = True
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(PROFILE_TRACEBACK_DEPTH)
+        atexit.register(self.dump)
+        print(f"🔬 Perfilado activado, los informes se guardarán en {self.directory}/")
+
+    def stage(self, name: str) -> StageProfile:
+        with self.stages_lock:
+            if name not in self.stages:
+                self.stages[name] = StageProfile()
+            return self.stages[name]
+
+    def run(self, name: str, func, *args, **kwargs):
+        """Ejecuta func bajo cProfile y tracemalloc, acumulando en la etapa name"""
+        stage = self.stage(name)
+        # Las etapas anidadas (o la misma etapa en otro hilo) ya las mide la de fuera
+        if getattr(self.local, 'active', False) or not stage.lock.acquire(blocking=False):
+            return func(*args, **kwargs)
+        self.local.active = True
+        try:
+            before = tracemalloc.take_snapshot()
+            stage.profile.enable()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stage.profile.disable()
+                stage.calls += 1
+                stage.add_allocations(before, tracemalloc.take_snapshot())
+        finally:
+            self.local.active = False
+            stage.lock.release()
+
+    def report(self, name: str, stage: StageProfile) -> str:
+        """Informe de texto: funciones por tiempo acumulado y propio, y reservas de memoria"""
+        out = io.StringIO()
+        out.write(f"Etapa: {name} ({stage.calls} llamada(s))\n\n")
+        stats = pstats.Stats(stage.profile, stream=out)
+        stats.strip_dirs()
+        out.write("=== Tiempo acumulado ===\n")
+        stats.sort_stats('cumulative').print_stats(PROFILE_TOP)
+        out.write("=== Tiempo propio ===\n")
+        stats.sort_stats('tottime').print_stats(PROFILE_TOP)
+
+        out.write("=== Memoria reservada (sin liberar al terminar la etapa) ===\n")
+        top = sorted(stage.allocations.items(), key=lambda item: item[1][0], reverse=True)[:PROFILE_TOP]
+        for (filename, lineno), (size, count) in top:
+            out.write(f"{size / 1024:10.1f} KiB {count:8d} bloque(s)  {filename}:{lineno}\n")
+        if not top:
+            out.write("(ninguna)\n")
+        return out.getvalue()
+
+    def dump(self):
+        """Escribe <etapa>.prof y <etapa>.txt para cada etapa medida"""
+        stages = {name: stage for name, stage in self.stages.items() if stage.calls}
+        if not stages:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        for name, stage in stages.items():
+            stage.profile.dump_stats(os.path.join(self.directory, f"{name}.prof"))
+            with open(os.path.join(self.directory, f"{name}.txt"), 'w', encoding='utf-8') as f:
+                f.write(self.report(name, stage))
+        print(f"🔬 Informes de perfilado ({', '.join(sorted(stages))}) guardados en {self.directory}/")
+
+
+PROFILER = Profiler()
+if PROFILE_DIR:
+    PROFILER.enable(PROFILE_DIR)
+
+
+def profiled(stage: str):
+    """Decorador que perfila cada llamada a la función cuando el perfilado está activo"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return func(*args, **kwargs)
+            return PROFILER.run(stage, func, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def add_profile_argument(parser):
+    """Añade --profile [CARPETA] a un argparse.ArgumentParser"""
+    parser.add_argument('--profile', nargs='?', const=DEFAULT_PROFILE_DIR, default=None, metavar='CARPETA',
+                        help="Perfila las etapas con cProfile y tracemalloc y guarda los informes "
+                             f"en CARPETA (por defecto {DEFAULT_PROFILE_DIR}/)")
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Intervalo de consulta adaptativo para el servicio (service.py --adaptive)
+
+TMP no publica de forma uniforme: casi todo llega en días laborables y en
+horario de oficina, y de noche la página apenas cambia. El planificador
+aprende cuántos avisos aparecen en cada hora de la semana a partir de la
+primera vez que se vio cada código (el registro de state.py) y decide
+cuánto esperar hasta la siguiente consulta:
+
+- Cada hora tiene un intervalo objetivo inversamente proporcional a la raíz
+  de su ritmo de publicación (el reparto que minimiza el retraso medio para
+  un número dado de consultas): POLL_MIN_INTERVAL en la hora más activa,
+  más en las demás, hasta POLL_MAX_INTERVAL.
+- Tras una alerta nueva (TMP suele publicar varias seguidas) se vuelve a
+  POLL_MIN_INTERVAL, y cada consulta sin novedades multiplica la espera por
+  POLL_BACKOFF_FACTOR hasta llegar al objetivo de la hora.
+- Nunca se duerme más allá del comienzo de una hora con un objetivo menor.
+
+Mientras no haya datos suficientes (POLL_MIN_SAMPLES) el objetivo de todas
+las horas es POLL_MAX_INTERVAL y solo se aplica la espera exponencial.
+"""
+
+import math
+import os
+import time
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+# Configuración (se puede sobrescribir con variables de entorno)
+POLL_ADAPTIVE = os.environ.get('POLL_ADAPTIVE', '0') == '1'
+POLL_MIN_INTERVAL = int(os.environ.get('POLL_MIN_INTERVAL', '120'))
+POLL_MAX_INTERVAL = int(os.environ.get('POLL_MAX_INTERVAL', '1800'))
+POLL_BACKOFF_FACTOR = float(os.environ.get('POLL_BACKOFF_FACTOR', '2'))
+POLL_MIN_SAMPLES = int(os.environ.get('POLL_MIN_SAMPLES', '20'))
+
+HOURS_PER_WEEK = 7 * 24
+
+
+def hour_of_week(timestamp: float) -> int:
+    """Hora de la semana (0 = lunes de 0:00 a 1:00) en hora local"""
+    moment = datetime.fromtimestamp(timestamp)
+    return moment.weekday() * 24 + moment.hour
+
+
+class PollScheduler:
+    """Perfil semanal de publicaciones y espera exponencial entre consultas"""
+
+    def __init__(self, min_interval: int = POLL_MIN_INTERVAL, max_interval: int = POLL_MAX_INTERVAL,
+                 backoff_factor: float = POLL_BACKOFF_FACTOR, min_samples: int = POLL_MIN_SAMPLES):
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.backoff_factor = backoff_factor
+        self.min_samples = min_samples
+        self.counts = [0] * HOURS_PER_WEEK
+        self.samples = 0
+        self.idle_polls = 0
+        self._targets = None
+
+    def learn(self, timestamps: Iterable[float]):
+        """Añade al perfil los momentos en que se vio por primera vez cada alerta"""
+        for timestamp in timestamps:
+            self.counts[hour_of_week(timestamp)] += 1
+            self.samples += 1
+        self._targets = None
+
+    def record(self, new_alerts: int, now: Optional[float] = None):
+        """Anota el resultado de una consulta: las alertas nuevas reinician la espera y alimentan el perfil"""
+        if new_alerts:
+            now = time.time() if now is None else now
+            self.counts[hour_of_week(now)] += new_alerts
+            self.samples += new_alerts
+            self.idle_polls = 0
+            self._targets = None
+        else:
+            self.idle_polls += 1
+
+    def hourly_targets(self) -> List[float]:
+        """Intervalo objetivo de cada hora de la semana"""
+        if self._targets is None:
+            if self.samples < self.min_samples:
+                self._targets = [float(self.max_interval)] * HOURS_PER_WEEK
+            else:
+                counts = self.counts
+                # Cada hora se suaviza con la anterior y la siguiente
+                smoothed = [(counts[hour - 1] + 2 * counts[hour] + counts[(hour + 1) % HOURS_PER_WEEK]) / 4
+                            for hour in range(HOURS_PER_WEEK)]
+                peak = max(smoothed)
+                self._targets = [
+                    min(self.min_interval * math.sqrt(peak / rate), self.max_interval) if rate
+                    else float(self.max_interval)
+                    for rate in smoothed]
+        return self._targets
+
+    def target_interval(self, timestamp: float) -> float:
+        return self.hourly_targets()[hour_of_week(timestamp)]
+
+    def next_interval(self, now: Optional[float] = None) -> float:
+        """Segundos que esperar hasta la siguiente consulta"""
+        now = time.time() if now is None else now
+        # El exponente se acota para no calcular potencias enormes tras días sin cambios
+        backoff = self.min_interval * self.backoff_factor ** min(self.idle_polls, 32)
+        interval = min(backoff, self.target_interval(now))
+        # Si antes de despertar empieza una hora con un objetivo menor, se despierta al empezar
+        boundary = (int(now) // 3600 + 1) * 3600
+        while boundary - now < interval:
+            if self.target_interval(boundary) < interval:
+                return max(boundary - now, 1.0)
+            boundary += 3600
+        return interval
@@ -4,120 +4,230 @@ TMP Murcia Bus Alerts Monitor
 Monitorea la página de últimas noticias de TMP Murcia y envía alertas personalizadas por usuario
 """
 
-import requests
-from bs4 import BeautifulSoup
+import argparse
 import json
 import os
 import sys
 from datetime import datetime
-import re
+import hashlib
+from urllib.parse import urljoin
 from subscriptions import SubscriptionManager
+from delivery import TelegramDelivery
+from outbox import Outbox, drain_outbox, OUTBOX_ENABLED
+from messages import build_notifications, format_alert_message, line_label, alert_recipients, DIGEST_MODE
+from channels import get_channel_map
+from keywords import FILTER_MATCHER, KEYWORDS_MATCH_BODY, alert_text
+from storage import write_json_atomic, get_alert_store
+from state import AlertLedger, LEDGER_FILE, save_alert_history, save_run_state
+from parsers import get_parser
+from alert_details import enrich_alerts, fetch_details, DETAILS_ENABLED
+from line_extractor import extract_lines
+from http_client import get_http_client
+from metrics import METRICS, timed
+from profiling import PROFILER, profiled, add_profile_argument
 
 # Configuración
-TMP_URL = "https://tmpmurcia.es/ultima.asp"
+TMP_URL = os.environ.get('TMP_URL', "https://tmpmurcia.es/ultima.asp")
 ALERTS_FILE = "alerts_history.json"
+# Validadores HTTP (ETag, Last-Modified) y hash de la última página descargada
+PAGE_STATE_FILE = ".page_state.json"
 
 def load_previous_alerts():
-    """Carga las alertas previas del archivo JSON"""
-    if os.path.exists(ALERTS_FILE):
+    """Carga las alertas previas del historial (JSON o SQLite según STORAGE_BACKEND)"""
+    return get_alert_store(ALERTS_FILE).load()
+
+def load_alert_ledger(previous_data=None):
+    """Carga el registro de códigos vistos (la primera vez se crea con el historial)"""
+    seed = (previous_data or {}).get('alerts', [])
+    return AlertLedger.load(LEDGER_FILE, seed)
+
+def load_page_state():
+    """Carga los validadores de la última descarga de la página"""
+    if os.path.exists(PAGE_STATE_FILE):
         try:
-            with open(ALERTS_FILE, 'r', encoding='utf-8') as f:
+            with open(PAGE_STATE_FILE, 'r', encoding='utf-8') as f:
                 return json.load(f)
         except json.JSONDecodeError:
-            print("⚠️ Error al leer el archivo de alertas, creando uno nuevo")
-            return {"alerts": []}
-    return {"alerts": []}
-
-def save_alerts(alerts_data):
-    """Guarda las alertas en el archivo JSON"""
-    with open(ALERTS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(alerts_data, f, ensure_ascii=False, indent=2)
-
-def extract_line_number(text):
-    """Extrae el número de línea del texto"""
-    match = re.search(r'Línea\s+(\d+)', text, re.IGNORECASE)
-    if match:
-        return match.group(1)
-    return None
-
-def scrape_tmp_alerts():
-    """Extrae las alertas de la página de TMP"""
-    try:
-        print(f"🔍 Consultando {TMP_URL}...")
-        response = requests.get(TMP_URL, timeout=30, verify=False)
-        response.encoding = 'latin-1'  # La página usa codificación latin-1
+            print("⚠️ Error al leer el estado de la página, se descargará completa")
+    return {}
+
+def save_page_state(page_state):
+    """Guarda los validadores para la próxima ejecución"""
+    write_json_atomic(PAGE_STATE_FILE, page_state)
+
+@timed('fetch')
+def fetch_alerts_page(page_state=None, session=None):
+    """
+    Descarga la página de alertas usando peticiones condicionales
+    
+    Args:
+        page_state: Validadores de la descarga anterior (etag, last_modified, hash)
+        session: Cliente HTTP (por defecto el cliente compartido de http_client)
+    
+    Returns:
+        Tupla (html, nuevo_estado). html es None si la página no ha cambiado
+    """
+    page_state = page_state or {}
+    headers = {}
+    if page_state.get('etag'):
+        headers['If-None-Match'] = page_state['etag']
+    if page_state.get('last_modified'):
+        headers['If-Modified-Since'] = page_state['last_modified']
+    
+    print(f"🔍 Consultando {TMP_URL}...")
+    http = session or get_http_client()
+    response = http.get(TMP_URL, headers=headers, verify=False)
+    
+    if response.status_code == 304:
+        print("📭 La página no ha cambiado (304 Not Modified)")
+        return None, page_state
+    
+    response.raise_for_status()
+    content_hash = hashlib.sha256(response.content).hexdigest()
+    new_state = {
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'hash': content_hash
+    }
+    
+    if content_hash == page_state.get('hash'):
+        print("📭 La página no ha cambiado (mismo contenido)")
+        return None, new_state
+    
+    response.encoding = 'latin-1'  # La página usa codificación latin-1
+    return response.text, new_state
+
+@timed('parse')
+def parse_alerts(html, parser=None):
+    """
+    Extrae las alertas del HTML de la página de TMP
+    
+    Args:
+        html: Contenido de ultima.asp
+        parser: Backend de parsers.PARSERS (por defecto TMP_PARSER)
+    """
+    alerts = []
+    for href, title in get_parser(parser)(html):
+        code = href.split('codigo=')[1] if 'codigo=' in href else None
         
-        soup = BeautifulSoup(response.text, 'html.parser')
+        if code and title:
+            alerts.append({
+                'code': code,
+                'title': title,
+                'lines': extract_lines(title),
+                'url': urljoin(TMP_URL, href)
+            })
+    return alerts
+
+@profiled('scrape_tmp_alerts')
+def scrape_tmp_alerts(page_state=None, session=None):
+    """
+    Extrae las alertas de la página de TMP
+    
+    Si se pasa page_state, se hace una petición condicional: se devuelve None
+    cuando la página no ha cambiado, y el diccionario se actualiza con los
+    nuevos validadores para guardarlos al terminar la ejecución.
+    """
+    try:
+        html, new_state = fetch_alerts_page(page_state, session)
+        if page_state is not None:
+            page_state.clear()
+            page_state.update(new_state)
+        if html is None:
+            METRICS.inc('page_unchanged')
+            return None
         
-        # Encontrar todos los enlaces con alertas
-        alerts = []
-        for link in soup.find_all('a', href=True):
-            href = link.get('href', '')
-            if 'Cuerpo.asp?codigo=' in href:
-                title = link.get_text(strip=True)
-                code = href.split('codigo=')[1] if 'codigo=' in href else None
-                
-                if code and title:
-                    line_number = extract_line_number(title)
-                    alerts.append({
-                        'code': code,
-                        'title': title,
-                        'line': line_number,
-                        'url': f"https://tmpmurcia.es/{href}"
-                    })
+        alerts = parse_alerts(html)
         
+        METRICS.inc('alerts_scraped', len(alerts))
         print(f"✅ Encontradas {len(alerts)} alertas totales")
         return alerts
         
     except Exception as e:
+        METRICS.inc('scrape_errors')
         print(f"❌ Error al consultar la página: {e}")
         return []
 
+@timed('filter')
 def get_monitored_alerts(alerts, subscription_manager):
     """
     Retorna todas las alertas que al menos un usuario quiere recibir
     Esto incluye alertas de líneas específicas y alertas generales
     """
     monitored_lines = subscription_manager.get_all_monitored_lines()
+    channels = get_channel_map()
+    if channels is not None:
+        # Las líneas con canal se publican aunque nadie las siga en privado
+        monitored_lines |= channels.channel_lines()
     
-    # Separar alertas en dos categorías
-    line_alerts = []
-    general_alerts = []
-    
-    for alert in alerts:
-        if alert['line']:
-            # Alerta con línea específica
-            if alert['line'] in monitored_lines:
-                line_alerts.append(alert)
-        else:
-            # Alerta general (sin línea específica)
-            general_alerts.append(alert)
+    keyword_matcher = subscription_manager.get_keyword_matcher()
     
-    # Mantener el orden original (tal como aparece en la web)
+    # Una sola pasada, manteniendo el orden original (tal como aparece en la web)
     all_monitored = []
+    line_alerts = 0
+    general_alerts = 0
+    keyword_alerts = 0
     for alert in alerts:
-        if alert['line'] and alert['line'] in monitored_lines:
+        # Filtro global KEYWORDS_FILTER: solo las alertas que contienen alguna de sus palabras
+        # (en el título o, con KEYWORDS_MATCH_BODY, en el cuerpo que ya descargó fetch_keyword_bodies)
+        if FILTER_MATCHER and not FILTER_MATCHER.find(alert_text(alert)):
+            continue
+        if not alert['lines']:
+            # Alerta general (sin línea específica)
+            general_alerts += 1
+            all_monitored.append(alert)
+        elif not monitored_lines.isdisjoint(alert['lines']):
+            # Alerta de al menos una línea con suscriptores
+            line_alerts += 1
             all_monitored.append(alert)
-        elif not alert['line']:
+        elif keyword_matcher and keyword_matcher.find(alert_text(alert)):
+            # De una línea sin suscriptores, pero con alguna palabra clave de algún usuario
+            keyword_alerts += 1
             all_monitored.append(alert)
     
     print(f"📊 Alertas monitoreadas:")
-    print(f"   • Con línea específica: {len(line_alerts)}")
-    print(f"   • Generales (sin línea): {len(general_alerts)}")
+    print(f"   • Con línea específica: {line_alerts}")
+    print(f"   • Generales (sin línea): {general_alerts}")
+    if keyword_alerts:
+        print(f"   • Por palabra clave: {keyword_alerts}")
     print(f"   • Total: {len(all_monitored)}")
     
     return all_monitored
 
-def find_new_alerts(current_alerts, previous_data):
-    """Compara alertas actuales con las previas para encontrar nuevas"""
-    previous_codes = {alert['code'] for alert in previous_data.get('alerts', [])}
-    new_alerts = [alert for alert in current_alerts if alert['code'] not in previous_codes]
+@timed('diff')
+def find_new_alerts(current_alerts, ledger):
+    """Alertas cuyo código no se ha visto nunca (ledger: AlertLedger o cualquier contenedor de códigos)"""
+    new_alerts = [alert for alert in current_alerts if alert['code'] not in ledger]
     
+    METRICS.inc('new_alerts', len(new_alerts))
     print(f"🆕 Nuevas alertas encontradas: {len(new_alerts)}")
     return new_alerts
 
-def send_telegram_notifications(alert, subscription_manager):
-    """Envía notificaciones a todos los usuarios suscritos a la alerta"""
+def enrich_new_alerts(new_alerts, session=None, enabled=DETAILS_ENABLED):
+    """Busca en Cuerpo.asp la línea de las alertas nuevas que no la dicen en el título (DETAILS_ENABLED)"""
+    if not enabled or not new_alerts:
+        return 0
+    return enrich_alerts(new_alerts, extract_lines, session=session)
+
+def fetch_keyword_bodies(alerts, subscription_manager, ledger, session=None, enabled=None):
+    """
+    Deja en la caché de detalles el cuerpo de las alertas aún no vistas para buscar en él las palabras clave
+
+    Se llama antes de get_monitored_alerts: una alerta de una línea que no
+    sigue nadie solo se conserva si alguna palabra aparece en su cuerpo, y si
+    se descartara sin mirarlo el registro la daría por vista para siempre.
+    """
+    if enabled is None:
+        enabled = KEYWORDS_MATCH_BODY
+    if not enabled or not (subscription_manager.get_keyword_matcher() or FILTER_MATCHER):
+        return
+    unseen = [alert for alert in alerts if alert['code'] not in ledger]
+    if unseen:
+        fetch_details(unseen, session=session)
+
+@profiled('send_telegram_notifications')
+def send_telegram_notifications(alert, subscription_manager, delivery=None, channels=None):
+    """Envía notificaciones a todos los usuarios suscritos a la alerta (y a sus canales, si hay)"""
     token = os.environ.get('TELEGRAM_BOT_TOKEN')
     
     if not token:
@@ -125,50 +235,170 @@ def send_telegram_notifications(alert, subscription_manager):
         return 0
     
     # Obtener usuarios que deben recibir esta alerta
-    recipients = subscription_manager.get_users_for_alert(alert['line'])
+    recipients = alert_recipients(alert, subscription_manager, channels)
     
     if not recipients:
-        print(f"   ℹ️ No hay usuarios suscritos a {'línea ' + alert['line'] if alert['line'] else 'alertas generales'}")
+        print(f"   ℹ️ No hay usuarios suscritos a {line_label(alert).lower() if alert['lines'] else 'alertas generales'}")
         return 0
     
-    # Preparar mensaje
-    line_text = f"Línea {alert['line']}" if alert['line'] else "⚠️ Alerta General"
-    message = f"""🚌 *Nueva Alerta TMP Murcia*
+    message = format_alert_message(alert)
+    
+    # Enviar a todos los usuarios suscritos en paralelo
+    if delivery is None:
+        delivery = TelegramDelivery(token)
+    report = delivery.send_many(recipients, message)
+    METRICS.observe('alert_fanout_seconds', report['elapsed'])
+    METRICS.inc('notifications_sent', report['sent'])
+    METRICS.inc('notifications_failed', len(report['failed']))
 
-📍 *{line_text}*
-📝 {alert['title']}
+    for failure in report['failed']:
+        print(f"   ⚠️ Error al enviar a {failure['chat_id']}: {failure['error']}")
 
-🔗 [Ver detalles]({alert['url']})
+    print(f"   ✅ Notificación enviada a {report['sent']}/{len(recipients)} destinatario(s)")
+    print(f"   ⏱️ {report['elapsed']:.2f}s ({report['throughput']:.1f} msg/s, "
+          f"latencia media {report['latency_avg'] * 1000:.0f} ms, p95 {report['latency_p95'] * 1000:.0f} ms)")
+    return report['sent']
 
-⏰ {datetime.now().strftime('%d/%m/%Y %H:%M')}
-"""
+@timed('fanout')
+def notify_new_alerts(new_alerts, subscription_manager, delivery=None, session=None, digest=DIGEST_MODE):
+    """Envía las notificaciones de todas las alertas nuevas, de la más antigua a la más reciente"""
+    print(f"\n🔔 Enviando notificaciones para {len(new_alerts)} alerta(s) nueva(s)...")
+    total_sent = 0
+    token = os.environ.get('TELEGRAM_BOT_TOKEN')
+    # Un único motor de envío para todas las alertas, así se respetan
+    # los límites por chat entre una alerta y la siguiente
+    if delivery is None and token:
+        delivery = TelegramDelivery(token, session=session)
+    channels = get_channel_map()
+    if digest:
+        if delivery is None:
+            print("⚠️ No se configuró TELEGRAM_BOT_TOKEN")
+            return 0
+        # Un mensaje por usuario con todas sus alertas nuevas
+        for key, text, recipients in build_notifications(new_alerts, subscription_manager, True, channels):
+            report = delivery.send_many(recipients, text)
+            print(f"   ✅ {key}: enviado a {report['sent']}/{len(recipients)} usuario(s) en {report['elapsed']:.2f}s")
+            total_sent += report['sent']
+        print(f"\n✅ Total de notificaciones enviadas: {total_sent}")
+        return total_sent
+    for alert in reversed(new_alerts):
+        line_desc = line_label(alert) if alert['lines'] else "General"
+        print(f"\n📨 {line_desc}: {alert['title'][:50]}...")
+        sent = send_telegram_notifications(alert, subscription_manager, delivery, channels)
+        total_sent += sent
     
-    # Enviar a cada usuario suscrito
-    sent_count = 0
-    for chat_id in recipients:
-        try:
-            url = f"https://api.telegram.org/bot{token}/sendMessage"
-            data = {
-                'chat_id': chat_id,
-                'text': message,
-                'parse_mode': 'Markdown',
-                'disable_web_page_preview': True
-            }
-            response = requests.post(url, data=data, timeout=10)
-            
-            if response.status_code == 200:
-                sent_count += 1
-            else:
-                print(f"   ⚠️ Error al enviar a {chat_id}: {response.status_code}")
-        
-        except Exception as e:
-            print(f"   ⚠️ Error al enviar a {chat_id}: {e}")
+    print(f"\n✅ Total de notificaciones enviadas: {total_sent}")
+    return total_sent
+
+def enqueue_new_alerts(new_alerts, subscription_manager, outbox, digest=DIGEST_MODE):
+    """Encola en el outbox los mensajes de las alertas nuevas (uno por alerta o un resumen por usuario)"""
+    total = 0
+    for key, text, recipients in build_notifications(new_alerts, subscription_manager, digest, get_channel_map()):
+        total += outbox.enqueue(key, text, recipients)
+    print(f"📥 {total} notificación(es) encoladas en el outbox para {len(new_alerts)} alerta(s) nueva(s)")
+    return total
+
+def deliver_outbox(outbox, delivery=None, session=None):
+    """Envía las notificaciones pendientes del outbox (también las de ejecuciones interrumpidas)"""
+    token = os.environ.get('TELEGRAM_BOT_TOKEN')
+    if delivery is None:
+        if not token:
+            print(f"⚠️ No se configuró TELEGRAM_BOT_TOKEN, el outbox queda pendiente: {outbox.counts()}")
+            return 0
+        delivery = TelegramDelivery(token, session=session)
+    report = drain_outbox(outbox, delivery)
+    if report['total']:
+        for failure in report['failed'][:20]:
+            print(f"   ⚠️ Error al enviar a {failure['chat_id']}: {failure['error']}")
+        print(f"\n✅ Outbox: {report['sent']}/{report['total']} notificación(es) enviadas en {report['elapsed']:.2f}s "
+              f"({report['throughput']:.1f} msg/s, p95 {report['latency_p95'] * 1000:.0f} ms)")
+    counts = outbox.counts()
+    if counts.get('pending'):
+        print(f"⏳ Outbox: {counts['pending']} notificación(es) se reintentarán más tarde")
+    outbox.prune()
+    return report['sent']
+
+@timed('persist')
+def save_monitor_state(monitored_alerts, page_state, previous_data=None, ledger=None, all_alerts=None):
+    """
+    Guarda los validadores de la página y, si ha cambiado el conjunto de alertas, el historial
+
+    Con ledger, se anotan como vistas todas las alertas de la página
+    (all_alerts), también las que hoy no sigue nadie: así no parecen nuevas
+    cuando alguien se suscribe a su línea.
+
+    Returns:
+        (historial actualizado, códigos publicados desde la consulta anterior; 0 en la
+        primera consulta con un registro nuevo, porque no se sabe cuándo se publicaron)
+    """
+    changed = save_alert_history(monitored_alerts, previous_data, get_alert_store(ALERTS_FILE))
+    added = 0
+    if ledger is not None:
+        added = ledger.observe(all_alerts if all_alerts is not None else monitored_alerts)
+        if ledger.save():
+            print(f"📒 Registro de alertas: {len(ledger)} código(s) en total, {added} nuevo(s) desde la consulta anterior")
+    save_page_state(page_state)
+    save_run_state(len(monitored_alerts), changed)
+    if changed:
+        print(f"\n💾 Estado guardado: {len(monitored_alerts)} alertas en historial")
+    else:
+        print(f"\n💾 Historial sin cambios ({len(monitored_alerts)} alertas), no se reescribe")
+    return {'alerts': monitored_alerts}, added
+
+def run_monitor(subscription_manager, outbox=None):
+    """Consulta la página, avisa de las alertas nuevas y guarda el estado"""
+    # Obtener alertas actuales (sin procesar nada si la página no ha cambiado)
+    page_state = load_page_state()
+    all_alerts = scrape_tmp_alerts(page_state)
+    if all_alerts is None:
+        save_page_state(page_state)
+        save_run_state()
+        print("\n✨ La página no ha cambiado desde la última ejecución")
+        if outbox is not None:
+            deliver_outbox(outbox)
+        return
+    if not all_alerts:
+        print("⚠️ No se pudieron obtener alertas, saliendo...")
+        sys.exit(1)
+    
+    # Cargar alertas previas
+    previous_data = load_previous_alerts()
+    print(f"📂 Alertas previas en historial: {len(previous_data.get('alerts', []))}")
+    ledger = load_alert_ledger(previous_data)
+    
+    # Filtrar solo las alertas monitoreadas (por al menos un usuario)
+    fetch_keyword_bodies(all_alerts, subscription_manager, ledger)
+    monitored_alerts = get_monitored_alerts(all_alerts, subscription_manager)
+    
+    # Encontrar alertas nuevas
+    new_alerts = find_new_alerts(monitored_alerts, ledger)
+    enrich_new_alerts(new_alerts)
+    
+    if not new_alerts:
+        print("\n✨ No hay alertas nuevas")
+    
+    if outbox is not None:
+        # Primero se encola y se guarda el historial; si el envío se interrumpe,
+        # la siguiente ejecución continúa con lo pendiente sin repetir nada
+        if new_alerts:
+            enqueue_new_alerts(new_alerts, subscription_manager, outbox)
+        save_monitor_state(monitored_alerts, page_state, previous_data, ledger, all_alerts)
+        deliver_outbox(outbox)
+        return
     
-    print(f"   ✅ Notificación enviada a {sent_count}/{len(recipients)} usuario(s)")
-    return sent_count
+    # Sin outbox: enviar y después guardar el estado actualizado
+    if new_alerts:
+        notify_new_alerts(new_alerts, subscription_manager)
+    save_monitor_state(monitored_alerts, page_state, previous_data, ledger, all_alerts)
 
 def main():
     """Función principal"""
+    parser = argparse.ArgumentParser(description="Monitor de alertas de TMP Murcia")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    if args.profile:
+        PROFILER.enable(args.profile)
+    
     print("=" * 60)
     print("🚍 TMP Murcia - Monitor de Alertas")
     print(f"📅 {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}")
@@ -182,50 +412,21 @@ def main():
     print(f"🚌 Líneas monitoreadas: {', '.join(sorted(stats['monitored_lines'])) if stats['monitored_lines'] else 'Ninguna'}")
     print(f"📢 Usuarios con alertas generales: {stats['general_alerts_users']}")
     
-    # Verificar si hay usuarios
-    if stats['total_users'] == 0:
+    # Verificar si hay usuarios (en modo canales se publica aunque no haya ninguno)
+    if stats['total_users'] == 0 and get_channel_map() is None:
         print("\n⚠️ No hay usuarios suscritos todavía")
         print("💡 Los usuarios deben usar el bot de Telegram para suscribirse")
         return
     
-    # Cargar alertas previas
-    previous_data = load_previous_alerts()
-    print(f"📂 Alertas previas en historial: {len(previous_data.get('alerts', []))}")
-    
-    # Obtener alertas actuales
-    all_alerts = scrape_tmp_alerts()
-    if not all_alerts:
-        print("⚠️ No se pudieron obtener alertas, saliendo...")
-        sys.exit(1)
-    
-    # Filtrar solo las alertas monitoreadas (por al menos un usuario)
-    monitored_alerts = get_monitored_alerts(all_alerts, subscription_manager)
-    
-    # Encontrar alertas nuevas
-    new_alerts = find_new_alerts(monitored_alerts, previous_data)
-    
-    # Enviar notificaciones para alertas nuevas
-    if new_alerts:
-        print(f"\n🔔 Enviando notificaciones para {len(new_alerts)} alerta(s) nueva(s)...")
-        total_sent = 0
-        for alert in reversed(new_alerts):
-            line_desc = f"Línea {alert['line']}" if alert['line'] else "General"
-            print(f"\n📨 {line_desc}: {alert['title'][:50]}...")
-            sent = send_telegram_notifications(alert, subscription_manager)
-            total_sent += sent
-                
-        print(f"\n✅ Total de notificaciones enviadas: {total_sent}")
-    else:
-        print("\n✨ No hay alertas nuevas")
-    
-    # Guardar el estado actualizado
-    updated_data = {
-        'last_check': datetime.now().isoformat(),
-        'alerts': monitored_alerts
-    }
-    save_alerts(updated_data)
-    print(f"\n💾 Estado guardado: {len(monitored_alerts)} alertas en historial")
+    outbox = Outbox() if OUTBOX_ENABLED else None
+    try:
+        run_monitor(subscription_manager, outbox)
+    finally:
+        if outbox is not None:
+            outbox.close()
     
+    get_http_client().print_stats()
+    METRICS.write('monitor')
     print("=" * 60)
     print("✅ Ejecución completada")
     print("=" * 60)
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Servicio único de TMP Murcia: bot de Telegram y monitor de alertas en un solo proceso
+
+El bot (long polling), la consulta periódica de la página y el envío de
+notificaciones se ejecutan como tareas asyncio concurrentes que comparten el
+mismo SubscriptionManager en memoria y la misma sesión HTTP. Así el monitor ve
+al momento las suscripciones nuevas y no se recargan los JSON en cada ciclo.
+
+Uso:
+    python service.py
+    python service.py --scrape-interval 300 --poll-timeout 25
+    python service.py --adaptive     # Intervalo según cuándo suele publicar TMP (scheduler.py)
+"""
+
+import argparse
+import asyncio
+import os
+import signal
+import threading
+import time
+from datetime import datetime
+
+import scraper
+from bot import TelegramBot, BOT_POLL_TIMEOUT, BOT_ERROR_BACKOFF, BOT_MAX_ERROR_BACKOFF
+from channels import get_channel_map
+from delivery import TelegramDelivery
+from http_client import get_http_client
+from metrics import METRICS
+from outbox import Outbox, OUTBOX_ENABLED
+from scheduler import PollScheduler, POLL_ADAPTIVE
+from subscriptions import SubscriptionManager
+
+# Segundos entre dos consultas a la página de TMP
+SCRAPE_INTERVAL = int(os.environ.get('SCRAPE_INTERVAL', '300'))
+
+
+class AlertService:
+    def __init__(self, scrape_interval: int = SCRAPE_INTERVAL, poll_timeout: int = BOT_POLL_TIMEOUT,
+                 adaptive: bool = POLL_ADAPTIVE):
+        self.scrape_interval = scrape_interval
+        self.poll_timeout = poll_timeout
+        self.session = get_http_client()
+        self.subscription_manager = SubscriptionManager()
+        self.bot = TelegramBot(self.subscription_manager, self.session)
+        self.delivery = TelegramDelivery(self.bot.token, session=self.session)
+        self.outbox = Outbox() if OUTBOX_ENABLED else None
+        # Estado del monitor en memoria: solo se lee de disco al arrancar
+        self.page_state = scraper.load_page_state()
+        self.previous_data = scraper.load_previous_alerts()
+        self.ledger = scraper.load_alert_ledger(self.previous_data)
+        # Con --adaptive el intervalo sale de cuándo suele publicar TMP
+        self.scheduler = None
+        if adaptive:
+            self.scheduler = PollScheduler()
+            self.scheduler.learn(self.ledger.first_seen_times())
+        self.stop_event = None
+        self.queue = None
+
+    async def wait_or_stop(self, seconds: float) -> bool:
+        """Espera unos segundos; devuelve True si mientras tanto se pidió parar"""
+        try:
+            await asyncio.wait_for(self.stop_event.wait(), timeout=seconds)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def poll_updates(self) -> list:
+        """
+        Espera a getUpdates en un hilo daemon
+
+        Al parar no se espera a que vuelva el long polling (hasta poll_timeout
+        segundos): el hilo se abandona y los updates que traiga no se
+        procesan ni se confirman, así que Telegram los vuelve a entregar.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def resolve(result, error):
+            if not future.done():
+                if error is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(error)
+
+        def poll():
+            result, error = [], None
+            try:
+                result = self.bot.get_updates(self.poll_timeout)
+            except Exception as e:
+                error = e
+            try:
+                loop.call_soon_threadsafe(resolve, result, error)
+            except RuntimeError:
+                pass  # El bucle ya se cerró: el servicio se ha detenido
+
+        threading.Thread(target=poll, name='getUpdates', daemon=True).start()
+        return await future
+
+    async def bot_loop(self):
+        """Atiende los comandos de Telegram con long polling"""
+        backoff = BOT_ERROR_BACKOFF
+        while not self.stop_event.is_set():
+            updates = await self.poll_updates()
+            if self.stop_event.is_set():
+                break
+            await asyncio.to_thread(self.bot.handle_updates, updates)
+            if self.bot.poll_failed:
+                print(f"⏳ Bot: reintentando en {backoff}s...")
+                if await self.wait_or_stop(backoff):
+                    break
+                backoff = min(backoff * 2, BOT_MAX_ERROR_BACKOFF)
+            else:
+                backoff = BOT_ERROR_BACKOFF
+
+    def check_alerts(self):
+        """
+        Descarga la página y busca alertas nuevas (se ejecuta en un hilo)
+
+        Returns:
+            Lote para la tarea de envío, o None si no hay nada que hacer
+        """
+        print(f"\n🔍 Monitor: comprobando alertas ({datetime.now().strftime('%d/%m/%Y %H:%M:%S')})")
+        if self.subscription_manager.get_stats()['total_users'] == 0 and get_channel_map() is None:
+            print("⚠️ No hay usuarios suscritos todavía")
+            return None
+
+        # Se trabaja sobre una copia: el estado solo se da por bueno al guardarlo
+        page_state = dict(self.page_state)
+        all_alerts = scraper.scrape_tmp_alerts(page_state, self.session)
+        if all_alerts is None:
+            self.page_state = page_state
+            scraper.save_page_state(page_state)
+            scraper.save_run_state()
+            return None
+        if not all_alerts:
+            print("⚠️ No se pudieron obtener alertas, se reintentará en el próximo ciclo")
+            return None
+
+        scraper.fetch_keyword_bodies(all_alerts, self.subscription_manager, self.ledger, self.session)
+        monitored_alerts = scraper.get_monitored_alerts(all_alerts, self.subscription_manager)
+        new_alerts = scraper.find_new_alerts(monitored_alerts, self.ledger)
+        scraper.enrich_new_alerts(new_alerts, self.session)
+        return {
+            'new_alerts': new_alerts,
+            'monitored_alerts': monitored_alerts,
+            'all_alerts': all_alerts,
+            'page_state': page_state
+        }
+
+    def next_interval(self, new_alerts: int) -> float:
+        """Segundos hasta la siguiente consulta: fijos o, con el planificador, según la actividad"""
+        if self.scheduler is None:
+            return self.scrape_interval
+        self.scheduler.record(new_alerts)
+        interval = self.scheduler.next_interval()
+        print(f"⏱️ Monitor: próxima consulta en {interval:.0f}s "
+              f"(objetivo de esta hora: {self.scheduler.target_interval(time.time()):.0f}s)")
+        return interval
+
+    async def monitor_loop(self):
+        """Consulta la página cada scrape_interval segundos (o según el planificador adaptativo)"""
+        while not self.stop_event.is_set():
+            new_alerts = 0
+            try:
+                batch = await asyncio.to_thread(self.check_alerts)
+                if batch is not None:
+                    await self.queue.put(batch)
+                    # No se vuelve a consultar hasta haber guardado el estado de este lote
+                    await self.queue.join()
+                    # El planificador aprende de todas las alertas publicadas, las siga alguien o no
+                    new_alerts = batch.get('observed', 0)
+                elif self.outbox is not None:
+                    # Reintentos pendientes aunque la página no haya cambiado
+                    await asyncio.to_thread(scraper.deliver_outbox, self.outbox, self.delivery)
+            except Exception as e:
+                print(f"❌ Monitor: error inesperado: {e}")
+            if await self.wait_or_stop(self.next_interval(new_alerts)):
+                break
+
+    def deliver(self, batch):
+        """Envía las notificaciones de un lote y guarda el estado (se ejecuta en un hilo)"""
+        if self.outbox is not None:
+            if batch['new_alerts']:
+                scraper.enqueue_new_alerts(batch['new_alerts'], self.subscription_manager, self.outbox)
+            self.previous_data, batch['observed'] = scraper.save_monitor_state(
+                batch['monitored_alerts'], batch['page_state'], self.previous_data, self.ledger, batch['all_alerts'])
+            self.page_state = batch['page_state']
+            scraper.deliver_outbox(self.outbox, self.delivery)
+            METRICS.write('service', reset=True)
+            return
+        if batch['new_alerts']:
+            scraper.notify_new_alerts(batch['new_alerts'], self.subscription_manager, self.delivery)
+        else:
+            print("✨ No hay alertas nuevas")
+        self.previous_data, batch['observed'] = scraper.save_monitor_state(
+            batch['monitored_alerts'], batch['page_state'], self.previous_data, self.ledger, batch['all_alerts'])
+        self.page_state = batch['page_state']
+        # Cada ciclo con envíos vuelca sus métricas (y las del bot desde el anterior) y empieza de cero
+        METRICS.write('service', reset=True)
+
+    async def delivery_loop(self):
+        """Envía los lotes de alertas nuevas que produce el monitor"""
+        while True:
+            batch = await self.queue.get()
+            try:
+                await asyncio.to_thread(self.deliver, batch)
+            except Exception as e:
+                print(f"❌ Envío: error inesperado: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def run(self):
+        self.stop_event = asyncio.Event()
+        self.queue = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.stop_event.set)
+
+        if self.scheduler is None:
+            print(f"🔁 Bot con long polling de {self.poll_timeout}s, monitor cada {self.scrape_interval}s")
+        else:
+            print(f"🔁 Bot con long polling de {self.poll_timeout}s, monitor adaptativo entre "
+                  f"{self.scheduler.min_interval}s y {self.scheduler.max_interval}s "
+                  f"({self.scheduler.samples} alertas aprendidas)")
+        tasks = [
+            asyncio.create_task(self.bot_loop()),
+            asyncio.create_task(self.monitor_loop()),
+            asyncio.create_task(self.delivery_loop()),
+        ]
+        await self.stop_event.wait()
+        print("\n🛑 Deteniendo el servicio (esperando a las operaciones en curso)...")
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Los hilos con trabajo a medias (updates, consulta a TMP, envíos) terminan antes de
+        # guardar; el long polling de getUpdates no se espera (ver poll_updates)
+        await loop.shutdown_default_executor()
+
+        self.bot.close()
+        self.subscription_manager.flush()
+        if self.outbox is not None:
+            self.outbox.close()
+        if self.bot.offset != self.bot.saved_offset:
+            self.bot.save_offset(self.bot.offset)
+        self.session.print_stats()
+        METRICS.write('service', reset=True)
+        self.session.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servicio TMP Murcia: bot y monitor en un solo proceso")
+    parser.add_argument('--scrape-interval', type=int, default=SCRAPE_INTERVAL,
+                        help="Segundos entre consultas a la página de TMP")
+    parser.add_argument('--poll-timeout', type=int, default=BOT_POLL_TIMEOUT,
+                        help="Segundos de long polling del bot")
+    parser.add_argument('--adaptive', action='store_true', default=POLL_ADAPTIVE,
+                        help="Intervalo de consulta según cuándo suele publicar TMP (POLL_ADAPTIVE=1)")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("🚍 TMP Murcia - Servicio de alertas (bot + monitor)")
+    print(f"📅 {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}")
+    print("=" * 60)
+
+    service = AlertService(args.scrape_interval, args.poll_timeout, args.adaptive)
+    asyncio.run(service.run())
+
+    print("=" * 60)
+    print("👋 Servicio detenido")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
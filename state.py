@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Estado del monitor entre ejecuciones
+
+Se separa lo que cambia en cada ejecución de lo que solo cambia cuando TMP
+publica o retira un aviso:
+
+- El historial (alerts_history.json o la tabla alerts de SQLite) guarda solo
+  el conjunto de alertas, en un formato determinista, y solo se reescribe
+  si cambia el conjunto de códigos. Así el workflow no hace un commit cada
+  media hora cuando no hay nada nuevo.
+- RUN_STATE_FILE (.monitor_run.json, fuera del repositorio) guarda los
+  datos volátiles de la última ejecución: cuándo se consultó, cuántas
+  alertas había y si el historial cambió.
+- El registro (LEDGER_FILE, alerts_ledger.json) guarda todos los códigos
+  vistos alguna vez en la página, estén o no monitoreados, con cuándo se
+  vieron por primera y por última vez. Es lo que decide qué alerta es
+  nueva: un aviso que ya estaba publicado no se envía como nuevo cuando
+  alguien se suscribe a su línea, ni cuando desaparece y vuelve a salir.
+"""
+
+import json
+import os
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+
+from metrics import METRICS
+from storage import write_json_atomic, write_text_atomic
+
+RUN_STATE_FILE = os.environ.get('RUN_STATE_FILE', '.monitor_run.json')
+LEDGER_FILE = os.environ.get('LEDGER_FILE', 'alerts_ledger.json')
+# Los códigos que no están en la página y no se ven desde hace más de esto se olvidan
+LEDGER_MAX_AGE_DAYS = float(os.environ.get('LEDGER_MAX_AGE_DAYS', '365'))
+
+
+def alert_codes(alerts_data: dict) -> Set[str]:
+    """Códigos de las alertas de un historial"""
+    return {alert['code'] for alert in alerts_data.get('alerts', [])}
+
+
+def save_alert_history(alerts: list, previous_data: dict, store) -> bool:
+    """
+    Guarda el historial solo si el conjunto de códigos ha cambiado
+
+    Args:
+        alerts: Alertas monitoreadas de esta ejecución
+        previous_data: Historial cargado al empezar (None = guardar siempre)
+        store: Backend de storage.get_alert_store
+
+    Returns:
+        True si se ha escrito
+    """
+    if previous_data is not None and alert_codes({'alerts': alerts}) == alert_codes(previous_data):
+        METRICS.inc('history_writes_skipped')
+        return False
+    store.save({'alerts': alerts})
+    METRICS.inc('history_writes')
+    return True
+
+
+def load_run_state() -> dict:
+    """Datos de la última ejecución (vacío si no hay)"""
+    if os.path.exists(RUN_STATE_FILE):
+        try:
+            with open(RUN_STATE_FILE, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except json.JSONDecodeError:
+            pass
+    return {}
+
+
+def save_run_state(alert_count: int = None, history_changed: bool = False):
+    """Guarda los datos volátiles de esta ejecución (alert_count None = la página no ha cambiado)"""
+    run_state = load_run_state()
+    now = datetime.now().isoformat()
+    run_state['last_check'] = now
+    if alert_count is not None:
+        run_state['alerts'] = alert_count
+    if history_changed:
+        run_state['last_change'] = now
+    write_json_atomic(RUN_STATE_FILE, run_state)
+
+
+class AlertLedger:
+    """
+    Códigos de alerta vistos alguna vez: código -> [primera vez, última vez] (segundos epoch)
+
+    La pertenencia es una consulta a un diccionario. Solo se escribe a disco
+    cuando cambia el conjunto de códigos (hay alguno nuevo o se olvida
+    alguno): last_seen se actualiza en memoria en cada ejecución, pero en el
+    archivo es la de la última vez que se guardó con el aviso en la página,
+    que basta para caducar los que ya no se publican.
+    """
+
+    def __init__(self, path: Optional[str] = LEDGER_FILE, max_age_days: float = LEDGER_MAX_AGE_DAYS):
+        self.path = path
+        self.max_age = max_age_days * 86400
+        self.codes: Dict[str, List[int]] = {}
+        self.dirty = False
+        # Registro recién creado: lo que hay en la página la primera vez ya estaba publicado
+        self.fresh = False
+
+    @classmethod
+    def load(cls, path: str = LEDGER_FILE, seed_alerts: Iterable[dict] = (),
+             max_age_days: float = LEDGER_MAX_AGE_DAYS):
+        """
+        Carga el registro; si aún no existe, lo crea con las alertas del historial
+
+        Sin esa semilla, la primera ejecución tomaría por nuevas todas las
+        alertas que ya se habían enviado. De esas no se sabe cuándo se
+        publicaron: su primera vez queda a 0, igual que la de las que se vean
+        en la primera observación del registro nuevo.
+        """
+        ledger = cls(path, max_age_days)
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    ledger.codes = {code: list(times) for code, times in json.load(f)['codes'].items()}
+                return ledger
+            except (json.JSONDecodeError, KeyError, TypeError):
+                print(f"⚠️ Error al leer {path}, se reconstruye a partir del historial")
+        now = int(time.time())
+        for alert in seed_alerts:
+            ledger.codes.setdefault(alert['code'], [0, now])
+        ledger.dirty = True
+        ledger.fresh = True
+        return ledger
+
+    def __contains__(self, code: str) -> bool:
+        return code in self.codes
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def observe(self, alerts: Iterable[dict], now: Optional[int] = None) -> int:
+        """
+        Anota las alertas que están ahora en la página y olvida las caducadas
+
+        En la primera observación de un registro nuevo los códigos que
+        faltan no se publicaron ahora sino en cualquier momento anterior: se
+        anotan con la primera vez a 0 y no se cuentan.
+
+        Returns:
+            Número de códigos nuevos publicados desde la observación anterior
+        """
+        now = int(time.time()) if now is None else now
+        first_seen = 0 if self.fresh else now
+        visible = set()
+        added = 0
+        for alert in alerts:
+            code = alert['code']
+            visible.add(code)
+            times = self.codes.get(code)
+            if times is None:
+                self.codes[code] = [first_seen, now]
+                added += 1
+            else:
+                times[1] = now
+        expired = [code for code, (_, last_seen) in self.codes.items()
+                   if code not in visible and now - last_seen > self.max_age]
+        for code in expired:
+            del self.codes[code]
+        if added or expired:
+            self.dirty = True
+        if self.fresh:
+            self.fresh = False
+            return 0
+        return added
+
+    def first_seen_times(self) -> List[int]:
+        """Cuándo se vio por primera vez cada código (para estimar cuándo publica TMP)"""
+        return sorted(first_seen for first_seen, _ in self.codes.values() if first_seen)
+
+    def save(self) -> bool:
+        """Escribe el registro si ha cambiado el conjunto de códigos; devuelve True si se ha escrito"""
+        if not self.dirty or not self.path:
+            return False
+        codes = sorted(self.codes, key=lambda code: (len(code), code))
+        rows = [f"{json.dumps(code, ensure_ascii=False)}:[{first},{last}]"
+                for code in codes for first, last in [self.codes[code]]]
+        write_text_atomic(self.path, '{"codes":{\n' + ',\n'.join(rows) + '\n}}\n')
+        self.dirty = False
+        return True
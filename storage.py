@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Almacenamiento en disco: escritura atómica y backends JSON/SQLite
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+
+
+def write_text_atomic(path: str, text: str):
+    """
+    Escribe un archivo de texto de forma atómica
+
+    Se escribe primero en un archivo temporal del mismo directorio y después
+    se renombra sobre el destino, así un fallo a mitad de escritura nunca deja
+    el archivo original corrupto.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_json_atomic(path: str, data, compact: bool = False):
+    """Escribe un JSON de forma atómica (ver write_text_atomic)"""
+    if compact:
+        text = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    else:
+        text = json.dumps(data, ensure_ascii=False, indent=2)
+    write_text_atomic(path, text)
+
+
+def quarantine_corrupt_file(path: str) -> str:
+    """Aparta un archivo ilegible para no perderlo al regenerarlo"""
+    corrupt_path = f"{path}.corrupt"
+    os.replace(path, corrupt_path)
+    return corrupt_path
+
+
+# ---------------------------------------------------------------
+# Backends de almacenamiento de suscripciones e historial de alertas
+# ---------------------------------------------------------------
+
+# "json" (por defecto, archivos del repositorio) o "sqlite"
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'json')
+SQLITE_PATH = os.environ.get('SQLITE_PATH', 'tmp_alerts.db')
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    chat_id TEXT PRIMARY KEY,
+    receive_general INTEGER NOT NULL DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS user_lines (
+    line TEXT NOT NULL,
+    chat_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (line, chat_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS user_lines_chat ON user_lines (chat_id);
+CREATE TABLE IF NOT EXISTS user_keywords (
+    keyword TEXT NOT NULL,
+    chat_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (keyword, chat_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS user_keywords_chat ON user_keywords (chat_id);
+CREATE TABLE IF NOT EXISTS alerts (
+    code TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    line TEXT,
+    url TEXT NOT NULL,
+    position INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class JsonSubscriptionStore:
+    """
+    Suscripciones en un archivo JSON
+
+    Los cambios se hacen sobre el diccionario en memoria, así que los métodos
+    incrementales no hacen nada y save() reescribe el archivo completo.
+    """
+
+    # save() necesita todas las suscripciones
+    saves_snapshot = True
+
+    def __init__(self, path: str, compact: bool = False):
+        self.path = path
+        self.compact = compact
+
+    def load(self) -> dict:
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except json.JSONDecodeError:
+                corrupt_path = quarantine_corrupt_file(self.path)
+                print(f"⚠️ Error al leer suscripciones, copia guardada en {corrupt_path}, creando nuevo archivo")
+                return {"users": {}}
+        return {"users": {}}
+
+    def add_user(self, chat_id: str, receive_general: bool):
+        pass
+
+    def set_line(self, chat_id: str, line: str, subscribed: bool):
+        pass
+
+    def set_keyword(self, chat_id: str, keyword: str, subscribed: bool):
+        pass
+
+    def set_receive_general(self, chat_id: str, receive: bool):
+        pass
+
+    def save(self, data: dict):
+        write_json_atomic(self.path, data, compact=self.compact)
+
+
+def format_alert_history(alerts_data: dict) -> str:
+    """
+    Historial en JSON determinista: una alerta compacta por línea, ordenadas por código
+
+    Las mismas alertas producen siempre el mismo archivo, así que git solo ve
+    cambios cuando de verdad cambian, y cada alerta nueva es una línea del diff.
+    """
+    alerts = sorted(alerts_data.get('alerts', []), key=lambda alert: (len(alert['code']), alert['code']))
+    rows = [json.dumps(alert, ensure_ascii=False, sort_keys=True, separators=(',', ':')) for alert in alerts]
+    return '{"alerts":[\n' + ',\n'.join(rows) + '\n]}\n'
+
+
+class JsonAlertStore:
+    """Historial de alertas en un archivo JSON (ver format_alert_history)"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self) -> dict:
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except json.JSONDecodeError:
+                print("⚠️ Error al leer el archivo de alertas, creando uno nuevo")
+                return {"alerts": []}
+        return {"alerts": []}
+
+    def save(self, alerts_data: dict):
+        write_text_atomic(self.path, format_alert_history(alerts_data))
+
+
+class SqliteDatabase:
+    """Conexión SQLite en modo WAL compartida por los stores (segura entre hilos)"""
+
+    def __init__(self, path: str = SQLITE_PATH):
+        self.path = path
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SQLITE_SCHEMA)
+        self.conn.commit()
+
+    def commit(self):
+        with self.lock:
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
+
+
+class SqliteSubscriptionStore:
+    """
+    Suscripciones en SQLite
+
+    Cada cambio se aplica con una sentencia dentro de la transacción en curso
+    y save() la confirma, así que el modo diferido agrupa los cambios de un
+    lote en una sola transacción.
+    """
+
+    # save() solo confirma: no hace falta reconstruir las suscripciones para llamarlo
+    saves_snapshot = False
+
+    def __init__(self, db: SqliteDatabase):
+        self.db = db
+
+    def load(self) -> dict:
+        with self.db.lock:
+            users = {
+                chat_id: {"lines": [], "receive_general": bool(receive_general)}
+                for chat_id, receive_general in self.db.conn.execute(
+                    "SELECT chat_id, receive_general FROM users ORDER BY rowid")
+            }
+            for chat_id, line in self.db.conn.execute(
+                    "SELECT chat_id, line FROM user_lines ORDER BY chat_id, position"):
+                users.setdefault(chat_id, {"lines": [], "receive_general": True})["lines"].append(line)
+            for chat_id, keyword in self.db.conn.execute(
+                    "SELECT chat_id, keyword FROM user_keywords ORDER BY chat_id, position"):
+                user = users.setdefault(chat_id, {"lines": [], "receive_general": True})
+                user.setdefault("keywords", []).append(keyword)
+        return {"users": users}
+
+    def add_user(self, chat_id: str, receive_general: bool):
+        with self.db.lock:
+            self.db.conn.execute(
+                "INSERT OR IGNORE INTO users (chat_id, receive_general) VALUES (?, ?)",
+                (chat_id, int(receive_general)))
+
+    def set_line(self, chat_id: str, line: str, subscribed: bool):
+        with self.db.lock:
+            if subscribed:
+                self.db.conn.execute(
+                    "INSERT OR IGNORE INTO user_lines (line, chat_id, position) "
+                    "VALUES (?, ?, (SELECT COALESCE(MAX(position), -1) + 1 FROM user_lines WHERE chat_id = ?))",
+                    (line, chat_id, chat_id))
+            else:
+                self.db.conn.execute("DELETE FROM user_lines WHERE line = ? AND chat_id = ?", (line, chat_id))
+
+    def set_keyword(self, chat_id: str, keyword: str, subscribed: bool):
+        with self.db.lock:
+            if subscribed:
+                self.db.conn.execute(
+                    "INSERT OR IGNORE INTO user_keywords (keyword, chat_id, position) "
+                    "VALUES (?, ?, (SELECT COALESCE(MAX(position), -1) + 1 FROM user_keywords WHERE chat_id = ?))",
+                    (keyword, chat_id, chat_id))
+            else:
+                self.db.conn.execute(
+                    "DELETE FROM user_keywords WHERE keyword = ? AND chat_id = ?", (keyword, chat_id))
+
+    def set_receive_general(self, chat_id: str, receive: bool):
+        with self.db.lock:
+            self.db.conn.execute("UPDATE users SET receive_general = ? WHERE chat_id = ?", (int(receive), chat_id))
+
+    def save(self, data: dict):
+        self.db.commit()
+
+    def import_data(self, data: dict):
+        """Reemplaza todas las suscripciones por las de un diccionario (migración)"""
+        with self.db.lock:
+            self.db.conn.execute("DELETE FROM user_lines")
+            self.db.conn.execute("DELETE FROM user_keywords")
+            self.db.conn.execute("DELETE FROM users")
+            for chat_id, user_data in data.get("users", {}).items():
+                self.db.conn.execute(
+                    "INSERT INTO users (chat_id, receive_general) VALUES (?, ?)",
+                    (chat_id, int(user_data.get("receive_general", True))))
+                self.db.conn.executemany(
+                    "INSERT OR IGNORE INTO user_lines (line, chat_id, position) VALUES (?, ?, ?)",
+                    [(line, chat_id, position) for position, line in enumerate(user_data.get("lines", []))])
+                self.db.conn.executemany(
+                    "INSERT OR IGNORE INTO user_keywords (keyword, chat_id, position) VALUES (?, ?, ?)",
+                    [(keyword, chat_id, position)
+                     for position, keyword in enumerate(user_data.get("keywords", []))])
+            self.db.conn.commit()
+
+
+def _alert_lines(alert: dict) -> list:
+    """Líneas de una alerta (los historiales antiguos guardaban una sola en 'line')"""
+    if 'lines' in alert:
+        return alert['lines']
+    return [alert['line']] if alert.get('line') else []
+
+
+class SqliteAlertStore:
+    """Historial de alertas en SQLite (indexado por código de alerta)"""
+
+    def __init__(self, db: SqliteDatabase):
+        self.db = db
+
+    def load(self) -> dict:
+        with self.db.lock:
+            alerts = [
+                {"code": code, "title": title, "lines": line.split(',') if line else [], "url": url}
+                for code, title, line, url in self.db.conn.execute(
+                    "SELECT code, title, line, url FROM alerts ORDER BY position")
+            ]
+            row = self.db.conn.execute("SELECT value FROM meta WHERE key = 'last_check'").fetchone()
+        data = {"alerts": alerts}
+        if row:
+            data["last_check"] = row[0]
+        return data
+
+    def save(self, alerts_data: dict):
+        with self.db.lock:
+            self.db.conn.execute("DELETE FROM alerts")
+            self.db.conn.executemany(
+                "INSERT OR REPLACE INTO alerts (code, title, line, url, position) VALUES (?, ?, ?, ?, ?)",
+                # La columna line guarda las líneas separadas por comas
+                [(a["code"], a["title"], ','.join(_alert_lines(a)) or None, a["url"], position)
+                 for position, a in enumerate(alerts_data.get("alerts", []))])
+            if "last_check" in alerts_data:
+                self.db.conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('last_check', ?)",
+                    (alerts_data["last_check"],))
+            self.db.conn.commit()
+
+
+_sqlite_db = None
+_sqlite_db_lock = threading.Lock()
+
+
+def get_sqlite_database(path: str = SQLITE_PATH) -> SqliteDatabase:
+    """Devuelve la base de datos SQLite compartida del proceso"""
+    global _sqlite_db
+    with _sqlite_db_lock:
+        if _sqlite_db is None:
+            _sqlite_db = SqliteDatabase(path)
+        return _sqlite_db
+
+
+def get_subscription_store(json_path: str, compact: bool = False, backend: str = None):
+    """Store de suscripciones según STORAGE_BACKEND"""
+    backend = backend or STORAGE_BACKEND
+    if backend == 'sqlite':
+        return SqliteSubscriptionStore(get_sqlite_database())
+    if backend == 'json':
+        return JsonSubscriptionStore(json_path, compact)
+    raise ValueError(f"Backend de almacenamiento desconocido: {backend}")
+
+
+def get_alert_store(json_path: str, backend: str = None):
+    """Store del historial de alertas según STORAGE_BACKEND"""
+    backend = backend or STORAGE_BACKEND
+    if backend == 'sqlite':
+        return SqliteAlertStore(get_sqlite_database())
+    if backend == 'json':
+        return JsonAlertStore(json_path)
+    raise ValueError(f"Backend de almacenamiento desconocido: {backend}")
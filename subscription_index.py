@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Suscripciones en memoria: los datos de cada usuario y el índice inverso
+(quién recibe cada alerta)
+
+Hay dos implementaciones con la misma interfaz:
+
+- DictSubscriptionIndex: los diccionarios por usuario de siempre
+  (data["users"]) más conjuntos de chat_ids (str) por línea. Es la más
+  rápida para pocos usuarios.
+- CompactSubscriptionIndex: las líneas se internan como enteros pequeños,
+  cada línea guarda un array ordenado de chat_ids (int64) y las alertas
+  generales son un mapa de un byte por usuario alineado con el array
+  ordenado de todos los chat_ids. Es el único estado en memoria: no se
+  guardan diccionarios por usuario, las líneas de un usuario se obtienen
+  buscándolo en los arrays y to_users() reconstruye data["users"] solo
+  cuando hay que escribir el JSON. Con un millón de usuarios ocupa una
+  fracción de la memoria, a cambio de consultas algo más lentas sin NumPy.
+
+El índice compacto exige chat_ids numéricos, como los de Telegram, y no
+conserva el orden en que cada usuario se suscribió a sus líneas.
+"""
+
+import heapq
+from array import array
+from bisect import bisect_left
+from itertools import compress, groupby
+from typing import Dict, List, Optional, Set
+
+try:
+    import numpy as np
+except ImportError:  # NumPy es opcional
+    np = None
+
+HAS_NUMPY = np is not None
+
+
+class DictSubscriptionIndex:
+    """Diccionarios por usuario y un conjunto de chat_ids por línea"""
+
+    def __init__(self):
+        self.users: Dict[str, dict] = {}
+        self.line_index: Dict[str, Set[str]] = {}
+        self.general: Set[str] = set()
+
+    @classmethod
+    def from_users(cls, users: dict):
+        index = cls()
+        index.users = users
+        for chat_id, user_data in users.items():
+            for line in user_data.get("lines", []):
+                index.line_index.setdefault(line, set()).add(chat_id)
+            if user_data.get("receive_general", True):
+                index.general.add(chat_id)
+        return index
+
+    def get_user(self, chat_id: str) -> Optional[dict]:
+        return self.users.get(chat_id)
+
+    def user_count(self) -> int:
+        return len(self.users)
+
+    def to_users(self) -> dict:
+        return self.users
+
+    def add_user(self, chat_id: str, receive_general: bool):
+        if chat_id not in self.users:
+            self.users[chat_id] = {"lines": [], "receive_general": receive_general}
+            self.set_general(chat_id, receive_general)
+
+    def add_line(self, chat_id: str, line: str):
+        lines = self.users[chat_id]["lines"]
+        if line not in lines:
+            lines.append(line)
+        self.line_index.setdefault(line, set()).add(chat_id)
+
+    def remove_line(self, chat_id: str, line: str):
+        lines = self.users[chat_id]["lines"]
+        if line in lines:
+            lines.remove(line)
+        subscribers = self.line_index.get(line)
+        if subscribers is not None:
+            subscribers.discard(chat_id)
+            if not subscribers:
+                del self.line_index[line]
+
+    def set_general(self, chat_id: str, receive: bool):
+        self.users[chat_id]["receive_general"] = receive
+        if receive:
+            self.general.add(chat_id)
+        else:
+            self.general.discard(chat_id)
+
+    def add_keyword(self, chat_id: str, keyword: str):
+        self.users[chat_id].setdefault("keywords", []).append(keyword)
+
+    def remove_keyword(self, chat_id: str, keyword: str):
+        user = self.users[chat_id]
+        user["keywords"].remove(keyword)
+        if not user["keywords"]:
+            del user["keywords"]
+
+    def users_for_line(self, line: str) -> List[str]:
+        return list(self.line_index.get(line, ()))
+
+    def users_for_lines(self, lines: List[str]) -> List[str]:
+        """Unión sin repetidos de los suscriptores de varias líneas"""
+        return list(set().union(*(self.line_index.get(line, ()) for line in lines)))
+
+    def general_users(self) -> List[str]:
+        return list(self.general)
+
+    def monitored_lines(self) -> Set[str]:
+        return set(self.line_index)
+
+    def line_counts(self) -> Dict[str, int]:
+        return {line: len(users) for line, users in self.line_index.items()}
+
+    def general_count(self) -> int:
+        return len(self.general)
+
+
+class CompactSubscriptionIndex:
+    """Índice con arrays ordenados de chat_ids (int64) y líneas internadas"""
+
+    def __init__(self):
+        self.line_ids: Dict[str, int] = {}
+        self.line_names: List[str] = []
+        self.line_users: List[array] = []
+        # Todos los usuarios ordenados por chat_id y, en paralelo, 1 si reciben alertas generales
+        self.chats = array('q')
+        self.general = bytearray()
+        # Solo los usuarios con palabras clave (pocos): chat_id -> palabras
+        self.keywords: Dict[str, List[str]] = {}
+
+    @classmethod
+    def from_users(cls, users: dict):
+        index = cls()
+        per_line: List[List[int]] = []
+        chats = []
+        for chat_id, user_data in users.items():
+            chat = int(chat_id)
+            chats.append((chat, 1 if user_data.get("receive_general", True) else 0))
+            for line in user_data.get("lines", []):
+                line_id = index.intern_line(line)
+                if line_id == len(per_line):
+                    per_line.append([])
+                per_line[line_id].append(chat)
+            if user_data.get("keywords"):
+                index.keywords[chat_id] = list(user_data["keywords"])
+        chats.sort()
+        index.chats = array('q', (chat for chat, _ in chats))
+        index.general = bytearray(flag for _, flag in chats)
+        index.line_users = [array('q', sorted(line_chats)) for line_chats in per_line]
+        return index
+
+    def _find_user(self, chat: int) -> int:
+        """Posición del usuario en self.chats, o -1 si no está"""
+        position = bisect_left(self.chats, chat)
+        if position < len(self.chats) and self.chats[position] == chat:
+            return position
+        return -1
+
+    def get_user(self, chat_id: str) -> Optional[dict]:
+        """Datos del usuario reconstruidos a partir de los arrays (una copia: cambiarla no cambia nada)"""
+        chat = int(chat_id)
+        position = self._find_user(chat)
+        if position < 0:
+            return None
+        lines = []
+        for name, users in zip(self.line_names, self.line_users):
+            line_position = bisect_left(users, chat)
+            if line_position < len(users) and users[line_position] == chat:
+                lines.append(name)
+        user = {"lines": lines, "receive_general": bool(self.general[position])}
+        if chat_id in self.keywords:
+            user["keywords"] = list(self.keywords[chat_id])
+        return user
+
+    def user_count(self) -> int:
+        return len(self.chats)
+
+    def to_users(self) -> dict:
+        """Reconstruye data["users"] para guardarlo (ordenado por chat_id)"""
+        users = {str(chat): {"lines": [], "receive_general": bool(flag)}
+                 for chat, flag in zip(self.chats, self.general)}
+        for name, line_chats in zip(self.line_names, self.line_users):
+            for chat in line_chats:
+                users[str(chat)]["lines"].append(name)
+        for chat_id, keywords in self.keywords.items():
+            users[chat_id]["keywords"] = list(keywords)
+        return users
+
+    def intern_line(self, line: str) -> int:
+        """Id entero de una línea (se crea la primera vez)"""
+        line_id = self.line_ids.get(line)
+        if line_id is None:
+            line_id = len(self.line_names)
+            self.line_ids[line] = line_id
+            self.line_names.append(line)
+            self.line_users.append(array('q'))
+        return line_id
+
+    def _user_position(self, chat: int) -> int:
+        """Posición del usuario en self.chats, insertándolo si no está"""
+        position = bisect_left(self.chats, chat)
+        if position == len(self.chats) or self.chats[position] != chat:
+            self.chats.insert(position, chat)
+            self.general.insert(position, 0)
+        return position
+
+    def add_user(self, chat_id: str, receive_general: bool):
+        if self._find_user(int(chat_id)) < 0:
+            self.set_general(chat_id, receive_general)
+
+    def add_line(self, chat_id: str, line: str):
+        chat = int(chat_id)
+        self._user_position(chat)
+        users = self.line_users[self.intern_line(line)]
+        position = bisect_left(users, chat)
+        if position == len(users) or users[position] != chat:
+            users.insert(position, chat)
+
+    def remove_line(self, chat_id: str, line: str):
+        line_id = self.line_ids.get(line)
+        if line_id is None:
+            return
+        chat = int(chat_id)
+        users = self.line_users[line_id]
+        position = bisect_left(users, chat)
+        if position < len(users) and users[position] == chat:
+            del users[position]
+
+    def set_general(self, chat_id: str, receive: bool):
+        self.general[self._user_position(int(chat_id))] = 1 if receive else 0
+
+    def add_keyword(self, chat_id: str, keyword: str):
+        self.keywords.setdefault(chat_id, []).append(keyword)
+
+    def remove_keyword(self, chat_id: str, keyword: str):
+        keywords = self.keywords[chat_id]
+        keywords.remove(keyword)
+        if not keywords:
+            del self.keywords[chat_id]
+
+    def users_for_line(self, line: str) -> List[str]:
+        line_id = self.line_ids.get(line)
+        if line_id is None:
+            return []
+        return list(map(str, self.line_users[line_id]))
+
+    def users_for_lines(self, lines: List[str]) -> List[str]:
+        """Mezcla en una pasada los arrays ordenados de varias líneas, sin repetidos"""
+        arrays = [self.line_users[self.line_ids[line]] for line in lines if line in self.line_ids]
+        if np is not None and arrays:
+            merged = np.unique(np.concatenate([np.frombuffer(users, dtype=np.int64) for users in arrays]))
+            return list(map(str, merged.tolist()))
+        return [str(chat) for chat, _ in groupby(heapq.merge(*arrays))]
+
+    def general_users(self) -> List[str]:
+        if np is not None and self.chats:
+            chats = np.frombuffer(self.chats, dtype=np.int64)
+            mask = np.frombuffer(self.general, dtype=np.bool_)
+            return list(map(str, chats[mask].tolist()))
+        return list(map(str, compress(self.chats, self.general)))
+
+    def monitored_lines(self) -> Set[str]:
+        return {name for name, users in zip(self.line_names, self.line_users) if users}
+
+    def line_counts(self) -> Dict[str, int]:
+        return {name: len(users) for name, users in zip(self.line_names, self.line_users) if users}
+
+    def general_count(self) -> int:
+        return self.general.count(1)
+
+
+def build_subscription_index(users: dict, compact: bool = False):
+    """Construye el índice a partir de data["users"] (el no compacto lo usa directamente, sin copiarlo)"""
+    index_class = CompactSubscriptionIndex if compact else DictSubscriptionIndex
+    return index_class.from_users(users)
@@ -3,76 +3,243 @@
 Sistema de gestión de suscripciones de usuarios
 """
 
-import json
+import atexit
+import functools
 import os
+import threading
+from contextlib import contextmanager
 from typing import Dict, List, Set, Optional
 
+from storage import get_subscription_store
+from subscription_index import build_subscription_index
+from keywords import KeywordMatcher, normalize
+
 SUBSCRIPTIONS_FILE = "subscriptions.json"
+# Escritura diferida: los cambios se guardan al final de cada lote o al salir
+SUBSCRIPTIONS_WRITE_BEHIND = os.environ.get('SUBSCRIPTIONS_WRITE_BEHIND', '0') == '1'
+# Guardar el JSON sin indentar (más pequeño y rápido de escribir)
+SUBSCRIPTIONS_COMPACT_JSON = os.environ.get('SUBSCRIPTIONS_COMPACT_JSON', '0') == '1'
+# Índice en memoria con arrays de enteros en lugar de conjuntos (para cientos de miles de usuarios)
+SUBSCRIPTIONS_COMPACT_INDEX = os.environ.get('SUBSCRIPTIONS_COMPACT_INDEX', '0') == '1'
+
+def synchronized(method):
+    """Ejecuta el método con el cerrojo del gestor (bot y monitor pueden compartirlo)"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
 
 class SubscriptionManager:
-    def __init__(self):
-        self.data = self.load_subscriptions()
+    def __init__(self, write_behind: bool = SUBSCRIPTIONS_WRITE_BEHIND,
+                 compact_json: bool = SUBSCRIPTIONS_COMPACT_JSON, store=None,
+                 compact_index: bool = SUBSCRIPTIONS_COMPACT_INDEX):
+        """
+        Args:
+            write_behind: Guardar solo al final de cada lote o al salir
+            compact_json: Guardar el JSON sin indentar (backend json)
+            store: Backend de almacenamiento (por defecto según STORAGE_BACKEND)
+            compact_index: Usar el índice compacto (ver subscription_index.py)
+        """
+        self.lock = threading.RLock()
+        self.write_behind = write_behind
+        self.compact_index = compact_index
+        self.store = store or get_subscription_store(SUBSCRIPTIONS_FILE, compact_json)
+        self.dirty = False
+        self.batch_depth = 0
+        self.build_index(self.load_subscriptions())
+        if self.write_behind:
+            atexit.register(self.flush)
+
+    def build_index(self, data: dict):
+        """
+        Construye el estado en memoria a partir de los datos cargados
+
+        El índice guarda los datos de cada usuario además del índice inverso
+        (línea -> chat_ids y usuarios con alertas generales). El compacto
+        copia todo a sus arrays, así que data["users"] se libera al terminar.
+        """
+        self.index = build_subscription_index(data["users"], self.compact_index)
+        # Palabra normalizada -> chat_ids; el autómata se reconstruye cuando cambian las palabras
+        self.keyword_index: Dict[str, Set[str]] = {}
+        for chat_id, user_data in data["users"].items():
+            for keyword in user_data.get("keywords", []):
+                self.keyword_index.setdefault(normalize(keyword), set()).add(chat_id)
+        self.keyword_matcher = None
+
+    @property
+    def data(self) -> dict:
+        """Suscripciones en el formato de subscriptions.json (con el índice compacto se reconstruyen)"""
+        with self.lock:
+            return {"users": self.index.to_users()}
     
     def load_subscriptions(self) -> dict:
-        """Carga las suscripciones desde el archivo JSON"""
-        if os.path.exists(SUBSCRIPTIONS_FILE):
-            try:
-                with open(SUBSCRIPTIONS_FILE, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except json.JSONDecodeError:
-                print("⚠️ Error al leer suscripciones, creando nuevo archivo")
-                return {"users": {}}
-        return {"users": {}}
+        """Carga las suscripciones desde el backend de almacenamiento"""
+        return self.store.load()
     
+    @synchronized
     def save_subscriptions(self):
-        """Guarda las suscripciones en el archivo JSON"""
-        with open(SUBSCRIPTIONS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(self.data, f, ensure_ascii=False, indent=2)
+        """Guarda las suscripciones en el backend de almacenamiento"""
+        # Solo se reconstruye data["users"] para los backends que reescriben todo (JSON)
+        self.store.save(self.data if self.store.saves_snapshot else None)
+        self.dirty = False
     
+    @synchronized
+    def mark_dirty(self):
+        """Marca cambios pendientes y los guarda salvo en modo diferido o dentro de un lote"""
+        self.dirty = True
+        if not self.write_behind and self.batch_depth == 0:
+            self.save_subscriptions()
+    
+    @synchronized
+    def flush(self):
+        """Guarda las suscripciones solo si hay cambios pendientes"""
+        if self.dirty:
+            self.save_subscriptions()
+    
+    @contextmanager
+    def batch(self):
+        """
+        Agrupa varios cambios en una única escritura a disco
+        
+        Uso:
+            with manager.batch():
+                manager.subscribe_line(...)
+                manager.unsubscribe_line(...)
+        """
+        with self.lock:
+            self.batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self.lock:
+                self.batch_depth -= 1
+                if self.batch_depth == 0:
+                    self.flush()
+    
+    @synchronized
     def get_user_data(self, chat_id: str) -> dict:
-        """Obtiene los datos de un usuario, creándolos si no existen"""
+        """
+        Obtiene los datos de un usuario, creándolos si no existen
+
+        Son para consultarlos: con el índice compacto se devuelve una copia y
+        los cambios se hacen con los métodos del gestor.
+        """
         chat_id = str(chat_id)
-        if chat_id not in self.data["users"]:
-            self.data["users"][chat_id] = {
-                "lines": [],
-                "receive_general": True  # Por defecto recibe alertas generales
-            }
-        return self.data["users"][chat_id]
+        user = self.index.get_user(chat_id)
+        if user is None:
+            # Por defecto recibe alertas generales
+            self.index.add_user(chat_id, True)
+            self.store.add_user(chat_id, True)
+            # Con SQLite el INSERT abre una transacción: se confirma aunque luego no cambie nada más
+            self.mark_dirty()
+            user = self.index.get_user(chat_id)
+        return user
     
+    @synchronized
+    def peek_user_data(self, chat_id: str) -> dict:
+        """Datos de un usuario para consultarlos, sin darlo de alta si no existe"""
+        return self.index.get_user(str(chat_id)) or {"lines": [], "receive_general": True}
+    
+    @synchronized
     def subscribe_line(self, chat_id: str, line: str) -> bool:
         """Suscribe a un usuario a una línea"""
         user = self.get_user_data(chat_id)
         if line not in user["lines"]:
-            user["lines"].append(line)
-            self.save_subscriptions()
+            self.index.add_line(str(chat_id), line)
+            self.store.set_line(str(chat_id), line, True)
+            self.mark_dirty()
             return True
         return False
     
+    @synchronized
     def unsubscribe_line(self, chat_id: str, line: str) -> bool:
         """Desuscribe a un usuario de una línea"""
         user = self.get_user_data(chat_id)
         if line in user["lines"]:
-            user["lines"].remove(line)
-            self.save_subscriptions()
+            self.index.remove_line(str(chat_id), line)
+            self.store.set_line(str(chat_id), line, False)
+            self.mark_dirty()
             return True
         return False
     
+    @synchronized
+    def subscribe_keyword(self, chat_id: str, keyword: str) -> bool:
+        """Suscribe a un usuario a una palabra clave (se compara sin mayúsculas ni tildes)"""
+        user = self.get_user_data(chat_id)
+        term = normalize(keyword)
+        if any(normalize(existing) == term for existing in user.get("keywords", [])):
+            return False
+        self.index.add_keyword(str(chat_id), keyword)
+        subscribers = self.keyword_index.setdefault(term, set())
+        if not subscribers:
+            self.keyword_matcher = None
+        subscribers.add(str(chat_id))
+        self.store.set_keyword(str(chat_id), keyword, True)
+        self.mark_dirty()
+        return True
+    
+    @synchronized
+    def unsubscribe_keyword(self, chat_id: str, keyword: str) -> bool:
+        """Quita una palabra clave de un usuario"""
+        user = self.get_user_data(chat_id)
+        term = normalize(keyword)
+        for existing in user.get("keywords", []):
+            if normalize(existing) == term:
+                self.index.remove_keyword(str(chat_id), existing)
+                subscribers = self.keyword_index.get(term, set())
+                subscribers.discard(str(chat_id))
+                if not subscribers:
+                    self.keyword_index.pop(term, None)
+                    self.keyword_matcher = None
+                self.store.set_keyword(str(chat_id), existing, False)
+                self.mark_dirty()
+                return True
+        return False
+    
+    @synchronized
+    def get_keywords(self, chat_id: str) -> List[str]:
+        """Palabras clave de un usuario"""
+        return list(self.peek_user_data(chat_id).get("keywords", []))
+    
+    @synchronized
+    def get_keyword_matcher(self) -> KeywordMatcher:
+        """Autómata con las palabras de todos los usuarios (se construye solo si han cambiado)"""
+        if self.keyword_matcher is None:
+            self.keyword_matcher = KeywordMatcher(self.keyword_index)
+        return self.keyword_matcher
+    
+    @synchronized
+    def get_users_for_text(self, text: str) -> Set[str]:
+        """Usuarios con alguna palabra clave que aparece en el texto"""
+        if not self.keyword_index:
+            return set()
+        users = set()
+        for term in self.get_keyword_matcher().find(text):
+            users |= self.keyword_index[term]
+        return users
+    
+    @synchronized
     def get_subscribed_lines(self, chat_id: str) -> List[str]:
         """Obtiene las líneas a las que está suscrito un usuario"""
-        user = self.get_user_data(chat_id)
-        return user["lines"]
+        user = self.peek_user_data(chat_id)
+        return list(user["lines"])
     
+    @synchronized
     def set_receive_general(self, chat_id: str, receive: bool):
         """Configura si el usuario recibe alertas generales"""
-        user = self.get_user_data(chat_id)
-        user["receive_general"] = receive
-        self.save_subscriptions()
+        self.get_user_data(chat_id)
+        self.index.set_general(str(chat_id), receive)
+        self.store.set_receive_general(str(chat_id), receive)
+        self.mark_dirty()
     
+    @synchronized
     def get_receive_general(self, chat_id: str) -> bool:
         """Verifica si el usuario recibe alertas generales"""
-        user = self.get_user_data(chat_id)
+        user = self.peek_user_data(chat_id)
         return user.get("receive_general", True)
     
+    @synchronized
     def get_users_for_alert(self, line: Optional[str]) -> List[str]:
         """
         Obtiene la lista de chat_ids que deben recibir una alerta
@@ -83,44 +250,43 @@ class SubscriptionManager:
         Returns:
             Lista de chat_ids que deben recibir la notificación
         """
-        recipients = []
+        return self.get_users_for_lines([line] if line else [])
+    
+    @synchronized
+    def get_users_for_lines(self, lines: List[str]) -> List[str]:
+        """
+        Obtiene los chat_ids que deben recibir una alerta que afecta a varias líneas
         
-        for chat_id, user_data in self.data["users"].items():
-            # Si la alerta tiene línea específica
-            if line:
-                if line in user_data.get("lines", []):
-                    recipients.append(chat_id)
-            # Si es una alerta general (sin línea)
-            else:
-                if user_data.get("receive_general", True):
-                    recipients.append(chat_id)
+        Args:
+            lines: Líneas de la alerta (vacía para alertas generales)
         
-        return recipients
+        Returns:
+            Lista sin repetidos: quien sigue varias de las líneas la recibe una vez
+        """
+        if not lines:
+            return self.index.general_users()
+        if len(lines) == 1:
+            return self.index.users_for_line(lines[0])
+        return self.index.users_for_lines(lines)
     
+    @synchronized
     def get_all_monitored_lines(self) -> Set[str]:
         """Obtiene todas las líneas que están siendo monitoreadas por al menos un usuario"""
-        lines = set()
-        for user_data in self.data["users"].values():
-            lines.update(user_data.get("lines", []))
-        return lines
+        return self.index.monitored_lines()
     
+    @synchronized
     def get_stats(self) -> dict:
         """Obtiene estadísticas del sistema de suscripciones"""
-        total_users = len(self.data["users"])
+        total_users = self.index.user_count()
         all_lines = self.get_all_monitored_lines()
         
-        line_counts = {}
-        for line in all_lines:
-            count = sum(1 for user in self.data["users"].values() 
-                       if line in user.get("lines", []))
-            line_counts[line] = count
-        
-        general_users = sum(1 for user in self.data["users"].values() 
-                           if user.get("receive_general", True))
+        line_counts = self.index.line_counts()
+        general_users = self.index.general_count()
         
         return {
             "total_users": total_users,
             "monitored_lines": sorted(all_lines),
             "line_counts": line_counts,
-            "general_alerts_users": general_users
+            "general_alerts_users": general_users,
+            "keywords": len(self.keyword_index)
         }
@@ -0,0 +1,45 @@
+"""Configuración común de las pruebas: módulos del proyecto y servidores falsos (fakes.py)"""
+
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fakes import FakeTelegramServer, FakeTmpServer  # noqa: E402
+
+
+@pytest.fixture
+def fake_tmp():
+    server = FakeTmpServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def fake_telegram():
+    server = FakeTelegramServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch, fake_tmp, fake_telegram):
+    """Directorio vacío con el monitor y el bot apuntando a los servidores falsos"""
+    import bot
+    import delivery
+    import scraper
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('TELEGRAM_BOT_TOKEN', 'TOKEN')
+    monkeypatch.setattr(scraper, 'TMP_URL', fake_tmp.ultima_url)
+    monkeypatch.setattr(bot, 'TELEGRAM_API_URL', fake_telegram.url)
+    monkeypatch.setattr(delivery, 'TELEGRAM_API_URL', fake_telegram.url)
+    return tmp_path
+
+
+def write_subscriptions(users: dict):
+    with open('subscriptions.json', 'w', encoding='utf-8') as f:
+        json.dump({'users': users}, f)
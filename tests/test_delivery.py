@@ -0,0 +1,50 @@
+"""Envío: los errores de red se reintentan con espera exponencial, no de inmediato"""
+
+import requests
+
+import delivery
+from delivery import TelegramDelivery
+
+
+class FlakySession:
+    """Falla con un error de conexión las primeras veces y luego responde 200"""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+
+    def post(self, url, data=None):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise requests.ConnectionError("conexión reiniciada")
+        response = requests.Response()
+        response.status_code = 200
+        return response
+
+
+def test_network_errors_back_off_exponentially(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(delivery.time, 'sleep', sleeps.append)
+    session = FlakySession(failures=3)
+    sender = TelegramDelivery('TOKEN', session=session, per_chat_interval=0, global_rate=1000,
+                              max_retries=4, retry_backoff=1, max_retry_backoff=3)
+
+    result = sender.send_one('1', 'Línea 11: desvío')
+
+    assert result['ok'] and session.calls == 4
+    # 1, 2 y 4 (limitado a 3) segundos, de los que la mitad es al azar
+    assert len(sleeps) == 3
+    for delay, full in zip(sleeps, [1, 2, 3]):
+        assert full / 2 <= delay <= full
+
+
+def test_no_wait_after_the_last_attempt(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(delivery.time, 'sleep', sleeps.append)
+    sender = TelegramDelivery('TOKEN', session=FlakySession(failures=10), per_chat_interval=0,
+                              global_rate=1000, max_retries=2, retry_backoff=1)
+
+    result = sender.send_one('1', 'Línea 11: desvío')
+
+    assert not result['ok'] and result['retryable']
+    assert len(sleeps) == 2
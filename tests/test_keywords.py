@@ -0,0 +1,32 @@
+"""Palabras clave: autómata y búsqueda en el cuerpo de las alertas"""
+
+import keywords
+import scraper
+from conftest import write_subscriptions
+from keywords import KeywordMatcher
+
+
+def test_matcher_finds_whole_words_without_accents():
+    matcher = KeywordMatcher(['desvío', 'obras', 'plaza circular'])
+    assert matcher.find("DESVIO por OBRAS en Plaza  Circular") == {'desvio', 'obras', 'plaza circular'}
+    assert matcher.find("Sobras y desviones") == set()
+
+
+def test_keyword_in_body_keeps_alert_of_unfollowed_line(workdir, fake_tmp, fake_telegram, monkeypatch):
+    from service import AlertService
+
+    monkeypatch.setattr(keywords, 'KEYWORDS_MATCH_BODY', True)
+    monkeypatch.setattr(scraper, 'KEYWORDS_MATCH_BODY', True)
+    write_subscriptions({'1': {'lines': ['11'], 'receive_general': False, 'keywords': ['obras']}})
+    service = AlertService()
+    fake_tmp.alerts = [{'code': '300', 'title': 'Línea 50: cambio de recorrido',
+                        'body': 'Por obras en la Gran Vía, la línea 50 se desvía.'},
+                       {'code': '301', 'title': 'Línea 51: nuevo horario', 'body': 'Horario de invierno.'}]
+    batch = service.check_alerts()
+    service.deliver(batch)
+    if service.outbox is not None:
+        service.outbox.close()
+
+    assert [alert['code'] for alert in batch['monitored_alerts']] == ['300']
+    sent = [message['text'] for message in fake_telegram.messages if message['chat_id'] == '1']
+    assert len(sent) == 1 and 'cambio de recorrido' in sent[0]
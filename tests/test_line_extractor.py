@@ -0,0 +1,30 @@
+"""Líneas que extract_lines encuentra en títulos reales y en casos límite"""
+
+import pytest
+
+from line_extractor import extract_lines
+
+
+@pytest.mark.parametrize('title, lines', [
+    ("Línea 44. Servicios directos UCAM hasta final de curso 2025/26", ['44']),
+    ("LÍNEA 26B: cambio de parada", ['26B']),
+    ("Línea 26 A", ['26A']),
+    ("Líneas 26 A y 30", ['26A', '30']),
+    ("LÍNEA 26 A PARTIR DEL LUNES", ['26']),
+    ("Línea nº 1", ['1']),
+    ("Líneas 11, 39 y 44", ['11', '39', '44']),
+    ("LÍNEAS 39 Y 44", ['39', '44']),
+    ("Líneas 21/22", ['21', '22']),
+    ("Líneas 1 o 91", ['1', '91']),
+    ("Líneas 1 a 5", ['1', '2', '3', '4', '5']),
+    ("Líneas del 30 al 33", ['30', '31', '32', '33']),
+    ("Líneas 50-52", ['50', '51', '52']),
+    ("Línea 11 a partir del lunes", ['11']),
+    ("Líneas 1, 2 de mayo", ['1']),
+    ("Línea 39 y 44 de la UCAM", ['39', '44']),
+    ("NUEVOLínea 39", ['39']),
+    ("Línea 22horarios", ['22']),
+    ("Horarios de líneas verano 2026", []),
+])
+def test_extract_lines(title, lines):
+    assert extract_lines(title) == lines
@@ -0,0 +1,32 @@
+"""Resumen por usuario: los mensajes caben en Telegram sin cortar el Markdown"""
+
+from messages import format_digest
+
+
+def alert(code, title):
+    return {'code': code, 'title': title, 'lines': ['11'],
+            'url': f'https://tmpmurcia.es/Cuerpo.asp?codigo={code}'}
+
+
+def test_digest_splits_between_alerts():
+    alerts = [alert(str(code), f'Desvío número {code} por obras en la Gran Vía') for code in range(200)]
+    messages = format_digest(alerts, max_length=1000)
+
+    assert len(messages) > 1
+    assert all(len(message) <= 1000 for message in messages)
+    text = ''.join(messages)
+    assert all(f'codigo={code})' in text and f'número {code} ' in text for code in range(200))
+
+
+def test_over_long_alert_drops_whole_lines():
+    # Un título enorme con Markdown: cortarlo dejaría un * o un [ sin cerrar
+    title = 'Corte en *Gran Vía* ' * 300 + '[ver plano]'
+    messages = format_digest([alert('1', title), alert('2', 'Línea 11: desvío')], max_length=1000)
+
+    assert all(len(message) <= 1000 for message in messages)
+    text = ''.join(messages)
+    assert 'Gran Vía' not in text
+    assert '[Ver detalles](https://tmpmurcia.es/Cuerpo.asp?codigo=1)' in text
+    assert 'Línea 11: desvío' in text
+    for message in messages:
+        assert message.count('*') % 2 == 0 and message.count('[') == message.count(']')
@@ -0,0 +1,24 @@
+"""Métricas: el servicio escribe un registro por ciclo, no los totales del proceso"""
+
+import json
+
+import metrics
+
+
+def test_write_with_reset_records_each_cycle_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_DIR', str(tmp_path))
+    monkeypatch.setattr(metrics, 'METRICS_JSONL', str(tmp_path / 'runs.jsonl'))
+    registry = metrics.Metrics(enabled=True)
+
+    registry.inc('notifications_sent', 3)
+    registry.observe('telegram_send_seconds', 0.2)
+    registry.write('service', reset=True)
+    registry.inc('notifications_sent', 2)
+    registry.write('service', reset=True)
+
+    with open(tmp_path / 'runs.jsonl', encoding='utf-8') as f:
+        records = [json.loads(line) for line in f]
+    assert [record['counters']['notifications_sent'][''] for record in records] == [3, 2]
+    assert 'telegram_send_seconds' in records[0]['histograms'] and not records[1]['histograms']
+    # El .prom tiene lo del último ciclo
+    assert 'tmp_notifications_sent_total 2' in (tmp_path / 'service.prom').read_text()
@@ -0,0 +1,80 @@
+"""Outbox: si el proceso muere a mitad del envío, solo se repiten los mensajes en vuelo"""
+
+import os
+import subprocess
+import sys
+import textwrap
+import threading
+
+from outbox import Outbox, drain_outbox
+
+WORKERS = 4
+CHATS = 60
+
+# Envía con WORKERS hilos y mata el proceso (sin limpieza, como un SIGKILL) al completar el envío número 20
+DRAIN_AND_DIE = textwrap.dedent("""
+    import os, sys, threading, time
+    sys.path.insert(0, {root!r})
+    from outbox import Outbox, drain_outbox
+
+    class DyingDelivery:
+        max_workers = {workers}
+
+        def __init__(self):
+            self.lock = threading.Lock()
+            self.sent = 0
+
+        def send_one(self, chat_id, text):
+            time.sleep(0.01)
+            with self.lock:
+                with open({log!r}, 'a') as f:
+                    f.write(chat_id + '\\n')
+                self.sent += 1
+                if self.sent == 20:
+                    os._exit(9)
+            return {{'chat_id': chat_id, 'ok': True, 'latency': 0.01}}
+
+    drain_outbox(Outbox({path!r}), DyingDelivery())
+""")
+
+
+class RecordingDelivery:
+    max_workers = WORKERS
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.chats = []
+
+    def send_one(self, chat_id, text):
+        with self.lock:
+            self.chats.append(chat_id)
+        return {'chat_id': chat_id, 'ok': True, 'latency': 0.0}
+
+
+def test_crash_mid_drain_only_repeats_in_flight_sends(tmp_path):
+    path = str(tmp_path / 'outbox.db')
+    log = str(tmp_path / 'sent.log')
+    outbox = Outbox(path)
+    outbox.enqueue('100', 'Línea 11: desvío', [str(chat) for chat in range(CHATS)])
+    outbox.close()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = DRAIN_AND_DIE.format(root=root, workers=WORKERS, log=log, path=path)
+    process = subprocess.run([sys.executable, '-c', script], cwd=str(tmp_path), capture_output=True)
+    assert process.returncode == 9
+    with open(log) as f:
+        before_crash = f.read().split()
+    assert len(before_crash) == 20
+
+    # La siguiente ejecución recupera los envíos interrumpidos y termina
+    outbox = Outbox(path)
+    delivery = RecordingDelivery()
+    report = drain_outbox(outbox, delivery)
+    assert outbox.counts() == {'sent': CHATS}
+    outbox.close()
+
+    assert set(before_crash) | set(delivery.chats) == {str(chat) for chat in range(CHATS)}
+    repeated = set(before_crash) & set(delivery.chats)
+    # Solo el envío que mató el proceso y los que estaban en vuelo en los demás hilos
+    assert len(repeated) <= WORKERS
+    assert report['sent'] == len(delivery.chats)
@@ -0,0 +1,140 @@
+"""Ciclos completos de AlertService (check_alerts + deliver) contra los servidores falsos"""
+
+import pytest
+
+from conftest import write_subscriptions
+
+
+def run_cycle(service):
+    batch = service.check_alerts()
+    if batch is not None:
+        service.deliver(batch)
+
+
+@pytest.mark.parametrize('use_outbox', [False, True])
+def test_alert_is_sent_once_across_cycles(workdir, fake_tmp, fake_telegram, use_outbox):
+    from service import AlertService
+
+    write_subscriptions({'1': {'lines': ['11'], 'receive_general': False}})
+    service = AlertService()
+    if not use_outbox and service.outbox is not None:
+        service.outbox.close()
+        service.outbox = None
+    elif use_outbox and service.outbox is None:
+        pytest.skip("OUTBOX_ENABLED=0")
+
+    fake_tmp.alerts = [{'code': '100', 'title': 'Línea 11: desvío por obras'}]
+    run_cycle(service)
+    fake_tmp.alerts.append({'code': '101', 'title': 'Línea 11: corte de calle'})
+    run_cycle(service)
+    if service.outbox is not None:
+        service.outbox.close()
+
+    sent = [message['text'] for message in fake_telegram.messages if str(message['chat_id']) == '1']
+    assert len(sent) == 2
+    assert 'desvío' in sent[0] and 'corte' in sent[1]
+
+
+def test_late_subscriber_does_not_get_old_alerts(workdir, fake_tmp, fake_telegram):
+    from service import AlertService
+
+    write_subscriptions({'1': {'lines': ['11'], 'receive_general': False}})
+    service = AlertService()
+    fake_tmp.alerts = [{'code': '100', 'title': 'Línea 11: desvío'},
+                       {'code': '200', 'title': 'Línea 39: obras'}]
+    run_cycle(service)
+
+    service.subscription_manager.subscribe_line('2', '39')
+    service.subscription_manager.set_receive_general('2', False)
+    fake_tmp.alerts.append({'code': '201', 'title': 'Línea 39: corte'})
+    run_cycle(service)
+    if service.outbox is not None:
+        service.outbox.close()
+
+    sent = [message['text'] for message in fake_telegram.messages if str(message['chat_id']) == '2']
+    assert len(sent) == 1 and 'corte' in sent[0]
+
+
+def test_scheduler_learns_from_alerts_nobody_follows(workdir, fake_tmp, fake_telegram):
+    import asyncio
+    from service import AlertService
+
+    write_subscriptions({'1': {'lines': ['11'], 'receive_general': False}})
+    service = AlertService(adaptive=True)
+    recorded = []
+    real_next_interval = service.next_interval
+
+    def next_interval(new_alerts):
+        # Una sola vuelta del monitor
+        recorded.append(new_alerts)
+        service.stop_event.set()
+        return real_next_interval(new_alerts)
+
+    async def one_cycle():
+        service.stop_event = asyncio.Event()
+        service.queue = asyncio.Queue()
+        delivery = asyncio.create_task(service.delivery_loop())
+        await service.monitor_loop()
+        delivery.cancel()
+
+    service.next_interval = next_interval
+    # Primer despliegue: lo que ya estaba en la página no se publicó a esta hora
+    fake_tmp.alerts = [{'code': '100', 'title': 'Línea 11: desvío'},
+                       {'code': '200', 'title': 'Línea 39: obras'},
+                       {'code': '201', 'title': 'Línea 44: corte'}]
+    asyncio.run(one_cycle())
+    # Dos códigos nuevos, aunque ninguno sea de una línea seguida
+    fake_tmp.alerts += [{'code': '202', 'title': 'Línea 39: parada trasladada'},
+                        {'code': '203', 'title': 'Línea 44: desvío'}]
+    asyncio.run(one_cycle())
+    if service.outbox is not None:
+        service.outbox.close()
+
+    assert recorded == [0, 2]
+    assert service.scheduler.samples == 2
+    # Al reiniciar, el perfil solo aprende de los códigos con hora de publicación conocida
+    restarted = AlertService(adaptive=True)
+    assert restarted.scheduler.samples == 2
+    if restarted.outbox is not None:
+        restarted.outbox.close()
+
+
+def test_sigterm_does_not_wait_for_the_long_poll(tmp_path, fake_tmp, fake_telegram):
+    import json
+    import os
+    import signal
+    import subprocess
+    import sys
+    import time
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, TELEGRAM_BOT_TOKEN='TOKEN', TELEGRAM_API_URL=fake_telegram.url,
+               TMP_URL=fake_tmp.ultima_url, SUBSCRIPTIONS_WRITE_BEHIND='1', PYTHONUNBUFFERED='1')
+    update_id = fake_telegram.push_message(5, '/suscribir 11')
+    process = subprocess.Popen([sys.executable, os.path.join(root, 'service.py'), '--poll-timeout', '20',
+                                '--scrape-interval', '3600'],
+                               cwd=str(tmp_path), env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    try:
+        # Espera a la respuesta del comando y a que el bot vuelva al long polling
+        deadline = time.monotonic() + 10
+        while not any(str(message['chat_id']) == '5' for message in fake_telegram.messages):
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+        time.sleep(0.5)
+
+        start = time.monotonic()
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=10)
+        elapsed = time.monotonic() - start
+    finally:
+        if process.poll() is None:
+            process.kill()
+        output = process.stdout.read().decode()
+        process.stdout.close()
+
+    assert process.returncode == 0, output
+    assert elapsed < 5, output
+    # El offset y las suscripciones en modo diferido se han guardado al parar
+    assert (tmp_path / '.telegram_offset').read_text() == str(update_id + 1)
+    users = json.loads((tmp_path / 'subscriptions.json').read_text())['users']
+    assert users['5']['lines'] == ['11']
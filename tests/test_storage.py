@@ -0,0 +1,31 @@
+"""Backend SQLite: las consultas no dejan transacciones abiertas que bloqueen a otros procesos"""
+
+import sqlite3
+
+from storage import SqliteDatabase, SqliteSubscriptionStore
+from subscriptions import SubscriptionManager
+
+
+def test_reads_do_not_keep_a_transaction_open(tmp_path):
+    path = str(tmp_path / 'tmp_murcia.db')
+    db = SqliteDatabase(path)
+    manager = SubscriptionManager(write_behind=False, store=SqliteSubscriptionStore(db))
+
+    # Consultas de un chat nuevo (/mis_lineas) y un cambio que no cambia nada
+    assert manager.get_subscribed_lines('100') == []
+    assert manager.get_receive_general('100') is True
+    assert manager.get_keywords('100') == []
+    assert manager.unsubscribe_line('200', '11') is False
+    assert not db.conn.in_transaction
+
+    # Otro proceso puede escribir sin esperar
+    other = sqlite3.connect(path, timeout=0)
+    other.execute("INSERT INTO users (chat_id, receive_general) VALUES ('300', 1)")
+    other.commit()
+    other.close()
+
+    assert manager.subscribe_line('100', '11')
+    assert not db.conn.in_transaction
+    reloaded = SubscriptionManager(write_behind=False, store=SqliteSubscriptionStore(db)).data['users']
+    assert reloaded['100']['lines'] == ['11'] and '200' in reloaded
+    db.close()
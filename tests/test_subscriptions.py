@@ -0,0 +1,68 @@
+"""Índice compacto: es el único estado en memoria y se comporta como el de conjuntos"""
+
+import json
+
+from storage import JsonSubscriptionStore
+from subscription_index import CompactSubscriptionIndex
+from subscriptions import SubscriptionManager
+
+USERS = {
+    "100": {"lines": ["11", "1"], "receive_general": True},
+    "200": {"lines": ["1"], "receive_general": False, "keywords": ["Gran Vía"]},
+    "300": {"lines": [], "receive_general": True},
+}
+
+
+def apply_changes(manager):
+    with manager.batch():
+        manager.subscribe_line('300', '44')
+        manager.subscribe_line('400', '11')
+        manager.unsubscribe_line('100', '1')
+        manager.set_receive_general('100', False)
+        manager.subscribe_keyword('100', 'obras')
+        manager.unsubscribe_keyword('200', 'gran via')
+        # Solo consulta: no da de alta a nadie
+        manager.get_subscribed_lines('500')
+
+
+def snapshot(manager):
+    return {
+        'users': {chat_id: dict(user, lines=sorted(user["lines"]))
+                  for chat_id, user in manager.data["users"].items()},
+        'lines': {chat_id: sorted(manager.get_subscribed_lines(chat_id)) for chat_id in ['100', '200', '400']},
+        'recipients': {line: sorted(manager.get_users_for_alert(line)) for line in ['1', '11', '44', None]},
+        'keywords': sorted(manager.get_users_for_text('Obras en la Gran Vía')),
+        'stats': manager.get_stats(),
+    }
+
+
+def test_compact_index_matches_dict_index(tmp_path):
+    snapshots = []
+    for compact in (False, True):
+        path = tmp_path / f'subscriptions_{compact}.json'
+        path.write_text(json.dumps({"users": USERS}))
+        manager = SubscriptionManager(write_behind=False, store=JsonSubscriptionStore(str(path)),
+                                      compact_index=compact)
+        apply_changes(manager)
+        snapshots.append(snapshot(manager))
+        # Lo guardado se vuelve a cargar igual
+        reloaded = SubscriptionManager(write_behind=False, store=JsonSubscriptionStore(str(path)),
+                                       compact_index=compact)
+        assert snapshot(reloaded) == snapshots[-1]
+
+    assert snapshots[0] == snapshots[1]
+    assert snapshots[1]['stats']['total_users'] == 4
+    assert snapshots[1]['users']['100'] == {"lines": ["11"], "receive_general": False, "keywords": ["obras"]}
+
+
+def test_compact_manager_keeps_no_user_dicts(tmp_path):
+    path = tmp_path / 'subscriptions.json'
+    path.write_text(json.dumps({"users": USERS}))
+    manager = SubscriptionManager(write_behind=False, store=JsonSubscriptionStore(str(path)), compact_index=True)
+
+    assert isinstance(manager.index, CompactSubscriptionIndex)
+    # Ni el gestor ni el índice se quedan con los diccionarios por usuario cargados
+    assert 'data' not in vars(manager) and not hasattr(manager.index, 'users')
+    # Los datos que devuelve el gestor son una copia: cambiarlos no cambia las suscripciones
+    manager.get_user_data('100')["lines"].append('99')
+    assert '99' not in manager.get_subscribed_lines('100')
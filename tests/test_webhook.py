@@ -0,0 +1,88 @@
+"""Webhook: no arranca expuesto sin WEBHOOK_SECRET y procesa los updates como getUpdates"""
+
+import json
+import os
+import re
+import signal
+import subprocess
+import sys
+import time
+
+import pytest
+import requests
+
+import bot
+
+
+@pytest.mark.parametrize('host, loopback', [
+    ('127.0.0.1', True), ('localhost', True), ('::1', True),
+    ('0.0.0.0', False), ('192.168.1.10', False), ('bot.example', False),
+])
+def test_is_loopback(host, loopback):
+    assert bot.is_loopback(host) is loopback
+
+
+def test_public_webhook_requires_secret(workdir, monkeypatch):
+    monkeypatch.setattr(bot, 'WEBHOOK_SECRET', '')
+    telegram_bot = bot.TelegramBot()
+    with pytest.raises(SystemExit):
+        telegram_bot.run_webhook(host='0.0.0.0', port=0)
+
+
+def update(update_id, chat_id, text):
+    return {'update_id': update_id,
+            'message': {'message_id': update_id, 'date': int(time.time()), 'text': text,
+                        'chat': {'id': chat_id, 'first_name': 'Usuario', 'type': 'private'}}}
+
+
+def test_webhook_processes_updates_once_in_order(tmp_path, fake_telegram):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, TELEGRAM_BOT_TOKEN='TOKEN', TELEGRAM_API_URL=fake_telegram.url,
+               WEBHOOK_SECRET='s3creto', WEBHOOK_URL='', PYTHONUNBUFFERED='1')
+    process = subprocess.Popen([sys.executable, os.path.join(root, 'bot.py'), '--webhook', '--port', '0'],
+                               cwd=str(tmp_path), env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                               text=True)
+    output = []
+    try:
+        for line in process.stdout:
+            output.append(line)
+            match = re.search(r'Webhook escuchando en (http://\S+)', line)
+            if match:
+                url = match.group(1)
+                break
+        else:
+            pytest.fail(''.join(output))
+
+        def post(body, secret='s3creto'):
+            headers = {} if secret is None else {'X-Telegram-Bot-Api-Secret-Token': secret}
+            return requests.post(url, json=body, headers=headers, timeout=5).status_code
+
+        # Dos chats intercalados y un update repetido (Telegram reintenta si no recibe el 200 a tiempo)
+        updates = [update(1, 1, '/suscribir 11'), update(2, 2, '/suscribir 39'),
+                   update(3, 1, '/mis_lineas'), update(4, 2, '/desuscribir 39'), update(2, 2, '/suscribir 39')]
+        assert [post(body) for body in updates] == [200] * 5
+        # Sin el secreto o con otro no se acepta nada
+        assert post(update(5, 3, '/suscribir 44'), secret=None) == 403
+        assert post(update(5, 3, '/suscribir 44'), secret='otro') == 403
+
+        # Al parar se terminan los updates recibidos y se guarda el offset
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=10)
+    finally:
+        if process.poll() is None:
+            process.kill()
+        output.extend(process.stdout)
+        process.stdout.close()
+    assert process.returncode == 0, ''.join(output)
+
+    replies = {}
+    for message in fake_telegram.messages:
+        replies.setdefault(str(message['chat_id']), []).append(message['text'])
+    assert set(replies) == {'1', '2'}
+    assert 'Suscrito a la línea 11' in replies['1'][0] and 'Línea 11' in replies['1'][1]
+    assert len(replies['2']) == 2
+    assert 'Suscrito a la línea 39' in replies['2'][0] and 'Desuscrito de la línea 39' in replies['2'][1]
+
+    users = json.loads((tmp_path / 'subscriptions.json').read_text())['users']
+    assert users['1']['lines'] == ['11'] and users['2']['lines'] == [] and '3' not in users
+    assert (tmp_path / '.telegram_offset').read_text() == '5'